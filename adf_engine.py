@@ -0,0 +1,171 @@
+import math
+from typing import Dict, Optional
+
+import numpy as np
+
+# MacKinnon (1994) response-surface coefficients for the approximate p-value
+# and MacKinnon (2010) critical-value polynomials in 1/nobs, for regressions
+# with a constant. Row 0 is the ADF case (N=1), row 1 the two-variable
+# Engle-Granger case (N=2). Values as published (and as used by statsmodels).
+_TAU_MAX = np.array([2.74, 0.92])
+_TAU_MIN = np.array([-18.83, -18.86])
+_TAU_STAR = np.array([-1.61, -2.62])
+_TAU_SMALLP = np.array([
+    [2.1659, 1.4412, 0.038269],
+    [2.92, 1.5012, 0.039796],
+])
+_TAU_LARGEP = np.array([
+    [1.7339, 0.93202, -0.12745, -0.010368],
+    [2.1945, 0.64695, -0.29198, -0.042377],
+])
+# [1%, 5%, 10%] x [c0, c1, c2, c3]: crit = c0 + c1/n + c2/n^2 + c3/n^3
+_TAU_CRIT_2010 = np.array([
+    [[-3.43035, -6.5393, -16.786, -79.433],
+     [-2.86154, -2.8903, -4.234, -40.04],
+     [-2.56677, -1.5384, -2.809, 0.0]],
+    [[-3.89644, -10.9519, -33.527, 0.0],
+     [-3.33613, -6.1101, -6.823, 0.0],
+     [-3.04445, -4.2412, -2.72, 0.0]],
+])
+CRITICAL_LEVELS = ('1%', '5%', '10%')
+
+# Upper bound on the augmentation lags searched by AIC. The Schwert rule
+# alone grows with history (32 lags at 5k bars) and dominates the cost.
+MAX_LAGS_CAP = 24
+
+
+def _norm_cdf(z: np.ndarray) -> np.ndarray:
+    return 0.5 * (1.0 + np.vectorize(math.erf, otypes=[float])(z / math.sqrt(2.0)))
+
+
+def mackinnon_pvalue(stat, n_vars: int = 1) -> np.ndarray:
+    """Vectorized MacKinnon approximate p-value for constant-only (A)DF / Engle-Granger statistics."""
+    stat = np.asarray(stat, dtype=np.float64)
+    i = n_vars - 1
+    small = np.polyval(_TAU_SMALLP[i][::-1], stat)
+    large = np.polyval(_TAU_LARGEP[i][::-1], stat)
+    p = _norm_cdf(np.where(stat <= _TAU_STAR[i], small, large))
+    p = np.where(stat > _TAU_MAX[i], 1.0, p)
+    p = np.where(stat < _TAU_MIN[i], 0.0, p)
+    return np.where(np.isnan(stat), np.nan, p)
+
+
+def mackinnon_critical_values(nobs, n_vars: int = 1) -> np.ndarray:
+    """Finite-sample 1% / 5% / 10% critical values, shape (..., 3)."""
+    inv = 1.0 / np.asarray(nobs, dtype=np.float64)[..., None]
+    coef = _TAU_CRIT_2010[n_vars - 1]
+    return coef[:, 0] + coef[:, 1] * inv + coef[:, 2] * inv ** 2 + coef[:, 3] * inv ** 3
+
+
+def schwert_max_lags(n_obs: int, has_const: bool = True) -> int:
+    """Default maximum lag (Schwert rule), limited by sample size and MAX_LAGS_CAP."""
+    lags = int(math.ceil(12.0 * (n_obs / 100.0) ** 0.25))
+    return max(0, min(lags, n_obs // 2 - int(has_const) - 1, MAX_LAGS_CAP))
+
+
+def _design(series: np.ndarray, diffs: np.ndarray, lags: int, has_const: bool):
+    """ADF regression of diff on [const], lagged level and `lags` lagged diffs, for a batch."""
+    n_series, length = series.shape
+    nobs = length - 1 - lags
+    target = diffs[:, lags:]
+    cols = []
+    if has_const:
+        cols.append(np.ones((n_series, nobs)))
+    cols.append(series[:, lags:length - 1])
+    for j in range(1, lags + 1):
+        cols.append(diffs[:, lags - j:length - 1 - j])
+    return np.stack(cols, axis=2), target
+
+
+def _fit(design: np.ndarray, target: np.ndarray):
+    """Batched least squares via QR: returns (Q'y, R, full-model SSR)."""
+    q, r = np.linalg.qr(design)
+    qty = np.einsum('bnk,bn->bk', q, target)
+    resid = target - np.einsum('bnk,bk->bn', q, qty)
+    return qty, r, np.einsum('bn,bn->b', resid, resid)
+
+
+def adf_test_batch(spreads, lags: Optional[int] = None, max_lags: Optional[int] = None,
+                   regression: str = 'c', n_vars: int = 1) -> Dict[str, np.ndarray]:
+    """Augmented Dickey-Fuller test for every row of a 2-D batch in one vectorized pass.
+
+    With `lags` the augmentation order is fixed; otherwise it is chosen per
+    series by AIC over 0..`max_lags` (default: Schwert rule, capped at
+    MAX_LAGS_CAP) on a common sample, then refit, as statsmodels' adfuller
+    does with autolag='AIC'. `regression` is 'c' (constant) or 'n' (none,
+    used for Engle-Granger residuals); p-values and critical values always
+    come from the constant-case tables for `n_vars` series.
+    """
+    series = np.atleast_2d(np.asarray(spreads, dtype=np.float64))
+    if regression not in ('c', 'n'):
+        raise ValueError("regression must be 'c' or 'n'")
+    if np.isnan(series).any():
+        raise ValueError("spreads must not contain NaNs; align and drop them first")
+    has_const = regression == 'c'
+    n_series, length = series.shape
+    diffs = np.diff(series, axis=1)
+
+    if lags is None:
+        max_lags = schwert_max_lags(length - 1, has_const) if max_lags is None else max_lags
+        if length - 1 - max_lags <= max_lags + 2:
+            raise ValueError(f"Not enough observations ({length}) for {max_lags} lags")
+        design, target = _design(series, diffs, max_lags, has_const)
+        qty, _, ssr_full = _fit(design, target)
+        nobs = target.shape[1]
+        n_base = design.shape[2] - max_lags
+        # Nested fits share one QR: dropping trailing columns adds their Q'y^2 back to the SSR.
+        tail = np.cumsum(qty[:, ::-1] ** 2, axis=1)[:, ::-1]
+        ssr = np.column_stack([ssr_full + (tail[:, n_base + p] if n_base + p < design.shape[2] else 0.0)
+                               for p in range(max_lags + 1)])
+        n_params = n_base + np.arange(max_lags + 1)
+        aic = nobs * np.log(np.maximum(ssr, 1e-300) / nobs) + 2 * n_params
+        chosen = np.argmin(aic, axis=1)
+    else:
+        chosen = np.full(n_series, int(lags))
+
+    stat = np.full(n_series, np.nan)
+    used_nobs = np.zeros(n_series, dtype=np.int64)
+    level = 1 if has_const else 0
+    for p in np.unique(chosen):
+        rows = np.nonzero(chosen == p)[0]
+        design, target = _design(series[rows], diffs[rows], int(p), has_const)
+        qty, r, ssr = _fit(design, target)
+        nobs, k = target.shape[1], design.shape[2]
+        r_inv = np.linalg.inv(r)
+        coef = np.einsum('bij,bj->bi', r_inv, qty)
+        sigma2 = ssr / (nobs - k)
+        se = np.sqrt(sigma2 * np.einsum('bj,bj->b', r_inv[:, level, :], r_inv[:, level, :]))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            stat[rows] = coef[:, level] / se
+        used_nobs[rows] = nobs
+
+    return {
+        'statistic': stat,
+        'pvalue': mackinnon_pvalue(stat, n_vars),
+        'lags': chosen,
+        'nobs': used_nobs,
+        'critical_values': mackinnon_critical_values(used_nobs, n_vars),
+    }
+
+
+def engle_granger_batch(y, x, lags: Optional[int] = None,
+                        max_lags: Optional[int] = None) -> Dict[str, np.ndarray]:
+    """Engle-Granger cointegration test of y on x (with constant) for a batch of pairs.
+
+    Fits the cointegrating regression in closed form, then runs a
+    no-constant ADF on the residuals with N=2 MacKinnon tables, matching
+    statsmodels' `coint`.
+    """
+    y = np.atleast_2d(np.asarray(y, dtype=np.float64))
+    x = np.atleast_2d(np.asarray(x, dtype=np.float64))
+    dx = x - x.mean(axis=1, keepdims=True)
+    dy = y - y.mean(axis=1, keepdims=True)
+    var = np.einsum('bn,bn->b', dx, dx)
+    beta = np.divide(np.einsum('bn,bn->b', dx, dy), var, out=np.zeros_like(var), where=var > 0)
+    resid = dy - beta[:, None] * dx
+    result = adf_test_batch(resid, lags=lags, max_lags=max_lags, regression='n', n_vars=2)
+    # coint() reports critical values for nobs - 1.
+    result['critical_values'] = mackinnon_critical_values(resid.shape[1] - 1, n_vars=2) \
+        * np.ones((len(beta), 1))
+    result['beta'] = beta
+    return result
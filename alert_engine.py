@@ -0,0 +1,253 @@
+import logging
+import math
+import operator
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from analytics import parse_beta_mode
+from rollups import BASE_TIMEFRAME, validate_timeframe
+
+logger = logging.getLogger(__name__)
+
+# Metrics read from each committed bar of one symbol.
+SYMBOL_METRICS = {'open': 0, 'high': 1, 'low': 2, 'close': 3, 'volume': 4}
+# Metrics read from each closed bar of a pair feed (see stream_hub.PairFeed).
+PAIR_METRICS = {
+    'zscore': lambda p: p['ZScore'],
+    'abs_zscore': lambda p: abs(p['ZScore']),
+    'spread': lambda p: p['Spread'],
+    'beta': lambda p: p['Beta'],
+}
+OPERATORS = {'>': operator.gt, '>=': operator.ge, '<': operator.lt, '<=': operator.le}
+
+ALERT_LOG_SIZE = 1000
+
+# (symbol_y, symbol_x, timeframe, window, beta_mode), the same key as a StreamHub pair feed.
+FeedKey = Tuple[str, str, str, int, str]
+
+
+def validate_rule(fields: Dict[str, Any]) -> Dict[str, Any]:
+    """Checks and normalizes a rule definition, raising ValueError on anything unusable."""
+    rule = dict(fields)
+    rule['symbol'] = rule['symbol'].upper()
+    rule['symbol_x'] = rule['symbol_x'].upper() if rule.get('symbol_x') else None
+    if rule['operator'] not in OPERATORS:
+        raise ValueError(f"Unsupported operator {rule['operator']!r}; expected one of {', '.join(OPERATORS)}")
+    if rule['metric'] in PAIR_METRICS:
+        if rule['symbol_x'] is None:
+            raise ValueError(f"metric {rule['metric']!r} needs symbol_x")
+        parse_beta_mode(rule['beta_mode'])
+        if rule['window'] < 1:
+            raise ValueError("window must be at least 1")
+    elif rule['metric'] in SYMBOL_METRICS:
+        if rule['symbol_x'] is not None:
+            raise ValueError(f"metric {rule['metric']!r} applies to a single symbol; drop symbol_x")
+    else:
+        raise ValueError(f"Unsupported metric {rule['metric']!r}; expected one of "
+                         f"{', '.join(list(SYMBOL_METRICS) + list(PAIR_METRICS))}")
+    validate_timeframe(rule['timeframe'])
+    if not math.isfinite(rule['value']):
+        raise ValueError("value must be finite")
+    if rule['hysteresis'] < 0 or rule['cooldown_s'] < 0:
+        raise ValueError("hysteresis and cooldown_s must not be negative")
+    return rule
+
+
+class Rule:
+    """A stored rule definition plus its edge-trigger state."""
+
+    __slots__ = ('id', 'fields', 'series', 'compare', 'state', 'last_fired_ms')
+
+    def __init__(self, rule_id: int, fields: Dict[str, Any]):
+        self.id = rule_id
+        self.fields = fields
+        self.series = f"{fields['symbol']}_{fields['symbol_x']}" if fields['symbol_x'] else fields['symbol']
+        self.compare = OPERATORS[fields['operator']]
+        # None (armed), 'triggered', or 'suppressed' (crossed during the cooldown).
+        self.state: Optional[str] = None
+        self.last_fired_ms: Optional[int] = None
+
+    @property
+    def feed_key(self) -> Optional[FeedKey]:
+        f = self.fields
+        if f['metric'] not in PAIR_METRICS:
+            return None
+        return (f['symbol'], f['symbol_x'], f['timeframe'], f['window'], f['beta_mode'])
+
+    def cleared(self, value: float) -> bool:
+        """True once the value is back past the threshold by at least the hysteresis band."""
+        threshold, band = self.fields['value'], self.fields['hysteresis']
+        if self.fields['operator'] in ('>', '>='):
+            return value < threshold - band
+        return value > threshold + band
+
+    def describe(self) -> str:
+        f = self.fields
+        return f"{self.series} {f['timeframe']} {f['metric']} {f['operator']} {f['value']:g}"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'id': self.id, **self.fields, 'state': self.state or 'armed', 'last_fired_ms': self.last_fired_ms}
+
+
+class AlertEngine:
+    """Evaluates alert rules on each closed bar, touching only the rules of the series that changed.
+
+    Symbol rules are indexed by (symbol, timeframe) and fed from the writer's
+    committed bars (`on_bars`); pair rules are indexed by pair feed and fed
+    from the stream hub's per-bar analytics (`on_analytics`). Alerts are
+    edge-triggered: a rule fires when its condition becomes true, re-arms
+    only after the value moves back past the threshold by `hysteresis`, and
+    will not fire again within `cooldown_s` of bar time. Transitions are
+    appended to the bounded `log` and passed to `on_alert`.
+    """
+
+    def __init__(self, log_size: int = ALERT_LOG_SIZE,
+                 on_alert: Optional[Callable[[Dict[str, Any]], None]] = None):
+        self.on_alert = on_alert
+        self.log: deque = deque(maxlen=log_size)
+        self._lock = threading.Lock()
+        self._rules: Dict[int, Rule] = {}
+        self._by_bar: Dict[Tuple[str, str], Dict[int, Rule]] = defaultdict(dict)
+        self._by_feed: Dict[FeedKey, Dict[int, Rule]] = defaultdict(dict)
+        # Latest bar per (symbol, rollup timeframe); a bucket is only final once the next one starts.
+        self._open_buckets: Dict[Tuple[str, str], Tuple[int, Sequence[float]]] = {}
+        self.bars_evaluated = 0
+        self.evaluations = 0
+
+    def load(self, rules: Sequence[Tuple[int, Dict[str, Any]]]):
+        for rule_id, fields in rules:
+            self.add(rule_id, fields)
+
+    def add(self, rule_id: int, fields: Dict[str, Any]) -> Rule:
+        """Adds or replaces a rule; a replaced rule starts armed again."""
+        rule = Rule(rule_id, fields)
+        with self._lock:
+            self._remove_locked(rule_id)
+            self._rules[rule_id] = rule
+            self._index(rule)[rule_id] = rule
+        return rule
+
+    def remove(self, rule_id: int) -> Optional[Rule]:
+        with self._lock:
+            return self._remove_locked(rule_id)
+
+    def get(self, rule_id: int) -> Optional[Rule]:
+        return self._rules.get(rule_id)
+
+    def rules(self) -> List[Rule]:
+        with self._lock:
+            return sorted(self._rules.values(), key=lambda r: r.id)
+
+    def _index(self, rule: Rule) -> Dict[int, Rule]:
+        key = rule.feed_key
+        if key is not None:
+            return self._by_feed[key]
+        return self._by_bar[(rule.fields['symbol'], rule.fields['timeframe'])]
+
+    def _remove_locked(self, rule_id: int) -> Optional[Rule]:
+        rule = self._rules.pop(rule_id, None)
+        if rule is not None:
+            key = rule.feed_key
+            index = self._by_feed if key is not None else self._by_bar
+            key = key if key is not None else (rule.fields['symbol'], rule.fields['timeframe'])
+            index[key].pop(rule_id, None)
+            if not index[key]:
+                del index[key]
+        return rule
+
+    def on_bars(self, bars: List[Tuple[str, str, int, Sequence[float]]]):
+        """Writer-thread entry point: (symbol, timeframe, timestamp, ohlcv) for each committed bar."""
+        if not self._by_bar:
+            return
+        with self._lock:
+            for symbol, timeframe, ts, values in bars:
+                rules = self._by_bar.get((symbol, timeframe))
+                if not rules:
+                    continue
+                if timeframe != BASE_TIMEFRAME:
+                    # Rollup buckets are rewritten while they form; evaluate the previous one once it closes.
+                    previous = self._open_buckets.get((symbol, timeframe))
+                    if previous is not None and ts < previous[0]:
+                        continue
+                    self._open_buckets[(symbol, timeframe)] = (ts, values)
+                    if previous is None or ts == previous[0]:
+                        continue
+                    ts, values = previous
+                self.bars_evaluated += 1
+                for rule in list(rules.values()):
+                    self._evaluate(rule, float(values[SYMBOL_METRICS[rule.fields['metric']]]), ts)
+
+    def on_analytics(self, feed_key: FeedKey, payload: Dict[str, Any]):
+        """Pair-feed entry point: one closed bar's Beta / Spread / ZScore."""
+        if feed_key not in self._by_feed:
+            return
+        with self._lock:
+            rules = self._by_feed.get(feed_key)
+            if not rules:
+                return
+            self.bars_evaluated += 1
+            for rule in list(rules.values()):
+                self._evaluate(rule, float(PAIR_METRICS[rule.fields['metric']](payload)), payload['timestamp'])
+
+    def _evaluate(self, rule: Rule, value: float, ts: int):
+        self.evaluations += 1
+        if not math.isfinite(value):
+            return
+        if rule.state is not None:
+            if rule.cleared(value):
+                fired = rule.state == 'triggered'
+                rule.state = None
+                if fired:
+                    self._emit(rule, 'cleared', value, ts)
+            return
+        if not rule.compare(value, rule.fields['value']):
+            return
+        cooldown_ms = rule.fields['cooldown_s'] * 1000.0
+        if rule.last_fired_ms is not None and ts - rule.last_fired_ms < cooldown_ms:
+            rule.state = 'suppressed'
+            return
+        rule.state = 'triggered'
+        rule.last_fired_ms = ts
+        self._emit(rule, 'triggered', value, ts)
+
+    def _emit(self, rule: Rule, state: str, value: float, ts: int):
+        prefix = 'ALERT' if state == 'triggered' else 'CLEARED'
+        alert = {
+            'rule_id': rule.id, 'pair': rule.series, 'metric': rule.fields['metric'],
+            'operator': rule.fields['operator'], 'threshold': rule.fields['value'],
+            'value': value, 'state': state, 'timestamp': ts, 'logged_ms': int(time.time() * 1000),
+            'message': f"{prefix} [rule {rule.id}]: {rule.describe()} (at {value:.4g})",
+        }
+        self.log.append(alert)
+        if self.on_alert is not None:
+            try:
+                self.on_alert(alert)
+            except Exception as e:
+                logger.error("Alert callback failed", extra={'rule_id': rule.id, 'error': str(e)})
+
+    def active_messages(self) -> List[str]:
+        """Messages of the rules currently in the triggered state."""
+        with self._lock:
+            latest = {}
+            for alert in self.log:
+                latest[alert['rule_id']] = alert
+            return [latest[r.id]['message'] for r in sorted(self._rules.values(), key=lambda r: r.id)
+                    if r.state == 'triggered' and r.id in latest]
+
+    def recent(self, limit: int = 100, since: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Newest-last alert log entries, optionally only those with bar time after `since`."""
+        with self._lock:
+            entries = [a for a in self.log if since is None or a['timestamp'] > since]
+        return entries[-limit:] if limit > 0 else []
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'rules': len(self._rules),
+            'symbol_series': len(self._by_bar),
+            'pair_feeds': len(self._by_feed),
+            'bars_evaluated': self.bars_evaluated,
+            'evaluations': self.evaluations,
+            'log_entries': len(self.log),
+        }
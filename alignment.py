@@ -0,0 +1,143 @@
+import os
+from collections import namedtuple
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# How many bars a quiet leg's last close is carried forward onto the other
+# leg's bars before the row is dropped instead; 0 is an exact timestamp join.
+ALIGN_MAX_STALE_BARS = int(os.environ.get('QUANT_ALIGN_MAX_STALE_BARS', 5))
+
+# Aligned closes on the pair's bar clock, plus what it took to get them:
+# rows whose y / x close was carried forward, and clock rows dropped because
+# a leg had no close yet or only one older than the staleness limit.
+Alignment = namedtuple('Alignment', ['timestamp', 'y', 'x', 'imputed_y', 'imputed_x', 'dropped'])
+
+
+def max_stale_ms(bar_ms: int, bars: int = ALIGN_MAX_STALE_BARS) -> int:
+    return max(int(bars), 0) * int(bar_ms)
+
+
+def align_pair(ts_y: np.ndarray, y: np.ndarray, ts_x: np.ndarray, x: np.ndarray,
+               max_stale: int = 0) -> Alignment:
+    """As-of join of two legs' closes on their common bar clock.
+
+    The clock is every bar time at which either leg has a bar. Each row
+    takes each leg's latest close at or before that time, provided it is at
+    most `max_stale` ms old; rows where a leg has no such close are dropped.
+    Inputs are ascending and unique per leg. The two runs are merged with a
+    stable sort (linear on two sorted runs) and each leg's as-of index is a
+    running count over the merged sequence, so no per-row searches are made.
+    """
+    ts_y = np.asarray(ts_y, dtype=np.int64)
+    ts_x = np.asarray(ts_x, dtype=np.int64)
+    merged = np.concatenate((ts_y, ts_x))
+    order = np.argsort(merged, kind='stable')
+    merged = merged[order]
+    from_y = order < len(ts_y)
+    # The last entry of each run of equal timestamps sees both legs' bars at that time.
+    last = np.ones(len(merged), dtype=bool)
+    last[:-1] = merged[1:] != merged[:-1]
+    clock = merged[last]
+    iy = (np.cumsum(from_y) - 1)[last]
+    ix = (np.cumsum(~from_y) - 1)[last]
+
+    seen_y, seen_x = iy >= 0, ix >= 0
+    age_y = np.where(seen_y, clock - ts_y[np.maximum(iy, 0)] if len(ts_y) else 0, -1)
+    age_x = np.where(seen_x, clock - ts_x[np.maximum(ix, 0)] if len(ts_x) else 0, -1)
+    keep = seen_y & seen_x & (age_y <= max_stale) & (age_x <= max_stale)
+    iy, ix = iy[keep], ix[keep]
+    return Alignment(clock[keep], np.asarray(y, dtype=np.float64)[iy], np.asarray(x, dtype=np.float64)[ix],
+                     int(np.count_nonzero(age_y[keep] > 0)), int(np.count_nonzero(age_x[keep] > 0)),
+                     int(len(clock) - np.count_nonzero(keep)))
+
+
+def alignment_stats(alignment: Alignment) -> Dict[str, int]:
+    return {'rows': len(alignment.timestamp), 'imputed_y': alignment.imputed_y,
+            'imputed_x': alignment.imputed_x, 'dropped': alignment.dropped}
+
+
+class StreamingAligner:
+    """Incremental `align_pair` for bars arriving leg by leg.
+
+    A clock row is final once both legs have reported a bar at or after it
+    (strictly after, with `final_on_next`, for rollup buckets that keep
+    changing until the next one opens), so each row is emitted exactly once
+    with the same values the batch join gives over the same bars. Closes
+    not yet on the clock are held per leg, at most `max_pending` each.
+    """
+
+    def __init__(self, max_stale: int = 0, final_on_next: bool = False, max_pending: int = 500):
+        self.max_stale = max_stale
+        self.final_on_next = final_on_next
+        self.max_pending = max_pending
+        self.last_ts: Optional[int] = None
+        self._pending: Tuple[Dict[int, float], Dict[int, float]] = ({}, {})
+        self._latest: List[Optional[int]] = [None, None]
+        # (bar time, close) of each leg's latest close on the clock
+        self._current: List[Optional[Tuple[int, float]]] = [None, None]
+        self.rows = 0
+        self.imputed_y = 0
+        self.imputed_x = 0
+        self.dropped = 0
+
+    def seed(self, ts_y: np.ndarray, y: np.ndarray, ts_x: np.ndarray, x: np.ndarray,
+             alignment: Alignment, upto: Optional[int] = None):
+        """Continues after a batch `alignment` of the same bars whose clock ends at `upto` (inclusive)."""
+        if upto is None and len(alignment.timestamp):
+            upto = int(alignment.timestamp[-1])
+        self.last_ts = upto
+        self.rows += len(alignment.timestamp)
+        self.imputed_y += alignment.imputed_y
+        self.imputed_x += alignment.imputed_x
+        self.dropped += alignment.dropped
+        for leg, (ts, close) in enumerate(((ts_y, y), (ts_x, x))):
+            if upto is None or not len(ts):
+                continue
+            i = int(np.searchsorted(ts, upto, side='right')) - 1
+            if i >= 0:
+                self._current[leg] = (int(ts[i]), float(close[i]))
+                self._latest[leg] = int(ts[i])
+            for t, c in zip(ts[i + 1:].tolist(), close[i + 1:].tolist()):
+                self.add(leg, t, c)
+
+    def add(self, leg: int, ts: int, close: float) -> List[Tuple[int, float, float]]:
+        """Records leg `leg`'s (0: y, 1: x) close at `ts`; returns the (ts, y, x) rows that became final."""
+        if self.last_ts is not None and ts <= self.last_ts:
+            return []
+        pending = self._pending[leg]
+        pending[ts] = close
+        if self._latest[leg] is None or ts > self._latest[leg]:
+            self._latest[leg] = ts
+        rows = self.drain()
+        if len(pending) > self.max_pending:
+            # The other leg has gone quiet; its rows can only be dropped once it reports again.
+            del pending[min(pending)]
+        return rows
+
+    def drain(self) -> List[Tuple[int, float, float]]:
+        if None in self._latest:
+            return []
+        horizon = min(self._latest)
+        pending_y, pending_x = self._pending
+        clock = sorted(t for t in set(pending_y) | set(pending_x)
+                       if (t < horizon if self.final_on_next else t <= horizon))
+        rows = []
+        for t in clock:
+            for leg, pending in enumerate(self._pending):
+                if t in pending:
+                    self._current[leg] = (t, pending.pop(t))
+            (t_y, c_y), (t_x, c_x) = self._current[0] or (None, None), self._current[1] or (None, None)
+            self.last_ts = t
+            if t_y is None or t_x is None or t - t_y > self.max_stale or t - t_x > self.max_stale:
+                self.dropped += 1
+                continue
+            self.rows += 1
+            self.imputed_y += t_y < t
+            self.imputed_x += t_x < t
+            rows.append((t, c_y, c_x))
+        return rows
+
+    def stats(self) -> Dict[str, int]:
+        return {'rows': self.rows, 'imputed_y': self.imputed_y, 'imputed_x': self.imputed_x,
+                'dropped': self.dropped}
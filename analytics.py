@@ -1,7 +1,101 @@
+import re
 import pandas as pd
 import numpy as np
-import statsmodels.api as sm
-from statsmodels.tsa.stattools import adfuller
+from typing import Optional, Tuple, Union
+from adf_engine import CRITICAL_LEVELS, adf_test_batch
+from kalman import KALMAN_DELTA, KALMAN_OBS_VAR, kalman_filter
+
+BETA_MODES = ('static', 'rolling(n)', 'expanding', 'ewm(halflife)', 'kalman(delta,obs_var)')
+_BETA_MODE_RE = re.compile(r'^\s*(static|expanding|rolling|ewm|kalman)\s*(?:\(([^()]*)\))?\s*$')
+_NUMBER_RE = re.compile(r'^[0-9]*\.?[0-9]+(?:[eE][-+]?[0-9]+)?$')
+
+def parse_beta_mode(beta_mode: str) -> Tuple[str, Union[None, float, Tuple[float, float]]]:
+    """Parses 'static', 'expanding', 'rolling(n)', 'ewm(halflife)' or 'kalman(delta,obs_var)' into (kind, parameter).
+
+    Both kalman arguments are optional (defaults KALMAN_DELTA and
+    KALMAN_OBS_VAR); its parameter is the (delta, obs_var) tuple.
+    """
+    match = _BETA_MODE_RE.match(beta_mode or '')
+    args = [a.strip() for a in match.group(2).split(',')] if match and match.group(2) is not None else []
+    if not match or not all(_NUMBER_RE.match(a) for a in args):
+        raise ValueError(f"Unsupported beta_mode {beta_mode!r}; expected one of {', '.join(BETA_MODES)}")
+    kind = match.group(1)
+    if kind == 'kalman':
+        if len(args) > 2:
+            raise ValueError("beta_mode 'kalman' takes at most (delta, obs_var)")
+        delta = float(args[0]) if args else KALMAN_DELTA
+        obs_var = float(args[1]) if len(args) > 1 else KALMAN_OBS_VAR
+        if not 0 < delta < 1 or obs_var <= 0:
+            raise ValueError("kalman(delta, obs_var) needs 0 < delta < 1 and obs_var > 0, e.g. kalman(1e-7, 1e-7)")
+        return kind, (delta, obs_var)
+    if len(args) > 1:
+        raise ValueError(f"beta_mode {kind!r} takes at most one parameter")
+    param = args[0] if args else None
+    if kind in ('static', 'expanding'):
+        if param is not None:
+            raise ValueError(f"beta_mode {kind!r} takes no parameter")
+        return kind, None
+    if param is None or float(param) <= 0:
+        raise ValueError(f"beta_mode {kind!r} needs a positive parameter, e.g. {kind}(100)")
+    if kind == 'rolling':
+        if not float(param).is_integer() or int(float(param)) < 2:
+            raise ValueError("rolling(n) needs an integer window of at least 2")
+        return kind, int(float(param))
+    return kind, float(param)
+
+def _slope(cov: np.ndarray, var: np.ndarray) -> np.ndarray:
+    return np.divide(cov, var, out=np.full_like(cov, np.nan), where=var > 0)
+
+def compute_hedge_ratios(y: np.ndarray, x: np.ndarray, beta_mode: str = 'static') -> np.ndarray:
+    """Returns the OLS hedge ratio of y on x (with intercept) for every bar.
+
+    'static' fits once over the whole sample (look-ahead, as before);
+    'expanding', 'rolling(n)' and 'ewm(halflife)' only use bars up to and
+    including each point. All modes are single-pass NumPy kernels over
+    cumulative (or exponentially weighted) sums, except 'kalman', which is
+    the filtered beta of kalman.KalmanHedgeRatio (y = alpha + beta * x).
+    """
+    kind, param = parse_beta_mode(beta_mode)
+    y = np.asarray(y, dtype=np.float64)
+    x = np.asarray(x, dtype=np.float64)
+    n_obs = len(y)
+    if n_obs == 0:
+        return np.empty(0)
+    if kind == 'kalman':
+        return kalman_filter(y, x, 1, *param)[0]
+
+    # Centring does not change the slope but keeps the running sums small.
+    xc = x - x.mean()
+    yc = y - y.mean()
+
+    if kind == 'static':
+        dx = xc - xc.mean()
+        var = float(dx @ dx)
+        beta = float(dx @ (yc - yc.mean())) / var if var > 0 else np.nan
+        return np.full(n_obs, beta)
+
+    if kind == 'ewm':
+        moments = pd.DataFrame({'x': xc, 'y': yc, 'xx': xc * xc, 'xy': xc * yc}).ewm(halflife=param).mean()
+        m = moments.to_numpy()
+        cov = m[:, 3] - m[:, 0] * m[:, 1]
+        var = m[:, 2] - m[:, 0] ** 2
+        beta = _slope(cov, var)
+        beta[0] = np.nan
+        return beta
+
+    sums = np.cumsum(np.column_stack([xc, yc, xc * xc, xc * yc]), axis=0)
+    counts = np.arange(1, n_obs + 1, dtype=np.float64)
+    if kind == 'rolling':
+        window = param
+        sums[window:] = sums[window:] - sums[:-window]
+        counts = np.minimum(counts, window)
+    s_x, s_y, s_xx, s_xy = sums.T
+    cov = s_xy - s_x * s_y / counts
+    var = s_xx - s_x * s_x / counts
+    beta = _slope(cov, var)
+    if kind == 'rolling':
+        beta[:param - 1] = np.nan
+    return beta
 
 def compute_ols_beta(y: pd.Series, x: pd.Series) -> float:
     """Computes the Hedge Ratio (Beta) via OLS Regression."""
@@ -9,41 +103,55 @@ def compute_ols_beta(y: pd.Series, x: pd.Series) -> float:
     data = pd.DataFrame({'Y': y, 'X': x}).dropna()
     if data.empty:
         return 0.0
-        
-    
-    X = sm.add_constant(data['X'])
-    try:
-        model = sm.OLS(data['Y'], X).fit()
-        return model.params['X']
-    except Exception:
-        
-        return 0.0
 
-def compute_spread_zscore(y: pd.Series, x: pd.Series, window: int) -> pd.DataFrame:
-    """Computes Spread and Rolling Z-Score."""
-    beta = compute_ols_beta(y, x) 
-    
-    
+    beta = compute_hedge_ratios(data['Y'].to_numpy(), data['X'].to_numpy(), 'static')[0]
+    return float(beta) if np.isfinite(beta) else 0.0
+
+def compute_spread_zscore(y: pd.Series, x: pd.Series, window: int, beta_mode: str = 'static') -> pd.DataFrame:
+    """Computes Spread and Rolling Z-Score, with a per-bar Beta column for the chosen beta_mode.
+
+    For 'kalman' the ZScore is the filter's innovation z-score (one-step
+    prediction error over its predicted std) and `window` is the number of
+    bars filtered before it is reported.
+
+    The legs are joined on their index; callers holding per-leg bar arrays
+    align them with alignment.align_pair and use `spread_zscore_arrays`.
+    """
     combined = pd.DataFrame({'Y': y, 'X': x}).dropna()
-    spread = combined['Y'] - beta * combined['X']
-    
-    
-    rolling_mean = spread.rolling(window=window).mean()
-    rolling_std = spread.rolling(window=window).std()
-    
-    
-    z_score = np.divide(spread - rolling_mean, rolling_std, 
-                        out=np.full_like(spread, np.nan), where=rolling_std!=0)
-    
+    spread, z_score, beta = spread_zscore_arrays(combined['Y'].to_numpy(), combined['X'].to_numpy(),
+                                                 window, beta_mode)
     results = pd.DataFrame({
         'Spread': spread,
         'ZScore': z_score,
         'Beta': beta
-    })
+    }, index=combined.index)
     return results
 
-def run_adf_test(series: pd.Series) -> dict:
-    """Performs the Augmented Dickey-Fuller test for stationarity."""
+def spread_zscore_arrays(y: np.ndarray, x: np.ndarray, window: int,
+                         beta_mode: str = 'static') -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(Spread, ZScore, Beta) of `compute_spread_zscore` for closes already aligned row by row."""
+    y = np.asarray(y, dtype=np.float64)
+    x = np.asarray(x, dtype=np.float64)
+    kind, param = parse_beta_mode(beta_mode)
+    if kind == 'kalman':
+        beta, z_score = kalman_filter(y, x, window, *param)
+        return y - beta * x, z_score, beta
+
+    beta = compute_hedge_ratios(y, x, beta_mode)
+    if kind == 'static':
+        # A degenerate static fit falls back to 0.0, matching compute_ols_beta.
+        beta = np.nan_to_num(beta, nan=0.0)
+
+    spread = pd.Series(y - beta * x)
+    rolling_mean = spread.rolling(window=window).mean()
+    rolling_std = spread.rolling(window=window).std()
+    z_score = np.divide(spread - rolling_mean, rolling_std,
+                        out=np.full(len(spread), np.nan), where=rolling_std != 0)
+    return spread.to_numpy(), np.asarray(z_score, dtype=np.float64), beta
+
+def run_adf_test(series: pd.Series, max_lags: Optional[int] = None) -> dict:
+    """Performs the Augmented Dickey-Fuller test for stationarity (lag order chosen by AIC)."""
+    series = series.dropna()
     if len(series) < 10:
         return {
             'Test Statistic': np.nan,
@@ -52,16 +160,17 @@ def run_adf_test(series: pd.Series) -> dict:
             'Result': "Insufficient data points"
         }
         
-    result = adfuller(series.dropna())
+    result = adf_test_batch(series.to_numpy(dtype=np.float64), max_lags=max_lags)
+    stat, p_value = float(result['statistic'][0]), float(result['pvalue'][0])
     
 
-    result_str = 'Stationary (Reject Null Hypothesis)' if result[1] < 0.05 else 'Non-Stationary (Fail to Reject Null Hypothesis)'
+    result_str = 'Stationary (Reject Null Hypothesis)' if p_value < 0.05 else 'Non-Stationary (Fail to Reject Null Hypothesis)'
     
     return {
-        'Test Statistic': result[0],
-        'p-value': result[1],
-        'Lags Used': result[2],
-        'Number of Observations': result[3],
-        'Critical Values': result[4],
+        'Test Statistic': stat,
+        'p-value': p_value,
+        'Lags Used': int(result['lags'][0]),
+        'Number of Observations': int(result['nobs'][0]),
+        'Critical Values': dict(zip(CRITICAL_LEVELS, result['critical_values'][0].tolist())),
         'Result': result_str
-    }
\ No newline at end of file
+    }
@@ -0,0 +1,147 @@
+import asyncio
+import threading
+from collections import OrderedDict, defaultdict
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Sequence, Set, Tuple
+
+ANALYTICS_CACHE_SIZE = 256
+
+# (symbol, timeframe): a result depends on the bars of each of its legs.
+Series = Tuple[str, str]
+
+
+class AnalyticsCache:
+    """Process-wide LRU of analytics results with single-flight computation.
+
+    Callers key results by everything the computation depends on (pair,
+    parameters, last bar timestamps) and name the series it reads. The first
+    request for a key computes it; identical requests arriving meanwhile
+    wait for that result instead of recomputing. `on_bars` (a writer-thread
+    bar listener) drops every entry that read a series which just got a
+    bar, which also covers rollup buckets rewritten under the same
+    timestamp. A result computed while one of its series changed is handed
+    to its waiters but not stored.
+    """
+
+    def __init__(self, max_entries: int = ANALYTICS_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, Tuple[Any, Tuple[Series, ...]]]" = OrderedDict()
+        self._in_flight: Dict[Hashable, Future] = {}
+        self._by_series: Dict[Series, Set[Hashable]] = defaultdict(set)
+        self._generations: Dict[Series, int] = defaultdict(int)
+        self.hits = 0
+        self.misses = 0
+        self.shared = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get_or_compute(self, key: Hashable, series: Sequence[Series], compute: Callable[[], Any]) -> Tuple[Any, bool]:
+        """Returns (result, cached); `cached` is False only for the request that computed it."""
+        series = tuple(series)
+        found, future, generations = self._lookup(key, series)
+        if found is not None:
+            return found[0], True
+        if generations is None:
+            return future.result(), True
+        try:
+            result = compute()
+        except BaseException as e:
+            self._fail(key, future, e)
+            raise
+        self._complete(key, series, generations, future, result)
+        return result, False
+
+    async def get_or_compute_async(self, key: Hashable, series: Sequence[Series],
+                                   compute: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """`get_or_compute` for coroutine computations; waiters await instead of blocking the loop."""
+        series = tuple(series)
+        found, future, generations = self._lookup(key, series)
+        if found is not None:
+            return found[0], True
+        if generations is None:
+            return await asyncio.wrap_future(future), True
+        try:
+            result = await compute()
+        except BaseException as e:
+            self._fail(key, future, e)
+            raise
+        self._complete(key, series, generations, future, result)
+        return result, False
+
+    def _lookup(self, key: Hashable, series: Tuple[Series, ...]) -> Tuple[Optional[tuple], Future, Optional[tuple]]:
+        """(entry, None, None) on a hit; otherwise the in-flight future and, for the
+        request that must compute it, the series generations it started from."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry, None, None
+            future = self._in_flight.get(key)
+            if future is not None:
+                self.shared += 1
+                return None, future, None
+            future = self._in_flight[key] = Future()
+            self.misses += 1
+            return None, future, tuple(self._generations[s] for s in series)
+
+    def _fail(self, key: Hashable, future: Future, error: BaseException):
+        with self._lock:
+            del self._in_flight[key]
+        future.set_exception(error)
+
+    def _complete(self, key: Hashable, series: Tuple[Series, ...], generations: tuple, future: Future, result: Any):
+        with self._lock:
+            del self._in_flight[key]
+            if generations == tuple(self._generations[s] for s in series):
+                self._store(key, result, series)
+        future.set_result(result)
+
+    def _store(self, key: Hashable, result: Any, series: Tuple[Series, ...]):
+        self._entries[key] = (result, series)
+        for s in series:
+            self._by_series[s].add(key)
+        while len(self._entries) > self.max_entries:
+            old_key, (_, old_series) = self._entries.popitem(last=False)
+            self._unindex(old_key, old_series)
+            self.evictions += 1
+
+    def _unindex(self, key: Hashable, series: Tuple[Series, ...]):
+        for s in series:
+            keys = self._by_series.get(s)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_series[s]
+
+    def on_bars(self, bars: List[Tuple[str, str, int, Sequence[float]]]):
+        """Writer-thread bar listener: invalidates results that read any of the updated series."""
+        with self._lock:
+            for symbol, timeframe, _, _ in bars:
+                s = (symbol, timeframe)
+                self._generations[s] += 1
+                for key in self._by_series.pop(s, ()):
+                    entry = self._entries.pop(key, None)
+                    if entry is not None:
+                        self._unindex(key, entry[1])
+                        self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_series.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses + self.shared
+        return {
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'in_flight': len(self._in_flight),
+            'hits': self.hits,
+            'misses': self.misses,
+            'shared': self.shared,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations,
+            'hit_ratio': round((self.hits + self.shared) / lookups, 4) if lookups else None,
+        }
@@ -1,57 +1,108 @@
 import streamlit as st
 import pandas as pd
 import plotly.graph_objects as go
+import io
+import json
 import requests
 import time 
 
+try:
+    import pyarrow as pa
+    from pyarrow import ipc
+except ImportError:  # optional: falls back to columnar JSON
+    pa = ipc = None
+
 
 API_BASE_URL = "http://localhost:8000/api/v1"
 SYMBOL_OPTIONS = ['BTCUSDT', 'ETHUSDT']
+# The dashboard is redrawn at most this often while pushed updates stream in.
+STREAM_RENDER_INTERVAL = 0.5
+HISTORY_BARS = 500
+# Longer history spans are fetched decimated server-side to about this many points per chart.
+CHART_MAX_POINTS = 1500
+HISTORY_SPANS = {'Latest bars': None, '1 hour': 3600, '6 hours': 6 * 3600, '1 day': 86400,
+                 '7 days': 7 * 86400, '30 days': 30 * 86400}
+# Column-oriented responses skip the per-row JSON objects on both ends.
+ARROW_MEDIA_TYPE = 'application/vnd.apache.arrow.stream'
+COLUMNAR_MEDIA_TYPE = 'application/vnd.quant.columnar+json'
+FRAME_ACCEPT = ', '.join(([ARROW_MEDIA_TYPE] if pa is not None else [])
+                         + [COLUMNAR_MEDIA_TYPE, 'application/json'])
 
 
-@st.cache_data(ttl=1) 
-def fetch_ohlc_data(symbol):
-    try:
-        response = requests.get(f"{API_BASE_URL}/ohlc/{symbol}")
-        response.raise_for_status()
+def read_frame(response):
+    """Timestamp-indexed DataFrame from an Arrow, columnar JSON or records response."""
+    content_type = response.headers.get('content-type', '').split(';')[0].strip()
+    if content_type == ARROW_MEDIA_TYPE:
+        data = ipc.open_stream(io.BytesIO(response.content)).read_pandas()
+    elif content_type == COLUMNAR_MEDIA_TYPE:
         data = pd.DataFrame(response.json())
-        
         if not data.empty:
-            data['timestamp'] = pd.to_datetime(data['timestamp'], errors='coerce') 
-            data = data.dropna(subset=['timestamp']) 
-            return data.set_index('timestamp').sort_index()
+            data['timestamp'] = pd.to_datetime(data['timestamp'], unit='ms')
+    else:
+        data = pd.DataFrame(response.json())
+        if not data.empty:
+            data['timestamp'] = pd.to_datetime(data['timestamp'], errors='coerce')
+    if data.empty:
         return pd.DataFrame()
+    data = data.dropna(subset=['timestamp'])
+    return data.set_index('timestamp').sort_index()
+
+
+@st.cache_data(ttl=30)
+def fetch_symbol_options():
+    """Symbols stored by the backend, falling back to the defaults."""
+    try:
+        response = requests.get(f"{API_BASE_URL}/symbols")
+        response.raise_for_status()
+        symbols = response.json()
+        return symbols if len(symbols) >= 2 else SYMBOL_OPTIONS
+    except Exception:
+        return SYMBOL_OPTIONS
+
+
+def history_range(span_s):
+    """Range / point-budget query parameters for a history span (None: the latest bars)."""
+    if span_s is None:
+        return {}
+    return {"start": int((time.time() - span_s) * 1000), "max_points": CHART_MAX_POINTS}
+
+@st.cache_data(ttl=1) 
+def fetch_ohlc_data(symbol, timeframe, span_s=None):
+    try:
+        response = requests.get(f"{API_BASE_URL}/ohlc/{symbol}", params={"timeframe": timeframe, **history_range(span_s)},
+                                headers={"Accept": FRAME_ACCEPT})
+        response.raise_for_status()
+        return read_frame(response)
         
     except Exception as e:
         return pd.DataFrame()
 
 @st.cache_data(ttl=1)
-def fetch_analytics_data(symbol_y, symbol_x, timeframe, window):
+def fetch_analytics_data(symbol_y, symbol_x, timeframe, window, beta_mode, span_s=None):
     try:
         params = {
             "symbol_y": symbol_y,
             "symbol_x": symbol_x,
             "timeframe": timeframe,
-            "window": window
+            "window": window,
+            "beta_mode": beta_mode,
+            **history_range(span_s)
         }
-        response = requests.post(f"{API_BASE_URL}/analytics/zscore", json=params)
+        response = requests.post(f"{API_BASE_URL}/analytics/zscore", json=params,
+                                 headers={"Accept": FRAME_ACCEPT})
         response.raise_for_status()
-        data = pd.DataFrame(response.json())
-        if not data.empty:
-            data['timestamp'] = pd.to_datetime(data['timestamp'], errors='coerce')
-            data = data.dropna(subset=['timestamp'])
-            return data.set_index('timestamp').sort_index()
-        return pd.DataFrame()
+        return read_frame(response)
     except Exception as e:
         return pd.DataFrame()
 
-def trigger_adf_test(symbol_y, symbol_x, timeframe, window):
+def trigger_adf_test(symbol_y, symbol_x, timeframe, window, beta_mode):
     try:
         params = {
             "symbol_y": symbol_y,
             "symbol_x": symbol_x,
             "timeframe": timeframe,
-            "window": window
+            "window": window,
+            "beta_mode": beta_mode
         }
         response = requests.post(f"{API_BASE_URL}/analytics/adf", json=params)
         response.raise_for_status()
@@ -60,6 +111,77 @@ def trigger_adf_test(symbol_y, symbol_x, timeframe, window):
         st.error(f"ADF Test Failed: {e}")
         return {"status": "ADF Test failed."}
 
+def trigger_pair_scan(timeframe):
+    try:
+        response = requests.post(f"{API_BASE_URL}/scan", json={"timeframe": timeframe})
+        response.raise_for_status()
+        return response.json()
+    except Exception as e:
+        st.error(f"Pair Scan Failed: {e}")
+        return {"status": "Pair scan failed.", "pairs": []}
+
+def fetch_live_alerts():
+    try:
+        response = requests.get(f"{API_BASE_URL}/alerts/live")
+        response.raise_for_status()
+        return response.json()
+    except Exception:
+        return None
+
+def iter_stream_events(symbol_y, symbol_x, timeframe, window, beta_mode):
+    """Yields (event, data) pairs from the backend's Server-Sent Events stream."""
+    params = {
+        "symbol_y": symbol_y,
+        "symbol_x": symbol_x,
+        "timeframe": timeframe,
+        "window": window,
+        "beta_mode": beta_mode
+    }
+    # The server sends a keepalive every 15 s, well inside the read timeout.
+    with requests.get(f"{API_BASE_URL}/stream", params=params, stream=True, timeout=(5, 60)) as response:
+        response.raise_for_status()
+        event, data = None, []
+        for line in response.iter_lines(decode_unicode=True):
+            if line:
+                if line.startswith('event:'):
+                    event = line[6:].strip()
+                elif line.startswith('data:'):
+                    data.append(line[5:].strip())
+                continue
+            if event and data:
+                yield event, json.loads('\n'.join(data))
+            event, data = None, []
+
+def upsert_row(df, ts, row):
+    """Inserts or replaces the row at `ts`, keeping the frame sorted and bounded."""
+    if df.empty:
+        return pd.DataFrame([row], index=pd.DatetimeIndex([ts], name='timestamp'))
+    df.loc[ts, list(row)] = list(row.values())
+    if not df.index.is_monotonic_increasing:
+        df = df.sort_index()
+    max_rows = max(HISTORY_BARS, CHART_MAX_POINTS)
+    return df.iloc[-max_rows:].copy() if len(df) > max_rows else df
+
+def apply_stream_events(events, frames, live_alerts, sym_y, sym_x, deadline):
+    """Folds pushed events into the local frames until `deadline`; returns the updated alert list."""
+    for event, data in events:
+        ts = pd.to_datetime(data['timestamp'], unit='ms')
+        if event == 'bar' and data['symbol'] in (sym_y, sym_x):
+            key = 'y' if data['symbol'] == sym_y else 'x'
+            frames[key] = upsert_row(frames[key], ts, {col: data[col] for col in ('open', 'high', 'low', 'close', 'volume')})
+        elif event == 'analytics':
+            frames['analytics'] = upsert_row(frames['analytics'], ts, {col: data[col] for col in ('Spread', 'ZScore', 'Beta')})
+        elif event == 'alert':
+            key = f"[rule {data['rule_id']}]"
+            live_alerts = [a for a in (live_alerts or []) if key not in a]
+            if data['state'] == 'triggered':
+                live_alerts.append(data['message'])
+        if time.monotonic() >= deadline:
+            break
+    else:
+        raise ConnectionError("stream closed by server")
+    return live_alerts
+
 # --- Plotting Functions ---
 
 def plot_price_chart(df: pd.DataFrame, symbol: str) -> go.Figure:
@@ -113,21 +235,41 @@ def main():
 
         
         st.subheader("Symbol Selection")
-        sym_y = st.selectbox("Symbol Y (Dependent)", SYMBOL_OPTIONS, index=0)
-        sym_x = st.selectbox("Symbol X (Independent)", SYMBOL_OPTIONS, index=1)
+        symbol_options = fetch_symbol_options()
+        sym_y = st.selectbox("Symbol Y (Dependent)", symbol_options, index=0)
+        sym_x = st.selectbox("Symbol X (Independent)", symbol_options, index=1)
         
        
         st.subheader("Data & Model Params")
         timeframe = st.sidebar.selectbox('Resample Timeframe', ['1s','1m', '5m', '1h', '1d'], index=0)
+        history_span = HISTORY_SPANS[st.selectbox('History', list(HISTORY_SPANS), index=0)]
         rolling_window = st.slider("Rolling Window (Z-Score/Correlation)", min_value=1, max_value=200, value=20, step=1)
+        beta_kind = st.selectbox("Hedge Ratio Mode", ['static', 'expanding', 'rolling', 'ewm', 'kalman'], index=0)
+        if beta_kind == 'rolling':
+            beta_mode = f"rolling({st.number_input('Beta Window (bars)', min_value=2, value=100, step=1)})"
+        elif beta_kind == 'ewm':
+            beta_mode = f"ewm({st.number_input('Beta Half-life (bars)', min_value=1, value=50, step=1)})"
+        elif beta_kind == 'kalman':
+            delta = st.number_input('State Noise (delta)', min_value=1e-9, max_value=0.5, value=1e-7, format='%.1e')
+            obs_var = st.number_input('Observation Noise (var)', min_value=1e-12, value=1e-7, format='%.1e')
+            beta_mode = f"kalman({delta:g},{obs_var:g})"
+        else:
+            beta_mode = beta_kind
         
         
         if st.button("Run ADF Test"):
             with st.spinner("Running ADF Test on Spread..."):
-                adf_result = trigger_adf_test(sym_y, sym_x, timeframe, rolling_window)
+                adf_result = trigger_adf_test(sym_y, sym_x, timeframe, rolling_window, beta_mode)
                 st.subheader("ADF Test Results")
                 st.json(adf_result)
 
+        if st.button("Scan All Pairs"):
+            with st.spinner("Scanning pair universe..."):
+                scan_result = trigger_pair_scan(timeframe)
+                st.subheader("Top Pairs")
+                st.caption(f"{scan_result.get('status')} ({scan_result.get('compute_ms', 0):.0f} ms)")
+                st.dataframe(pd.DataFrame(scan_result.get('pairs', [])))
+
          
         st.subheader("Data Export")
         download_button_placeholder = st.empty()
@@ -139,12 +281,29 @@ def main():
 
     
     # --- Main Refresh Loop ---
+    # History is fetched once per (re)connect; after that the backend pushes
+    # only new bars, analytics rows and alert transitions.
+    events = None
     while True:
         
-        
-        df_y = fetch_ohlc_data(sym_y)
-        df_x = fetch_ohlc_data(sym_x)
-        analytics_df = fetch_analytics_data(sym_y, sym_x, timeframe, rolling_window)
+        if events is None:
+            frames = {
+                'y': fetch_ohlc_data(sym_y, timeframe, history_span),
+                'x': fetch_ohlc_data(sym_x, timeframe, history_span),
+                'analytics': fetch_analytics_data(sym_y, sym_x, timeframe, rolling_window, beta_mode, history_span),
+            }
+            live_alerts = fetch_live_alerts()
+            events = iter_stream_events(sym_y, sym_x, timeframe, rolling_window, beta_mode)
+        else:
+            try:
+                live_alerts = apply_stream_events(events, frames, live_alerts, sym_y, sym_x,
+                                                  time.monotonic() + STREAM_RENDER_INTERVAL)
+            except Exception as e:
+                data_status_placeholder.warning(f"Live stream interrupted ({e}), reconnecting...")
+                events = None
+                time.sleep(1)
+                continue
+        df_y, df_x, analytics_df = frames['y'], frames['x'], frames['analytics']
 
         
         data_status_placeholder.info(
@@ -179,13 +338,9 @@ def main():
                     col2.metric("Latest Z-Score", "Calculating...")
                 
                 
-                live_alerts = []
-                try:
-                    alert_response = requests.get(f"{API_BASE_URL}/alerts/live")
-                    alert_response.raise_for_status()
-                    live_alerts = alert_response.json()
+                if live_alerts is not None:
                     col3.metric("Live Alerts Triggered", len(live_alerts))
-                except:
+                else:
                     col3.metric("Live Alerts Triggered", "N/A")
                 
                 if live_alerts:
@@ -238,9 +393,6 @@ def main():
                         
                         key=f'download_button_{unique_key_suffix}' 
                     )
-        
-        
-        time.sleep(0.5)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,266 @@
+import asyncio
+import logging
+import math
+import os
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from analytics import compute_spread_zscore, parse_beta_mode
+from compute_pool import ComputeOverloaded, ComputePool
+
+logger = logging.getLogger(__name__)
+
+BACKTEST_FIELDS = ('pnl', 'sharpe', 'max_drawdown', 'turnover', 'trades', 'exposure')
+# Upper bound on (bars x threshold pairs) cells held per time chunk; keeps a
+# worker's scratch arrays around 100 MB whatever the grid and history size.
+CHUNK_CELLS = 1 << 22
+YEAR_MS = 365 * 86_400_000
+
+# Worker processes of the backtest pool, kept apart from the request analytics
+# pool so a long sweep never delays the z-score / ADF endpoints or the scheduler.
+BACKTEST_WORKERS = int(os.environ.get('QUANT_BACKTEST_WORKERS', 1))
+# Sweeps queued or running before new ones are turned away.
+BACKTEST_MAX_PENDING = int(os.environ.get('QUANT_BACKTEST_MAX_PENDING', 4))
+# Limit on one sweep; a month of 1s bars takes tens of seconds per window.
+BACKTEST_TIMEOUT_S = float(os.environ.get('QUANT_BACKTEST_TIMEOUT_S', 600.0))
+# Finished backtest jobs kept for their results.
+BACKTEST_KEEP_JOBS = int(os.environ.get('QUANT_BACKTEST_KEEP_JOBS', 64))
+
+
+def _last_index(events: np.ndarray, offset: int, carry: np.ndarray) -> np.ndarray:
+    """Per row, the global bar index of the latest True column so far (-1 if none), continuing from `carry`."""
+    idx = np.where(events, np.arange(offset, offset + events.shape[1], dtype=np.int32), np.int32(-1))
+    np.maximum.accumulate(idx, axis=1, out=idx)
+    np.maximum(idx, carry[:, None], out=idx)
+    return idx
+
+
+def backtest_grid(y: np.ndarray, x: np.ndarray, zscore: np.ndarray, beta: np.ndarray,
+                  entries: np.ndarray, exits: np.ndarray, fee_bps: float = 0.0,
+                  bar_ms: int = 1000) -> np.ndarray:
+    """Z-score mean reversion on one spread for every (entry, exit) pair at once.
+
+    The spread is long (1 unit of y, -beta units of x) once z falls below
+    -entry and short once it rises above +entry; a long is closed when z
+    is back at or above -exit, a short at or below +exit, and an opposite
+    entry flips the position. A position decided at a bar's close earns the
+    next bar's spread change. `fee_bps` is charged on the gross notional
+    traded. Instead of stepping through bars, the position at bar t comes
+    from the latest entry and exit events up to t, which are running maxima
+    of event indices, so each time chunk is a handful of array passes over
+    an (entries, exits, bars) grid, with time as the contiguous axis.
+
+    Returns (len(entries), len(exits), len(BACKTEST_FIELDS)); pairs with
+    exit >= entry are NaN.
+    """
+    entries = np.asarray(entries, dtype=np.float64)[:, None]
+    exits = np.asarray(exits, dtype=np.float64)[:, None]
+    n_bars, n_entry, n_exit = len(zscore), len(entries), len(exits)
+    cells = n_entry * n_exit
+
+    step = np.zeros(n_bars)
+    if n_bars > 1:
+        step[:-1] = np.diff(y) - beta[:-1] * np.diff(x)
+    step = np.nan_to_num(step, nan=0.0, posinf=0.0, neginf=0.0)
+    notional = np.nan_to_num(y + np.abs(beta) * x, nan=0.0) * (fee_bps / 10_000.0)
+
+    last_long = np.full(n_entry, -1, dtype=np.int32)
+    last_short = np.full(n_entry, -1, dtype=np.int32)
+    last_long_exit = np.full(n_exit, -1, dtype=np.int32)
+    last_short_exit = np.full(n_exit, -1, dtype=np.int32)
+    prev_pos = np.zeros((cells, 1), dtype=np.int8)
+    cum = np.zeros(cells)
+    peak = np.zeros(cells)
+    drawdown = np.zeros(cells)
+    total = np.zeros(cells)
+    total_sq = np.zeros(cells)
+    turnover = np.zeros(cells)
+    trades = np.zeros(cells)
+    exposure = np.zeros(cells)
+
+    chunk = max(1024, CHUNK_CELLS // max(cells, 1))
+    with np.errstate(invalid='ignore'):
+        for start in range(0, n_bars, chunk):
+            z = zscore[None, start:start + chunk]
+            bars = slice(start, start + z.shape[1])
+            long_at = _last_index(z < -entries, start, last_long)
+            short_at = _last_index(z > entries, start, last_short)
+            long_exit_at = _last_index(z >= -exits, start, last_long_exit)
+            short_exit_at = _last_index(z <= exits, start, last_short_exit)
+            last_long, last_short = long_at[:, -1], short_at[:, -1]
+            last_long_exit, last_short_exit = long_exit_at[:, -1], short_exit_at[:, -1]
+
+            is_long = (long_at > short_at)[:, None, :] & (long_exit_at[None, :, :] < long_at[:, None, :])
+            is_short = (short_at > long_at)[:, None, :] & (short_exit_at[None, :, :] < short_at[:, None, :])
+            pos = (is_long.view(np.int8) - is_short.view(np.int8)).reshape(cells, -1)
+
+            changes = np.diff(pos, axis=1, prepend=prev_pos)
+            np.abs(changes, out=changes)
+            prev_pos = pos[:, -1:].copy()
+            pnl = pos * step[None, bars]
+            pnl -= changes * notional[None, bars]
+
+            path = np.cumsum(pnl, axis=1)
+            path += cum[:, None]
+            running_peak = np.maximum.accumulate(path, axis=1)
+            np.maximum(running_peak, peak[:, None], out=running_peak)
+            np.maximum(drawdown, (running_peak - path).max(axis=1), out=drawdown)
+            cum, peak = path[:, -1].copy(), running_peak[:, -1].copy()
+
+            held = pos != 0
+            total += pnl.sum(axis=1)
+            total_sq += np.einsum('ct,ct->c', pnl, pnl)
+            turnover += changes.sum(axis=1, dtype=np.int64)
+            trades += (held & (changes > 0)).sum(axis=1)
+            exposure += held.sum(axis=1)
+
+    mean = total / max(n_bars, 1)
+    var = total_sq / max(n_bars, 1) - mean * mean
+    std = np.sqrt(np.maximum(var, 0.0))
+    sharpe = np.divide(mean, std, out=np.full(cells, np.nan), where=std > 1e-12) * math.sqrt(YEAR_MS / bar_ms)
+    result = np.stack([total, sharpe, drawdown, turnover, trades, exposure / max(n_bars, 1)], axis=-1)
+    result = result.reshape(n_entry, n_exit, len(BACKTEST_FIELDS))
+    result[exits[:, 0][None, :] >= entries[:, 0][:, None]] = np.nan
+    return result
+
+
+def backtest_window(y: np.ndarray, x: np.ndarray, window: int, beta_mode: str,
+                    entries: np.ndarray, exits: np.ndarray, fee_bps: float, bar_ms: int) -> np.ndarray:
+    """`backtest_grid` over the spread / z-score that /analytics/zscore reports for these parameters."""
+    frame = compute_spread_zscore(pd.Series(y), pd.Series(x), window, beta_mode)
+    return backtest_grid(y, x, frame['ZScore'].to_numpy(dtype=np.float64), frame['Beta'].to_numpy(dtype=np.float64),
+                         entries, exits, fee_bps, bar_ms)
+
+
+def backtest_task(arrays: Dict[str, np.ndarray], window: int, beta_mode: str, entries: np.ndarray,
+                  exits: np.ndarray, fee_bps: float, bar_ms: int) -> np.ndarray:
+    """Compute pool task: one window / beta mode over the shared `y` and `x` closes."""
+    return backtest_window(arrays['y'], arrays['x'], window, beta_mode, entries, exits, fee_bps, bar_ms)
+
+
+def validate_grid(windows: Sequence[int], beta_modes: Sequence[str], rank_by: str = 'sharpe'):
+    """Raises ValueError for a sweep grid or ranking field `sweep` / `rank_results` would reject."""
+    for beta_mode in beta_modes:
+        parse_beta_mode(beta_mode)
+    if any(int(w) < 2 for w in windows):
+        raise ValueError("windows must be at least 2")
+    if rank_by not in BACKTEST_FIELDS:
+        raise ValueError(f"Unknown ranking field {rank_by!r}; expected one of {', '.join(BACKTEST_FIELDS)}")
+
+
+async def sweep(pool: ComputePool, y: np.ndarray, x: np.ndarray, windows: Sequence[int], entries: Sequence[float],
+                exits: Sequence[float], beta_modes: Sequence[str] = ('static',), fee_bps: float = 0.0,
+                bar_ms: int = 1000) -> Dict[str, np.ndarray]:
+    """Backtests every windows x entries x exits x beta_modes combination on aligned closes.
+
+    Each (beta mode, window) spread is one task of a batch on `pool`, with
+    the prices copied once into shared memory; its entry / exit grid is
+    broadcast inside the task. At most one task per worker is in flight,
+    so concurrent sweeps interleave and a timed-out one stops after its
+    running tasks. Returns flat per-combination arrays
+    (parameters plus BACKTEST_FIELDS), skipping pairs with exit >= entry.
+    """
+    validate_grid(windows, beta_modes)
+    entries = np.asarray(sorted(set(entries)), dtype=np.float64)
+    exits = np.asarray(sorted(set(exits)), dtype=np.float64)
+    tasks = [(int(w), b) for b in dict.fromkeys(beta_modes) for w in sorted(set(windows))]
+    y = np.ascontiguousarray(y, dtype=np.float64)
+    x = np.ascontiguousarray(x, dtype=np.float64)
+
+    grids = await pool.run_batch(backtest_task, {'y': y, 'x': x},
+                                 [(w, b, entries, exits, fee_bps, bar_ms) for w, b in tasks],
+                                 max_in_flight=max(pool.workers, 1))
+
+    entry_grid, exit_grid = np.meshgrid(entries, exits, indexing='ij')
+    valid = (exit_grid < entry_grid).ravel()
+    per_task = int(valid.sum())
+    result = {
+        'window': np.repeat([w for w, _ in tasks], per_task),
+        'beta_mode': np.repeat(np.asarray([b for _, b in tasks], dtype=object), per_task),
+        'entry': np.tile(entry_grid.ravel()[valid], len(tasks)),
+        'exit': np.tile(exit_grid.ravel()[valid], len(tasks)),
+    }
+    metrics = np.concatenate([g.reshape(-1, len(BACKTEST_FIELDS))[valid] for g in grids]) if grids \
+        else np.empty((0, len(BACKTEST_FIELDS)))
+    for i, field in enumerate(BACKTEST_FIELDS):
+        result[field] = metrics[:, i]
+    return result
+
+
+def rank_results(result: Dict[str, np.ndarray], top: Optional[int] = None, by: str = 'sharpe') -> List[Dict]:
+    """Rows ordered by `by` (one of BACKTEST_FIELDS; drawdown ascending, others descending), NaNs last."""
+    if by not in BACKTEST_FIELDS:
+        raise ValueError(f"Unknown ranking field {by!r}; expected one of {', '.join(BACKTEST_FIELDS)}")
+    key = result[by] if by == 'max_drawdown' else -result[by]
+    order = np.argsort(np.nan_to_num(key, nan=np.inf), kind='stable')
+    if top is not None:
+        order = order[:top]
+    rows = []
+    for i in order:
+        row = {'window': int(result['window'][i]), 'beta_mode': result['beta_mode'][i],
+               'entry': float(result['entry'][i]), 'exit': float(result['exit'][i])}
+        for field in BACKTEST_FIELDS:
+            value = float(result[field][i])
+            row[field] = value if math.isfinite(value) else None
+        rows.append(row)
+    return rows
+
+
+class BacktestJobs:
+    """Backtests run as background tasks on the event loop, looked up by job id.
+
+    At most `max_running` jobs run at once; the latest `keep` finished ones
+    are kept with their result or error.
+    """
+
+    def __init__(self, max_running: int = BACKTEST_MAX_PENDING, keep: int = BACKTEST_KEEP_JOBS,
+                 timeout: float = BACKTEST_TIMEOUT_S):
+        self.max_running = max_running
+        self.keep = keep
+        self.timeout = timeout
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    def start(self, run: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        """Starts `await run()` as a new job; raises ComputeOverloaded when `max_running` jobs are running."""
+        if len(self._tasks) >= self.max_running:
+            raise ComputeOverloaded(f"{len(self._tasks)} backtests already running")
+        job = {'job_id': uuid.uuid4().hex, 'state': 'running', 'submitted_ms': int(time.time() * 1000),
+               'finished_ms': None, 'error': None, 'result': None}
+        self._jobs[job['job_id']] = job
+        self._tasks[job['job_id']] = asyncio.get_running_loop().create_task(self._run(job, run))
+        return job
+
+    async def _run(self, job: Dict[str, Any], run: Callable[[], Awaitable[Dict[str, Any]]]):
+        try:
+            job['result'] = await run()
+            job['state'] = 'done'
+        except asyncio.CancelledError:
+            job['state'] = 'cancelled'
+            raise
+        except asyncio.TimeoutError:
+            job['state'], job['error'] = 'failed', f"Backtest did not finish within {self.timeout:g}s"
+        except Exception as e:
+            job['state'], job['error'] = 'failed', str(e) or type(e).__name__
+            if not isinstance(e, (ValueError, ComputeOverloaded)):
+                logger.error("Backtest job failed", extra={'job_id': job['job_id'], 'error': str(e)})
+        finally:
+            job['finished_ms'] = int(time.time() * 1000)
+            self._tasks.pop(job['job_id'], None)
+            finished = [job_id for job_id, j in self._jobs.items() if j['finished_ms'] is not None]
+            for job_id in finished[:max(len(finished) - self.keep, 0)]:
+                del self._jobs[job_id]
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self._jobs.get(job_id)
+
+    async def stop(self):
+        """Cancels the running jobs."""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,115 @@
+import heapq
+import re
+from collections import namedtuple
+from typing import Callable, Dict, List, Optional
+
+Bar = namedtuple('Bar', ['symbol', 'timestamp', 'open', 'high', 'low', 'close', 'volume', 'ticks'])
+
+_TIMEFRAME_UNITS_MS = {'ms': 1, 's': 1000, 'm': 60_000, 'h': 3_600_000, 'd': 86_400_000}
+_TIMEFRAME_RE = re.compile(r'^(\d+)(ms|s|m|h|d)$')
+
+
+def timeframe_to_ms(timeframe: str) -> int:
+    """Converts a timeframe string such as '1s', '5m' or '1h' to milliseconds."""
+    match = _TIMEFRAME_RE.match(timeframe.strip())
+    if not match or int(match.group(1)) <= 0:
+        raise ValueError(f"Unsupported timeframe: {timeframe!r}")
+    return int(match.group(1)) * _TIMEFRAME_UNITS_MS[match.group(2)]
+
+
+class _OpenBar:
+    __slots__ = ('open', 'high', 'low', 'close', 'volume', 'ticks')
+
+    def __init__(self, price: float, qty: float):
+        self.open = self.high = self.low = self.close = price
+        self.volume = qty
+        self.ticks = 1
+
+
+class BarAggregator:
+    """Incremental per-symbol OHLCV builder.
+
+    Each tick updates its bar in O(1). Bars are only emitted once they are
+    finished: when the watermark (the latest event time seen, or a time
+    passed to `advance` for symbols that have gone quiet) moves past the
+    bar's end plus `grace_ms`.
+    Ticks that arrive out of order inside the grace period are folded into
+    their bar; ticks for bars that were already emitted are counted in
+    `late_ticks` and dropped.
+    """
+
+    def __init__(self, timeframe: str = '1s', grace_ms: int = 0,
+                 on_bars: Optional[Callable[[List[Bar]], None]] = None):
+        self.timeframe = timeframe
+        self.bar_ms = timeframe_to_ms(timeframe)
+        self.grace_ms = grace_ms
+        self.on_bars = on_bars
+        self._open: Dict[str, Dict[int, _OpenBar]] = {}
+        self._closing_heap: List = []  # (bar end, symbol, bar start)
+        self._horizon = None  # bars ending at or before this are finished
+        self.ticks_processed = 0
+        self.late_ticks = 0
+        self.bars_emitted = 0
+
+    def add_tick(self, symbol: str, ts_ms: int, price: float, qty: float) -> List[Bar]:
+        """Folds one tick into its bar and returns any bars that closed as a result."""
+        start = ts_ms - ts_ms % self.bar_ms
+        if self._horizon is not None and start + self.bar_ms <= self._horizon:
+            self.late_ticks += 1
+            return []
+
+        self.ticks_processed += 1
+        bars = self._open.get(symbol)
+        if bars is None:
+            bars = self._open[symbol] = {}
+        bar = bars.get(start)
+        if bar is None:
+            bars[start] = _OpenBar(price, qty)
+            heapq.heappush(self._closing_heap, (start + self.bar_ms, symbol, start))
+        else:
+            if price > bar.high:
+                bar.high = price
+            if price < bar.low:
+                bar.low = price
+            bar.close = price
+            bar.volume += qty
+            bar.ticks += 1
+
+        return self._close_until(ts_ms - self.grace_ms)
+
+    def advance(self, now_ms: int) -> List[Bar]:
+        """Closes bars whose end (plus grace) is at or before event time `now_ms`."""
+        return self._close_until(now_ms - self.grace_ms)
+
+    def flush(self) -> List[Bar]:
+        """Emits every open bar regardless of the watermark (e.g. at end of a replay)."""
+        if not self._closing_heap:
+            return []
+        return self._close_until(max(entry[0] for entry in self._closing_heap))
+
+    def partial_bar(self, symbol: str) -> Optional[Bar]:
+        """Returns the most recent, still-open bar for `symbol`, if any."""
+        bars = self._open.get(symbol)
+        if not bars:
+            return None
+        start = max(bars)
+        bar = bars[start]
+        return Bar(symbol, start, bar.open, bar.high, bar.low, bar.close, bar.volume, bar.ticks)
+
+    def _close_until(self, horizon: int) -> List[Bar]:
+        if self._horizon is not None and horizon <= self._horizon:
+            return []
+        self._horizon = horizon
+
+        closed = []
+        heap = self._closing_heap
+        while heap and heap[0][0] <= horizon:
+            _, symbol, start = heapq.heappop(heap)
+            bar = self._open[symbol].pop(start)
+            closed.append(Bar(symbol, start, bar.open, bar.high, bar.low, bar.close, bar.volume, bar.ticks))
+
+        if closed:
+            self.bars_emitted += len(closed)
+            if self.on_bars is not None:
+                self.on_bars(closed)
+        return closed
@@ -0,0 +1,161 @@
+import threading
+from typing import Callable, Dict, Iterable, Optional, Sequence, Tuple
+
+import numpy as np
+
+OHLCV_FIELDS = ('open', 'high', 'low', 'close', 'volume')
+DEFAULT_CAPACITY = 4096
+
+
+class BarRingBuffer:
+    """Fixed-capacity ring of the most recent bars for one (symbol, timeframe).
+
+    Storage is preallocated NumPy arrays; once full, the oldest bar is
+    overwritten. All access goes through `lock`, and reads return copies, so
+    readers never observe a half-applied update from the writer thread.
+    """
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self.lock = threading.RLock()
+        self._ts = np.zeros(capacity, dtype=np.int64)
+        self._values = np.zeros((capacity, len(OHLCV_FIELDS)), dtype=np.float64)
+        self._start = 0
+        self._count = 0
+        # True while the buffer holds every stored bar (seeded from a short
+        # history and not wrapped yet), so misses can be answered as empty.
+        self.holds_all = False
+        # Set when an update could not be applied in place; the cache reseeds it.
+        self.stale = False
+
+    def __len__(self) -> int:
+        return self._count
+
+    def load(self, timestamps: np.ndarray, values: np.ndarray):
+        """Replaces the contents with (up to capacity of) the given ascending bars."""
+        with self.lock:
+            n = min(len(timestamps), self.capacity)
+            self._ts[:n] = timestamps[len(timestamps) - n:]
+            self._values[:n] = values[len(values) - n:]
+            self._start = 0
+            self._count = n
+            self.holds_all = len(timestamps) < self.capacity
+
+    def upsert(self, ts: int, values: Sequence[float]):
+        """Appends a newer bar or overwrites the stored bar with the same timestamp."""
+        with self.lock:
+            if self._count:
+                last = (self._start + self._count - 1) % self.capacity
+                last_ts = self._ts[last]
+                if ts == last_ts:
+                    self._values[last] = values
+                    return
+                if ts < last_ts:
+                    # Rare: a rollup bucket rewritten behind the newest one.
+                    hits = np.nonzero(self._ts[:self._count] == ts)[0]
+                    if len(hits):
+                        self._values[hits[0]] = values
+                    else:
+                        self.stale = True
+                    return
+
+            if self._count < self.capacity:
+                pos = (self._start + self._count) % self.capacity
+                self._count += 1
+            else:
+                pos = self._start
+                self._start = (self._start + 1) % self.capacity
+                self.holds_all = False
+            self._ts[pos] = ts
+            self._values[pos] = values
+
+    def read(self, start: Optional[int] = None, end: Optional[int] = None,
+             limit: Optional[int] = None) -> Optional[Dict[str, np.ndarray]]:
+        """Returns bars in [start, end) (last `limit` of them) if the buffer can answer, else None."""
+        with self.lock:
+            order = (self._start + np.arange(self._count)) % self.capacity
+            ts = self._ts[order]
+            lo = 0 if start is None else int(np.searchsorted(ts, start, 'left'))
+            hi = self._count if end is None else int(np.searchsorted(ts, end, 'left'))
+            hi = max(lo, hi)
+
+            # Bars are contiguous from ts[0] onwards; anything older lives only in SQLite.
+            covered = self.holds_all or (start is not None and self._count > 0 and start >= ts[0])
+            if limit is not None and hi - lo >= limit:
+                lo = hi - limit
+            elif not covered:
+                return None
+
+            sel = order[lo:hi]
+            arrays = {'timestamp': self._ts[sel]}
+            values = self._values[sel]
+            for i, field in enumerate(OHLCV_FIELDS):
+                arrays[field] = values[:, i].copy()
+            return arrays
+
+
+class BarCache:
+    """Registry of ring buffers keyed by (symbol_id, timeframe), with hit/miss counters.
+
+    Buffers are created on first read and seeded from SQLite by the caller-
+    supplied loader; afterwards the writer keeps them current via `apply`.
+    """
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self._buffers: Dict[Tuple[int, str], BarRingBuffer] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def read(self, symbol_id: int, timeframe: str,
+             loader: Callable[[int], Tuple[np.ndarray, np.ndarray]],
+             start: Optional[int] = None, end: Optional[int] = None,
+             limit: Optional[int] = None) -> Optional[Dict[str, np.ndarray]]:
+        """Serves a query from the ring buffer, seeding it with `loader(capacity)` on first use."""
+        key = (symbol_id, timeframe)
+        with self._lock:
+            buffer = self._buffers.get(key)
+            seeding = buffer is None or buffer.stale
+            if seeding:
+                buffer = BarRingBuffer(self.capacity)
+                # Held until seeded, so the writer's next upsert lands after the load.
+                buffer.lock.acquire()
+                self._buffers[key] = buffer
+
+        if seeding:
+            try:
+                timestamps, values = loader(self.capacity)
+                buffer.load(timestamps, values)
+            except Exception:
+                with self._lock:
+                    self._buffers.pop(key, None)
+                raise
+            finally:
+                buffer.lock.release()
+
+        result = buffer.read(start, end, limit)
+        if result is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return result
+
+    def apply(self, bars: Iterable[Tuple[int, str, int, Sequence[float]]]):
+        """Pushes committed (symbol_id, timeframe, timestamp, ohlcv) bars into existing buffers."""
+        for symbol_id, timeframe, ts, values in bars:
+            buffer = self._buffers.get((symbol_id, timeframe))
+            if buffer is not None:
+                buffer.upsert(ts, values)
+
+    def invalidate(self, symbol_id: Optional[int] = None):
+        """Drops cached buffers (for one symbol or all) after out-of-band writes."""
+        with self._lock:
+            if symbol_id is None:
+                self._buffers.clear()
+            else:
+                for key in [k for k in self._buffers if k[0] == symbol_id]:
+                    del self._buffers[key]
+
+    def stats(self) -> Dict[str, int]:
+        return {'buffers': len(self._buffers), 'hits': self.hits, 'misses': self.misses}
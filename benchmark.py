@@ -0,0 +1,331 @@
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Sequence
+
+import numpy as np
+
+from fake_exchange import FakeExchange, mini_ticker
+from logging_setup import configure_logging
+
+# The benchmark owns its database and exchange; these are read when the app
+# modules are first imported, so those imports happen inside `run`.
+BENCH_SYMBOL_SUFFIX = 'usdt'
+HISTORY_PAIR = ('BENCHYUSDT', 'BENCHXUSDT')
+READ_LIMITS = (100, 500, 2000, 10000)
+ENDPOINT_TIMEFRAME = '1m'
+
+
+def bench_symbols(count: int) -> List[str]:
+    return [f"bench{i:03d}{BENCH_SYMBOL_SUFFIX}" for i in range(count)]
+
+
+def synthetic_frames(symbols: Sequence[str], count: int, start_ms: int, step_ms: int = 1000) -> Iterator[str]:
+    """`!miniTicker@arr` frames for a random walk of every symbol, `step_ms` of event time apart."""
+    prices = {s: random.uniform(10, 1000) for s in symbols}
+    for i in range(count):
+        event_ms = start_ms + i * step_ms
+        for s in symbols:
+            prices[s] *= 1.0 + random.gauss(0.0, 0.0005)
+        yield json.dumps([mini_ticker(s, p, event_ms) for s, p in prices.items()])
+
+
+def percentiles(samples_ms: Sequence[float]) -> Dict[str, float]:
+    values = np.asarray(samples_ms, dtype=np.float64)
+    if not len(values):
+        return {'count': 0}
+    return {
+        'count': int(len(values)),
+        'mean_ms': round(float(values.mean()), 3),
+        'p50_ms': round(float(np.percentile(values, 50)), 3),
+        'p99_ms': round(float(np.percentile(values, 99)), 3),
+        'max_ms': round(float(values.max()), 3),
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def bench_replay(symbols: Sequence[str], frames: int) -> Dict[str, Any]:
+    """Decode -> aggregate -> writer throughput, fed from memory as fast as the pipeline accepts."""
+    from data_handler import get_writer
+    from websocket_client import get_pipeline, stop_pipeline
+
+    payloads = list(synthetic_frames(symbols, frames, int(time.time() * 1000) - frames * 1000))
+    writer = get_writer()
+    pipeline = get_pipeline()
+    before = writer.rows_written
+    started = time.perf_counter()
+    for raw in payloads:
+        # Pace the producer so the measurement is throughput, not frames shed by drop-oldest.
+        while pipeline.stats()['frame_queue_depth'] > 64:
+            time.sleep(0.0005)
+        pipeline.submit_frame(raw, 'replay')
+    stop_pipeline()
+    decoded = time.perf_counter() - started
+    writer.flush()
+    elapsed = time.perf_counter() - started
+    stats = pipeline.stats()
+    return {
+        'symbols': len(symbols),
+        'frames': frames,
+        'ticks': stats['ticks_accepted'],
+        'frames_dropped': stats['frames_dropped'],
+        'decode_aggregate_s': round(decoded, 3),
+        'total_s': round(elapsed, 3),
+        'ticks_per_s': round(stats['ticks_accepted'] / decoded, 1),
+        'bars_written': writer.rows_written - before,
+        'bars_per_s': round((writer.rows_written - before) / elapsed, 1),
+    }
+
+
+async def _bench_live(exchange: FakeExchange, duration: float) -> Dict[str, Any]:
+    from data_handler import get_writer
+    from websocket_client import get_pipeline, receive_and_process_data
+
+    pipeline = get_pipeline()
+    writer = get_writer()
+    task = asyncio.create_task(receive_and_process_data())
+    # Let the connection come up before the measured window starts.
+    while pipeline.frames_received == 0:
+        await asyncio.sleep(0.05)
+    ticks0, frames0, dropped0 = pipeline.ticks_accepted, pipeline.frames_received, pipeline.frames_dropped
+    rows0, sent0 = writer.rows_written, exchange.frames_sent
+    pipeline.max_lag_ms = 0.0  # the replay's historical event times would dominate it
+    started = time.perf_counter()
+    await asyncio.sleep(duration)
+    elapsed = time.perf_counter() - started
+    stats = pipeline.stats()
+    task.cancel()
+    with contextlib.suppress(asyncio.CancelledError):
+        await task
+    return {
+        'symbols': len(exchange.symbols),
+        'interval_s': exchange.interval,
+        'duration_s': round(elapsed, 3),
+        'frames_sent': exchange.frames_sent - sent0,
+        'frames_received': pipeline.frames_received - frames0,
+        'frames_dropped': stats['frames_dropped'] - dropped0,
+        'ticks_per_s': round((stats['ticks_accepted'] - ticks0) / elapsed, 1),
+        'bars_per_s': round((writer.rows_written - rows0) / elapsed, 1),
+        'max_lag_ms': stats['max_lag_ms'],
+        'last_queue_ms': stats['last_queue_ms'],
+    }
+
+
+def bench_tick_replay() -> Dict[str, Any]:
+    """Replays everything the tick log recorded so far through a fresh aggregator (bars not stored)."""
+    from bar_aggregator import BarAggregator
+    from data_handler import BAR_GRACE_MS, get_tick_store
+    from tick_store import replay
+
+    store = get_tick_store()
+    if store is None:
+        return {'ticks': 0}
+    store.flush()
+    result = replay(store, BarAggregator('1s', grace_ms=BAR_GRACE_MS))
+    result['log_bytes'] = store.stats()['bytes']
+    return result
+
+
+def seed_history(bars: int):
+    """Writes `bars` 1s bars of a cointegrated pair ending now (rollups are refreshed by the writer)."""
+    from data_handler import get_writer
+
+    end_ms = (int(time.time()) - 5) * 1000
+    ts = end_ms - np.arange(bars)[::-1] * 1000
+    x = 100.0 * np.exp(np.cumsum(np.random.normal(0, 0.0005, bars)))
+    y = 1.5 * x + np.random.normal(0, 0.05, bars)
+    writer = get_writer()
+    for symbol, closes in zip(HISTORY_PAIR, (y, x)):
+        for start in range(0, bars, 5000):
+            chunk = slice(start, start + 5000)
+            writer.submit([(int(t), symbol, c, c, c, c, 1.0) for t, c in zip(ts[chunk], closes[chunk])])
+    writer.flush()
+
+
+def bench_reads(repeats: int) -> List[Dict[str, Any]]:
+    """`get_ohlcv_data` latency per history size, cold (bar cache dropped first) and warm."""
+    from data_handler import BAR_CACHE, get_ohlcv_data
+
+    results = []
+    for limit in READ_LIMITS:
+        for mode in ('cold', 'warm'):
+            samples = []
+            get_ohlcv_data(HISTORY_PAIR[0], limit=limit)
+            for _ in range(repeats):
+                if mode == 'cold':
+                    BAR_CACHE.invalidate()
+                started = time.perf_counter()
+                get_ohlcv_data(HISTORY_PAIR[0], limit=limit)
+                samples.append((time.perf_counter() - started) * 1000.0)
+            results.append({'limit': limit, 'cache': mode, **percentiles(samples)})
+    return results
+
+
+def _start_api(port: int):
+    import uvicorn
+    from main import app
+
+    server = uvicorn.Server(uvicorn.Config(app, host='127.0.0.1', port=port, log_level='warning'))
+    thread = threading.Thread(target=server.run, name="bench-api", daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 30
+    while not server.started:
+        if time.monotonic() > deadline or not thread.is_alive():
+            raise RuntimeError("API server did not start")
+        time.sleep(0.05)
+    return server, thread
+
+
+def bench_endpoints(port: int, requests_per_endpoint: int, concurrency: int) -> List[Dict[str, Any]]:
+    """p50/p99 of /ohlc, /zscore and /adf under `concurrency` parallel clients."""
+    import requests
+
+    base = f"http://127.0.0.1:{port}/api/v1"
+    pair = {'symbol_y': HISTORY_PAIR[0], 'symbol_x': HISTORY_PAIR[1], 'timeframe': ENDPOINT_TIMEFRAME,
+            'window': 20, 'beta_mode': 'static'}
+    endpoints = {
+        'ohlc': lambda s: s.get(f"{base}/ohlc/{HISTORY_PAIR[0]}", params={'timeframe': ENDPOINT_TIMEFRAME}),
+        'ohlc_arrow': lambda s: s.get(f"{base}/ohlc/{HISTORY_PAIR[0]}",
+                                      params={'timeframe': ENDPOINT_TIMEFRAME, 'format': 'arrow'}),
+        'zscore': lambda s: s.post(f"{base}/analytics/zscore", json=pair),
+        'zscore_rolling': lambda s: s.post(f"{base}/analytics/zscore", json={**pair, 'beta_mode': 'rolling(100)'}),
+        'adf': lambda s: s.post(f"{base}/analytics/adf", json=pair),
+    }
+    local = threading.local()
+
+    def timed(call: Callable) -> tuple:
+        session = getattr(local, 'session', None)
+        if session is None:
+            session = local.session = requests.Session()
+        started = time.perf_counter()
+        response = call(session)
+        return (time.perf_counter() - started) * 1000.0, response.status_code
+
+    results = []
+    with ThreadPoolExecutor(max_workers=concurrency) as clients:
+        for name, call in endpoints.items():
+            timed(call)  # warm caches and worker processes
+            started = time.perf_counter()
+            outcomes = list(clients.map(lambda _: timed(call), range(requests_per_endpoint)))
+            elapsed = time.perf_counter() - started
+            errors = sum(1 for _, status in outcomes if status >= 400)
+            results.append({
+                'endpoint': name, 'concurrency': concurrency, 'errors': errors,
+                'requests_per_s': round(len(outcomes) / elapsed, 1),
+                **percentiles([ms for ms, _ in outcomes]),
+            })
+    return results
+
+
+def compare(previous_path: str, current: Dict[str, Any]):
+    """Prints the current p50/p99 and throughput next to a previous result file."""
+    with open(previous_path) as f:
+        previous = json.load(f)
+
+    def rows(result):
+        out = {}
+        for section in ('replay', 'live', 'tick_replay'):
+            if result.get(section, {}).get('ticks_per_s') is not None:
+                out[f"{section}.ticks_per_s"] = result[section]['ticks_per_s']
+        for r in result.get('reads', []):
+            out[f"read.{r['limit']}.{r['cache']}.p50_ms"] = r.get('p50_ms')
+        for r in result.get('endpoints', []):
+            out[f"{r['endpoint']}.p50_ms"] = r.get('p50_ms')
+            out[f"{r['endpoint']}.p99_ms"] = r.get('p99_ms')
+        return out
+
+    old, new = rows(previous), rows(current)
+    print(f"{'metric':36} {previous['meta']['commit']:>12} {current['meta']['commit']:>12}   change")
+    for key, value in new.items():
+        before = old.get(key)
+        change = f"{(value - before) / before * 100:+.1f}%" if before and value is not None else ''
+        print(f"{key:36} {before if before is not None else '-':>12} {value:>12}   {change}")
+
+
+def run(args) -> Dict[str, Any]:
+    workdir = tempfile.mkdtemp(prefix='quant-bench-')
+    symbols = bench_symbols(args.symbols)
+    os.environ['QUANT_DB_PATH'] = os.path.join(workdir, 'bench.sqlite')
+    os.environ['QUANT_SYMBOLS'] = f"*{BENCH_SYMBOL_SUFFIX}"
+
+    result = {'meta': {
+        'commit': git_commit(), 'python': platform.python_version(), 'platform': platform.platform(),
+        'cpu_count': os.cpu_count(), 'started_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'args': vars(args),
+    }}
+    configure_logging(None if args.verbose else 'WARNING')
+    from data_handler import init_db
+    init_db()
+    quiet = contextlib.redirect_stdout(io.StringIO()) if not args.verbose else contextlib.nullcontext()
+    loop = asyncio.new_event_loop()
+    exchange = FakeExchange(symbols, interval=args.interval)
+    loop.run_until_complete(exchange.start())
+    os.environ['QUANT_WS_BASE'] = exchange.url
+    threading.Thread(target=loop.run_forever, name="bench-exchange", daemon=True).start()
+    progress = lambda msg: print(msg, file=sys.stderr)
+    try:
+        with quiet:
+            progress(f"replay: {args.replay_frames} frames x {len(symbols)} symbols")
+            result['replay'] = bench_replay(symbols, args.replay_frames)
+            progress(f"live: {args.duration:g}s against the fake exchange")
+            result['live'] = asyncio.run(_bench_live(exchange, args.duration))
+            progress("tick replay: logged ticks through a fresh aggregator")
+            result['tick_replay'] = bench_tick_replay()
+            progress(f"reads: seeding {args.history} bars per leg")
+            seed_history(args.history)
+            result['reads'] = bench_reads(args.read_repeats)
+            progress(f"endpoints: {args.requests} requests x {args.concurrency} clients")
+            server, thread = _start_api(args.port)
+            try:
+                result['endpoints'] = bench_endpoints(args.port, args.requests, args.concurrency)
+            finally:
+                server.should_exit = True
+                thread.join(30)
+    finally:
+        asyncio.run_coroutine_threadsafe(exchange.stop(), loop).result(10)
+        loop.call_soon_threadsafe(loop.stop)
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark ingestion, storage reads and API latency on synthetic data.")
+    parser.add_argument('--symbols', type=int, default=100, help="Symbols in each synthetic frame.")
+    parser.add_argument('--replay-frames', type=int, default=600, help="Frames replayed from memory (1 s of event time each).")
+    parser.add_argument('--interval', type=float, default=0.01, help="Seconds between fake exchange frames in the live run.")
+    parser.add_argument('--duration', type=float, default=10.0, help="Seconds of live ingestion measured.")
+    parser.add_argument('--history', type=int, default=20000, help="1s bars seeded per symbol for reads and endpoints.")
+    parser.add_argument('--read-repeats', type=int, default=50, help="Timed reads per history size and cache mode.")
+    parser.add_argument('--requests', type=int, default=200, help="Requests per endpoint.")
+    parser.add_argument('--concurrency', type=int, default=8, help="Parallel API clients.")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--output', default=None, help="Result file (default benchmarks/<commit>.json).")
+    parser.add_argument('--compare', default=None, help="Previous result file to print a comparison against.")
+    parser.add_argument('--verbose', action='store_true', help="Keep the app's own console output and INFO logs.")
+    args = parser.parse_args()
+
+    result = run(args)
+    output = args.output or os.path.join('benchmarks', f"{result['meta']['commit']}.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(result, f, indent=2)
+    print(f"Results written to {output}")
+    if args.compare:
+        compare(args.compare, result)
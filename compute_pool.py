@@ -0,0 +1,316 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import BrokenExecutor, Future, InvalidStateError, ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import shared_memory
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from alignment import align_pair, alignment_stats
+from analytics import run_adf_test, spread_zscore_arrays
+from metrics import COMPUTE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Worker processes for request analytics; 0 runs tasks on a thread in-process.
+COMPUTE_WORKERS = int(os.environ.get('QUANT_COMPUTE_WORKERS', max(1, (os.cpu_count() or 1) - 1)))
+# Tasks queued or running before new requests are turned away.
+COMPUTE_MAX_PENDING = int(os.environ.get('QUANT_COMPUTE_MAX_PENDING', 32))
+# Per-request limit on waiting for a result.
+COMPUTE_TIMEOUT_S = float(os.environ.get('QUANT_COMPUTE_TIMEOUT_S', 10.0))
+
+# (name, dtype, shape, byte offset) of each array packed into a task's shared block.
+ArrayLayout = List[Tuple[str, str, Tuple[int, ...], int]]
+
+
+class ComputeOverloaded(Exception):
+    """Raised by `submit` when `max_pending` tasks are already queued or running."""
+
+
+def _pack(arrays: Dict[str, np.ndarray]) -> Tuple[shared_memory.SharedMemory, ArrayLayout]:
+    """Copies the arrays into one new shared memory block (8-byte aligned)."""
+    layout, offset = [], 0
+    for name, values in arrays.items():
+        layout.append((name, values.dtype.str, values.shape, offset))
+        offset += -(-values.nbytes // 8) * 8
+    shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+    for (name, dtype, shape, start), values in zip(layout, arrays.values()):
+        np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=start)[...] = values
+    return shm, layout
+
+
+def _run_shared(fn: Callable, shm_name: str, layout: ArrayLayout, args: tuple) -> Any:
+    """Worker entry point: maps the task's arrays out of shared memory and runs `fn(arrays, *args)`."""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    arrays = None
+    try:
+        arrays = {name: np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=offset)
+                  for name, dtype, shape, offset in layout}
+        return fn(arrays, *args)
+    finally:
+        del arrays
+        shm.close()
+
+
+def _noop() -> None:
+    return None
+
+
+def spread_zscore_task(arrays: Dict[str, np.ndarray], window: int, beta_mode: str,
+                       max_stale: int = 0) -> Dict[str, Any]:
+    """Spread / ZScore / Beta over (ts_y, y) and (ts_x, x) as-of joined with `max_stale` ms of forward fill.
+
+    Returns int64 `timestamp` plus the result columns, and the join's
+    counts under `alignment`.
+    """
+    aligned = align_pair(arrays['ts_y'], arrays['y'], arrays['ts_x'], arrays['x'], max_stale)
+    spread, zscore, beta = spread_zscore_arrays(aligned.y, aligned.x, window, beta_mode)
+    return {'timestamp': aligned.timestamp, 'Spread': spread, 'ZScore': zscore, 'Beta': beta,
+            'alignment': alignment_stats(aligned)}
+
+
+def pair_snapshot_task(arrays: Dict[str, np.ndarray], specs: List[Tuple[int, str, int]]) -> List[Dict[str, Any]]:
+    """Latest Beta / Spread / ZScore of each pair in a shard, with the full columns as `series`.
+
+    Pair i's closes are `ts_y{i}`, `y{i}`, `ts_x{i}`, `x{i}`; its (window,
+    beta_mode, max_stale) is `specs[i]`. A pair that fails gets an `error`
+    entry instead of failing the shard.
+    """
+    results = []
+    for i, (window, beta_mode, max_stale) in enumerate(specs):
+        try:
+            aligned = align_pair(arrays[f'ts_y{i}'], arrays[f'y{i}'], arrays[f'ts_x{i}'], arrays[f'x{i}'], max_stale)
+            if not len(aligned.timestamp):
+                results.append({'error': 'no aligned bars'})
+                continue
+            spread, zscore, beta = spread_zscore_arrays(aligned.y, aligned.x, window, beta_mode)
+            results.append({'timestamp': int(aligned.timestamp[-1]), 'Beta': float(beta[-1]),
+                            'Spread': float(spread[-1]), 'ZScore': float(zscore[-1]),
+                            'alignment': alignment_stats(aligned),
+                            'series': {'timestamp': aligned.timestamp, 'Spread': spread, 'ZScore': zscore,
+                                       'Beta': beta}})
+        except Exception as e:
+            results.append({'error': str(e)})
+    return results
+
+
+def adf_task(arrays: Dict[str, np.ndarray], max_lags: Optional[int] = None) -> dict:
+    return run_adf_test(pd.Series(arrays['series']), max_lags=max_lags)
+
+
+class ComputePool:
+    """Runs CPU-bound analytics in spawned worker processes, off the API and ingestion threads.
+
+    Inputs are NumPy arrays copied once into a shared memory block per task;
+    workers map them by name, so only the block name, the layout and small
+    scalar arguments are pickled. At most `max_pending` tasks are in the
+    pool at once and `run` gives up after `timeout` seconds (the task is
+    cancelled if it has not started). A batch (`submit_batch` / `run_batch`)
+    runs one function over several argument tuples sharing one copy of the
+    arrays, and counts as a single pending task; with `max_in_flight` only
+    that many of its tasks are handed to the workers at a time, so a long
+    batch leaves room for other work and stops soon after it is cancelled.
+    """
+
+    def __init__(self, workers: int = COMPUTE_WORKERS, max_pending: int = COMPUTE_MAX_PENDING,
+                 timeout: float = COMPUTE_TIMEOUT_S):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._executor = None
+        # Bumped by shutdown; batches started before it submit no further tasks.
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.last_ms: Optional[float] = None
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                if self.workers > 0:
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                         mp_context=multiprocessing.get_context('spawn'))
+                else:
+                    self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="compute")
+            return self._executor
+
+    def warm_up(self):
+        """Starts the worker processes (and their imports) ahead of the first request."""
+        executor = self._get_executor()
+        for _ in range(max(self.workers, 1)):
+            executor.submit(_noop)
+
+    def shutdown(self, wait: bool = True):
+        # Joined outside the lock: task callbacks on the executor's thread take it.
+        with self._lock:
+            executor, self._executor = self._executor, None
+            self._generation += 1
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
+
+    def submit(self, fn: Callable, arrays: Dict[str, np.ndarray], *args) -> Future:
+        """Queues `fn(arrays, *args)`; raises ComputeOverloaded when the pool is full."""
+        return self.submit_batch(fn, arrays, [args])[0]
+
+    def _submit_task(self, task: tuple) -> Future:
+        executor = self._get_executor()
+        try:
+            return executor.submit(*task)
+        except BrokenExecutor:
+            # A worker died (e.g. killed for memory); start a fresh pool once.
+            logger.warning("Compute pool broken, restarting it")
+            with self._lock:
+                if self._executor is executor:
+                    self._executor = None
+            executor.shutdown(wait=False, cancel_futures=True)
+            return self._get_executor().submit(*task)
+
+    def submit_batch(self, fn: Callable, arrays: Dict[str, np.ndarray], arg_list: Sequence[tuple],
+                     max_in_flight: Optional[int] = None) -> List[Future]:
+        """Queues `fn(arrays, *args)` for each args in `arg_list`, all mapping one shared copy of `arrays`.
+
+        With `max_in_flight`, the rest of the batch is handed to the workers
+        as earlier tasks finish; a returned future cancelled before then
+        never runs.
+        """
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                raise ComputeOverloaded(f"{self.pending} analytics tasks already pending")
+            self.pending += 1
+            self.submitted += 1
+        started = time.perf_counter()
+        generation = self._generation
+        shm = None
+        try:
+            if self.workers > 0:
+                shm, layout = _pack(arrays)
+                tasks = [(_run_shared, fn, shm.name, layout, tuple(args)) for args in arg_list]
+            else:
+                tasks = [(fn, arrays) + tuple(args) for args in arg_list]
+            if not tasks:
+                self._finish(shm, started, failed=False, function=fn.__name__)
+                return []
+            first = self._submit_task(tasks[0])
+        except BaseException:
+            self._finish(shm, started, failed=True)
+            raise
+
+        # Callers hold proxies; each task is submitted when a slot frees up and
+        # the shared block is released once the last one has ended (finished,
+        # or cancelled before it was submitted).
+        futures = [Future() for _ in tasks]
+        state = {'next': 1, 'remaining': len(tasks), 'failed': False}
+        lock = threading.Lock()
+
+        def settle(failed: bool):
+            with lock:
+                state['remaining'] -= 1
+                state['failed'] = state['failed'] or failed
+                if state['remaining']:
+                    return
+            self._finish(shm, started, failed=state['failed'], function=fn.__name__)
+
+        def relay(proxy: Future, inner: Future):
+            failed = inner.cancelled() or inner.exception() is not None
+            settle(failed)
+            try:
+                if inner.cancelled():
+                    proxy.cancel()
+                elif inner.exception() is not None:
+                    proxy.set_exception(inner.exception())
+                else:
+                    proxy.set_result(inner.result())
+            except InvalidStateError:
+                pass  # the caller cancelled it while it ran
+            dispatch()
+
+        def attach(proxy: Future, inner: Future):
+            proxy.add_done_callback(lambda p: p.cancelled() and inner.cancel())
+            inner.add_done_callback(lambda f: relay(proxy, f))
+
+        def dispatch():
+            while True:
+                with lock:
+                    i = state['next']
+                    if i >= len(tasks):
+                        return
+                    state['next'] += 1
+                proxy = futures[i]
+                if proxy.cancelled() or self._generation != generation:
+                    proxy.cancel()
+                    settle(True)
+                    continue
+                try:
+                    inner = self._submit_task(tasks[i])
+                except Exception as e:
+                    proxy.set_exception(e)
+                    settle(True)
+                    continue
+                attach(proxy, inner)
+                return
+
+        attach(futures[0], first)
+        for _ in range(min(max_in_flight or len(tasks), len(tasks)) - 1):
+            dispatch()
+        return futures
+
+    def _finish(self, shm: Optional[shared_memory.SharedMemory], started: float, failed: bool,
+                function: str = ''):
+        if shm is not None:
+            shm.close()
+            shm.unlink()
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self.pending -= 1
+            if failed:
+                self.failed += 1
+            else:
+                self.completed += 1
+                self.last_ms = elapsed * 1000.0
+        if not failed:
+            # Queue wait included: it is what a request experiences.
+            COMPUTE_SECONDS.observe(elapsed, function=function)
+
+    async def run(self, fn: Callable, arrays: Dict[str, np.ndarray], *args, timeout: Optional[float] = None) -> Any:
+        """Awaits `fn(arrays, *args)` from the pool; raises asyncio.TimeoutError after `timeout` seconds."""
+        return (await self.run_batch(fn, arrays, [args], timeout=timeout))[0]
+
+    async def run_batch(self, fn: Callable, arrays: Dict[str, np.ndarray], arg_list: Sequence[tuple],
+                        timeout: Optional[float] = None, max_in_flight: Optional[int] = None) -> List[Any]:
+        """Awaits every task of `submit_batch`, in order; after `timeout` seconds the unfinished ones are cancelled."""
+        futures = self.submit_batch(fn, arrays, arg_list, max_in_flight=max_in_flight)
+        try:
+            return await asyncio.wait_for(asyncio.gather(*(asyncio.wrap_future(f) for f in futures)),
+                                          timeout or self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            for future in futures:
+                future.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'workers': self.workers,
+            'mode': 'process' if self.workers > 0 else 'thread',
+            'pending': self.pending,
+            'max_pending': self.max_pending,
+            'timeout_s': self.timeout,
+            'submitted': self.submitted,
+            'completed': self.completed,
+            'failed': self.failed,
+            'rejected': self.rejected,
+            'timeouts': self.timeouts,
+            'last_ms': None if self.last_ms is None else round(self.last_ms, 3),
+        }
@@ -1,122 +1,566 @@
+import logging
 import sqlite3
+import threading
+import time
+import numpy as np
 import pandas as pd
-from typing import List, Dict, Any
+from datetime import datetime, timezone
+from typing import Callable, List, Dict, Any, Optional, Tuple, Union
 import os
+from bar_aggregator import Bar, BarAggregator, timeframe_to_ms
+from bar_cache import BarCache
+from decimate import decimate_ohlc, zoom_bucket_ms
+from db_writer import UPSERT_OHLCV_SQL, OHLCVWriter, apply_writer_pragmas, is_valid_bar
+from metrics import SQL_SECONDS, STORED_LAG, TICKS_DROPPED
+from migrate_db import migrate, partition_bars
+from partitions import Partitions, partition_day, partition_table
+from retention import RETENTION_SPEC, RetentionManager, parse_retention
+from rollups import (BASE_TIMEFRAME, CREATE_ROLLUP_TABLE_SQL, ROLLUP_TIMEFRAMES, SUPPORTED_TIMEFRAMES,
+                     fetch_rollup_bars, rebuild_rollups, refresh_rollups, validate_timeframe)
+from schema import (CREATE_ALERT_RULES_INDEX_SQL, CREATE_ALERT_RULES_TABLE_SQL, CREATE_GAPS_TABLE_SQL,
+                    CREATE_SYMBOLS_TABLE_SQL, SCHEMA_VERSION,
+                    intern_symbol, is_legacy_schema, lookup_symbol, set_schema_version)
+from tick_store import TickStore, replay
+
+logger = logging.getLogger(__name__)
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-DB_PATH = os.path.join(BASE_DIR, 'db.sqlite')
+# QUANT_DB_PATH points the app (or the benchmark) at another database file.
+DB_PATH = os.environ.get('QUANT_DB_PATH', os.path.join(BASE_DIR, 'db.sqlite'))
+# Raw tick log directory (next to the database by default); empty disables the log.
+TICK_DIR = os.environ.get('QUANT_TICK_DIR', os.path.join(os.path.dirname(DB_PATH), 'ticks'))
+# Per-day files holding the 1s bars (next to the database by default).
+PARTITION_DIR = os.environ.get('QUANT_PARTITION_DIR', os.path.join(os.path.dirname(DB_PATH), 'partitions'))
+
+# How long a bar stays open after its end for late / out-of-order ticks.
+BAR_GRACE_MS = 500
+# A bar no later tick has closed (its symbol, and every other, went quiet) is
+# closed this long after its end, on the exchange's estimated clock.
+BAR_IDLE_CLOSE_MS = 2000
+# Span of the tick log rebuilt per transaction by `rebuild_bars`.
+REBUILD_WINDOW_MS = 3_600_000
+
+OHLCV_COLUMNS = ['open', 'high', 'low', 'close', 'volume']
+ALERT_RULE_COLUMNS = ['symbol', 'symbol_x', 'metric', 'operator', 'value', 'timeframe', 'window_size',
+                      'beta_mode', 'hysteresis', 'cooldown_s']
+
+_WRITER = None
+_TICK_STORE = None
+_RETENTION = None
+_AGGREGATORS: Dict[str, BarAggregator] = {}
+_READER = threading.local()
+_SYMBOL_IDS: Dict[str, int] = {}
+_SYMBOL_NAMES: Dict[int, str] = {}
+# Called on the writer thread after each commit with (symbol, timeframe, timestamp, ohlcv) bars.
+_BAR_LISTENERS: List[Callable[[List[tuple]], None]] = []
+
+# Recent bars per (symbol, timeframe), served to the API without touching SQLite.
+BAR_CACHE_CAPACITY = 4096
+BAR_CACHE = BarCache(BAR_CACHE_CAPACITY)
+
+def _ms_to_iso(ts_ms: int) -> str:
+    return datetime.fromtimestamp(ts_ms / 1000, tz=timezone.utc).replace(tzinfo=None).isoformat(timespec='seconds')
+
+def init_db(db_path: str = DB_PATH, partition_dir: str = PARTITION_DIR):
+    """Initializes the SQLite database table for sampled OHLC data.
+
+    Migrates and partitions an older file in place, so it is called
+    explicitly by the server's startup and the CLI tools, never on import.
+    """
+    conn = sqlite3.connect(db_path)
+    if not conn.execute("SELECT 1 FROM sqlite_master LIMIT 1").fetchone():
+        # Only takes effect before the first table is created.
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    # WAL lets readers run concurrently with the writer thread; the mode is persistent.
+    conn.execute("PRAGMA journal_mode=WAL")
+    if is_legacy_schema(conn):
+        conn.close()
+        logger.info("Migrating database", extra={'path': db_path, 'schema_version': SCHEMA_VERSION})
+        migrate(db_path)
+        conn = sqlite3.connect(db_path)
 
-def init_db():
-    """Initializes the SQLite database table for sampled OHLC data."""
-    conn = sqlite3.connect(DB_PATH)
     cursor = conn.cursor()
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS ohlcv_data (
-            timestamp TEXT NOT NULL,
-            symbol TEXT NOT NULL,
-            open REAL,
-            high REAL,
-            low REAL,
-            close REAL,
-            volume REAL,
-            PRIMARY KEY (timestamp, symbol)
-        )
-    """)
+    cursor.execute(CREATE_SYMBOLS_TABLE_SQL)
+    cursor.execute(CREATE_ROLLUP_TABLE_SQL)
+    cursor.execute(CREATE_GAPS_TABLE_SQL)
+    cursor.execute(CREATE_ALERT_RULES_TABLE_SQL)
+    cursor.execute(CREATE_ALERT_RULES_INDEX_SQL)
+
+    # A version 2 file still holds the 1s bars itself: backfill the rollup
+    # levels once if it predates them, then move the bars into partitions.
+    unpartitioned = cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'ohlcv_data'").fetchone()
+    if unpartitioned:
+        has_rollups = cursor.execute("SELECT 1 FROM ohlcv_rollup LIMIT 1").fetchone()
+        has_bars = cursor.execute("SELECT 1 FROM ohlcv_data LIMIT 1").fetchone()
+        if has_bars and not has_rollups:
+            rebuild_rollups(conn)
+        conn.commit()
+        conn.close()
+        logger.info("Partitioning 1s bars", extra={'path': db_path, 'partition_dir': partition_dir})
+        partition_bars(db_path, partition_dir)
+        conn = sqlite3.connect(db_path)
+    set_schema_version(conn, SCHEMA_VERSION)
     conn.commit()
     conn.close()
 
+def get_writer() -> OHLCVWriter:
+    """Returns the process-wide bar writer, starting it on first use."""
+    global _WRITER
+    if _WRITER is None:
+        _WRITER = OHLCVWriter(DB_PATH, post_write=_refresh_derived, on_commit=_update_bar_cache,
+                              partition_dir=PARTITION_DIR)
+    _WRITER.start()
+    return _WRITER
+
+def _refresh_derived(conn: sqlite3.Connection, rows: List[tuple]) -> List[tuple]:
+    """Runs inside the writer's transaction: refreshes rollups and collects the
+    committed bars of every timeframe for the cache."""
+    bars = [(row[0], BASE_TIMEFRAME, row[1], row[2:]) for row in rows]
+    # The writer has attached the partitions of every row in this transaction.
+    for tf, symbol_id, ts, *values in fetch_rollup_bars(conn, refresh_rollups(conn, rows, partition_table)):
+        bars.append((symbol_id, tf, ts, values))
+    return bars
+
+def _update_bar_cache(bars: List[tuple]):
+    BAR_CACHE.apply(bars)
+    # A 1s bar's last event is at most at its end; everything after that is pipeline lag.
+    now_ms = time.time() * 1000.0
+    for _, tf, ts, _ in bars:
+        if tf == BASE_TIMEFRAME:
+            STORED_LAG.observe(max(now_ms - (ts + 1000), 0.0) / 1000.0)
+    if _BAR_LISTENERS:
+        named = [(_symbol_name(symbol_id), tf, ts, values) for symbol_id, tf, ts, values in bars]
+        for listener in _BAR_LISTENERS:
+            try:
+                listener(named)
+            except Exception as e:
+                logger.error("Bar listener failed", extra={'listener': getattr(listener, '__qualname__', repr(listener)),
+                                                            'error': str(e)})
+
+def add_bar_listener(listener: Callable[[List[tuple]], None]):
+    """Registers a callback for committed bars of every timeframe (runs on the writer thread)."""
+    if listener not in _BAR_LISTENERS:
+        _BAR_LISTENERS.append(listener)
+
+def _symbol_name(symbol_id: int) -> str:
+    name = _SYMBOL_NAMES.get(symbol_id)
+    if name is None:
+        name = _SYMBOL_NAMES[symbol_id] = _read_conn().execute(
+            "SELECT name FROM symbols WHERE id = ?", (symbol_id,)).fetchone()[0]
+    return name
+
+def get_tick_store() -> Optional[TickStore]:
+    """Returns the process-wide raw tick log, or None when QUANT_TICK_DIR is empty."""
+    global _TICK_STORE
+    if _TICK_STORE is None and TICK_DIR:
+        _TICK_STORE = TickStore(TICK_DIR)
+    return _TICK_STORE
+
+def record_ticks(symbol: str, raw_ticks: List[Dict[str, Any]]):
+    """Appends raw ticks to the tick log (if enabled) before they are aggregated."""
+    store = get_tick_store()
+    if store is not None:
+        store.append(symbol, raw_ticks)
+
+def stop_tick_store():
+    """Writes out buffered ticks and closes the tick log."""
+    global _TICK_STORE
+    if _TICK_STORE is not None:
+        _TICK_STORE.close()
+        _TICK_STORE = None
+
+def get_retention() -> RetentionManager:
+    """Returns the process-wide retention manager (QUANT_RETENTION), creating it on first use."""
+    global _RETENTION
+    if _RETENTION is None:
+        _RETENTION = RetentionManager(get_writer(), parse_retention(RETENTION_SPEC))
+    return _RETENTION
+
+def start_retention():
+    """Starts applying the retention policy every QUANT_RETENTION_INTERVAL_S seconds."""
+    get_retention().start()
+
+def stop_retention():
+    if _RETENTION is not None:
+        _RETENTION.stop()
+
+def storage_stats() -> Dict[str, Any]:
+    """Sizes of the main file and the 1s partitions, plus the retention manager's counters."""
+    conn = _read_conn()
+    page_size, pages, free = (conn.execute(f"PRAGMA {p}").fetchone()[0]
+                              for p in ('page_size', 'page_count', 'freelist_count'))
+    return {
+        'main': {'path': DB_PATH, 'bytes': page_size * pages, 'free_bytes': page_size * free,
+                 'auto_vacuum': ('none', 'full', 'incremental')[conn.execute("PRAGMA auto_vacuum").fetchone()[0]]},
+        'partitions': _read_partitions().stats(),
+        'retention': _RETENTION.stats() if _RETENTION is not None else None,
+    }
+
+def stop_writer():
+    """Flushes queued bars and stops the writer thread."""
+    if _WRITER is not None:
+        _WRITER.stop()
+
 def store_ohlcv_data(df: pd.DataFrame, symbol: str, timeframe: str):
-    """Stores the sampled OHLCV data into SQLite using INSERT OR REPLACE (UPSERT)."""
+    """Queues sampled OHLCV bars for a bulk upsert by the background writer."""
     if df.empty:
         return
-    
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-   
+
     df = df.reset_index()
-    
-    
+
     potential_ts_cols = [col for col in df.columns if col in ['timestamp', 'time', 'index']]
-    
-    if potential_ts_cols:
-       
-        df = df.rename(columns={potential_ts_cols[0]: 'timestamp'})
-    else:
-        
-        conn.close()
+
+    if not potential_ts_cols:
         return
 
-    
-    for index, row in df.iterrows():
-        try:
-            timestamp_str = row['timestamp'].isoformat()
-            
-            cursor.execute("""
-                INSERT OR REPLACE INTO ohlcv_data 
-                (timestamp, symbol, open, high, low, close, volume)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            """, (
-                timestamp_str,
-                symbol,
-                row['open'],
-                row['high'],
-                row['low'],
-                row['close'],
-                row['volume']
-            ))
-        except Exception:
-            pass
+    timestamps = pd.to_datetime(df[potential_ts_cols[0]]).to_numpy(dtype='datetime64[ms]').astype(np.int64)
+    rows = list(zip(
+        timestamps.tolist(),
+        [symbol] * len(df),
+        *(df[col].to_numpy(dtype=float).tolist() for col in OHLCV_COLUMNS),
+    ))
+    get_writer().submit(rows)
 
-    conn.commit()
-    conn.close()
+def _read_conn() -> sqlite3.Connection:
+    """Per-thread read-only connection; under WAL it never blocks the writer thread."""
+    conn = getattr(_READER, 'conn', None)
+    if conn is None:
+        conn = sqlite3.connect(f'file:{DB_PATH}?mode=ro', uri=True)
+        _READER.conn = conn
+        _READER.partitions = Partitions(conn, PARTITION_DIR, readonly=True)
+    return conn
 
-def get_ohlcv_data(symbol: str, limit: int = 500) -> pd.DataFrame:
-    """Retrieves sampled OHLCV data from SQLite."""
-    conn = sqlite3.connect(DB_PATH)
-    query = f"""
-        SELECT * FROM ohlcv_data
-        WHERE symbol = '{symbol}'
-        ORDER BY timestamp DESC
-        LIMIT {limit}
+def _read_partitions() -> Partitions:
+    """The 1s partitions, attached read-only to this thread's `_read_conn`."""
+    _read_conn()
+    return _READER.partitions
+
+def query_ohlcv(symbol: str, start: Optional[int] = None, end: Optional[int] = None,
+                limit: Optional[int] = None, timeframe: str = BASE_TIMEFRAME,
+                as_frame: bool = True) -> Union[pd.DataFrame, Dict[str, np.ndarray]]:
+    """Range query over stored bars using bound parameters.
+
+    `start` (inclusive) and `end` (exclusive) are epoch milliseconds. With a
+    `limit`, the most recent `limit` bars of the range are returned. Results
+    are in ascending time order, either as a dict of NumPy arrays
+    (`timestamp` as int64 epoch-ms) or as a DataFrame indexed by timestamp.
     """
-    df = pd.read_sql_query(
-        query, 
-        conn, 
-        index_col='timestamp', 
-        parse_dates=['timestamp'] 
-    ) 
-    conn.close()
-    
-   
-    print(f"!!! DIAGNOSTIC: get_ohlcv_data fetched {len(df)} rows for {symbol}!!!") 
-    
-    return df.sort_index()
+    validate_timeframe(timeframe)
+    conn = _read_conn()
+    symbol_id = lookup_symbol(conn, symbol, _SYMBOL_IDS)
+
+    arrays = None
+    if symbol_id is not None:
+        arrays = BAR_CACHE.read(
+            symbol_id, timeframe,
+            lambda capacity: _load_latest(symbol_id, timeframe, capacity),
+            start=start, end=end, limit=limit,
+        )
+    if arrays is None:
+        with SQL_SECONDS.time(query='ohlcv_range'):
+            arrays = _query_db(conn, symbol_id, timeframe, start, end, limit)
+
+    return ohlcv_frame(arrays, symbol) if as_frame else arrays
+
+def ohlcv_frame(arrays: Dict[str, np.ndarray], symbol: str) -> pd.DataFrame:
+    """`query_ohlcv`'s DataFrame shape (timestamp index, symbol + OHLCV columns) from its arrays."""
+    index = pd.DatetimeIndex(arrays['timestamp'].astype('datetime64[ms]'), name='timestamp')
+    df = pd.DataFrame({col: arrays[col] for col in OHLCV_COLUMNS}, index=index)
+    df.insert(0, 'symbol', symbol)
+    return df
+
+def _load_latest(symbol_id: int, timeframe: str, count: int):
+    """Loader used to seed the bar cache: the latest `count` bars as (timestamps, values)."""
+    with SQL_SECONDS.time(query='cache_seed'):
+        arrays = _query_db(_read_conn(), symbol_id, timeframe, None, None, count)
+    return arrays['timestamp'], np.column_stack([arrays[col] for col in OHLCV_COLUMNS])
+
+def _query_db(conn: sqlite3.Connection, symbol_id: Optional[int], timeframe: str,
+              start: Optional[int], end: Optional[int], limit: Optional[int]) -> Dict[str, np.ndarray]:
+    rows = []
+    if symbol_id is not None:
+        if timeframe == BASE_TIMEFRAME:
+            clauses, params = ["symbol_id = ?"], [symbol_id]
+        else:
+            clauses, params = ["timeframe = ?", "symbol_id = ?"], [timeframe, symbol_id]
+        if start is not None:
+            clauses.append("timestamp >= ?")
+            params.append(int(start))
+        if end is not None:
+            clauses.append("timestamp < ?")
+            params.append(int(end))
+        order = "DESC" if limit is not None else "ASC"
+        sql = f"SELECT timestamp, open, high, low, close, volume FROM {{table}} WHERE {' AND '.join(clauses)} ORDER BY timestamp {order}"
+        if limit is not None:
+            sql += " LIMIT ?"
+        if timeframe != BASE_TIMEFRAME:
+            rows = conn.execute(sql.format(table="ohlcv_rollup"),
+                                params + ([int(limit)] if limit is not None else [])).fetchall()
+        else:
+            # One partition per day; with a limit, newest day first until it is filled.
+            partitions = _read_partitions()
+            days = partitions.days(start, end)
+            if limit is not None:
+                days.reverse()
+            for day in days:
+                if limit is not None and len(rows) >= limit:
+                    break
+                table = partitions.table(day)
+                if table is not None:
+                    rows.extend(conn.execute(sql.format(table=table),
+                                             params + ([int(limit) - len(rows)] if limit is not None else [])).fetchall())
+        if limit is not None:
+            rows.reverse()
+
+    values = np.array(rows, dtype=np.float64).reshape(len(rows), 6)
+    arrays = {'timestamp': values[:, 0].astype(np.int64)}
+    for i, col in enumerate(OHLCV_COLUMNS, start=1):
+        arrays[col] = values[:, i]
+    return arrays
+
+def record_gap(stream: str, start_ms: int, end_ms: int, reason: str):
+    """Queues an ingestion gap for the writer thread."""
+    get_writer().submit_statement(
+        "INSERT OR REPLACE INTO ingest_gaps (stream, start_ms, end_ms, reason) VALUES (?, ?, ?, ?)",
+        (stream, int(start_ms), int(end_ms), reason),
+    )
+    logger.warning("Ingestion gap", extra={'stream': stream, 'start': _ms_to_iso(start_ms),
+                                           'end': _ms_to_iso(end_ms), 'reason': reason})
+
+def query_gaps(start: Optional[int] = None, end: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Recorded ingestion gaps overlapping [start, end) in epoch ms, oldest first."""
+    with SQL_SECONDS.time(query='gaps'):
+        rows = _read_conn().execute(
+            "SELECT stream, start_ms, end_ms, reason FROM ingest_gaps WHERE end_ms > ? AND start_ms < ? ORDER BY start_ms",
+            (-1 if start is None else int(start), 2 ** 62 if end is None else int(end)),
+        ).fetchall()
+    return [{'stream': s, 'start_ms': a, 'end_ms': b, 'reason': r} for s, a, b, r in rows]
+
+def _rule_row(fields: Dict[str, Any]) -> tuple:
+    return tuple(fields['window'] if col == 'window_size' else fields[col] for col in ALERT_RULE_COLUMNS)
+
+def _rule_fields(row: tuple) -> Dict[str, Any]:
+    fields = dict(zip(ALERT_RULE_COLUMNS, row))
+    fields['window'] = fields.pop('window_size')
+    return fields
+
+def save_alert_rule(fields: Dict[str, Any], rule_id: Optional[int] = None) -> Optional[int]:
+    """Inserts a rule (or replaces rule `rule_id`) and returns its id, or None if `rule_id` does not exist.
+
+    Rule edits are rare and need the id back, so they use a short-lived
+    connection instead of the bar writer's queue; WAL lets both write.
+    """
+    conn = sqlite3.connect(DB_PATH, timeout=5.0)
+    try:
+        with conn:
+            if rule_id is None:
+                cursor = conn.execute(
+                    f"INSERT INTO alert_rules ({', '.join(ALERT_RULE_COLUMNS)}) "
+                    f"VALUES ({', '.join('?' * len(ALERT_RULE_COLUMNS))})", _rule_row(fields))
+                return cursor.lastrowid
+            cursor = conn.execute(
+                f"UPDATE alert_rules SET {', '.join(f'{col} = ?' for col in ALERT_RULE_COLUMNS)} WHERE id = ?",
+                _rule_row(fields) + (rule_id,))
+            return rule_id if cursor.rowcount else None
+    finally:
+        conn.close()
+
+def delete_alert_rule(rule_id: int) -> bool:
+    conn = sqlite3.connect(DB_PATH, timeout=5.0)
+    try:
+        with conn:
+            return conn.execute("DELETE FROM alert_rules WHERE id = ?", (rule_id,)).rowcount > 0
+    finally:
+        conn.close()
+
+def load_alert_rules() -> List[tuple]:
+    """(id, fields) for every stored alert rule."""
+    rows = _read_conn().execute(f"SELECT id, {', '.join(ALERT_RULE_COLUMNS)} FROM alert_rules ORDER BY id").fetchall()
+    return [(row[0], _rule_fields(row[1:])) for row in rows]
+
+def load_closes(symbol: str, timeframe: str, limit: Optional[int], start: Optional[int] = None,
+                end: Optional[int] = None):
+    """(timestamps_ms, closes) of the latest `limit` bars in [start, end), for warming streaming feeds."""
+    arrays = query_ohlcv(symbol, start=start, end=end, limit=limit, timeframe=timeframe, as_frame=False)
+    return arrays['timestamp'], arrays['close']
+
+def ohlcv_zoom(symbol: str, start: Optional[int], end: Optional[int], max_points: int,
+               timeframe: str = BASE_TIMEFRAME) -> Optional[Tuple[int, Optional[int], int, str]]:
+    """Plans a decimated read of `timeframe` bars in [start, end): (start, end, bucket_ms, source timeframe).
+
+    The bucket width is the zoom level fitting the span into `max_points`;
+    the range is widened to whole buckets on its grid (an open end stays
+    open). Bars are read from the coarsest stored timeframe that tiles the
+    bucket, e.g. a month of 1s bars is drawn from the 5m rollups. A missing
+    start is the symbol's first bar. None if the symbol has no bars.
+    """
+    validate_timeframe(timeframe)
+    bar_ms = timeframe_to_ms(timeframe)
+    conn = _read_conn()
+    symbol_id = lookup_symbol(conn, symbol, _SYMBOL_IDS)
+    if symbol_id is None:
+        return None
+    if start is None:
+        # Every bar is covered by a daily rollup bucket, whatever its timeframe.
+        start = conn.execute("SELECT MIN(timestamp) FROM ohlcv_rollup WHERE timeframe = ? AND symbol_id = ?",
+                             (ROLLUP_TIMEFRAMES[-1], symbol_id)).fetchone()[0]
+        if start is None:
+            return None
+    span_end = end
+    if span_end is None:
+        last = last_bar_timestamp(symbol, timeframe)
+        if last is None:
+            return None
+        span_end = last + bar_ms
+    bucket_ms = zoom_bucket_ms(span_end - start, bar_ms, max_points)
+    source = max((tf for tf in SUPPORTED_TIMEFRAMES
+                  if timeframe_to_ms(tf) % bar_ms == 0 and bucket_ms % timeframe_to_ms(tf) == 0),
+                 key=timeframe_to_ms)
+    start -= start % bucket_ms
+    if end is not None:
+        end = -(-end // bucket_ms) * bucket_ms
+    return start, end, bucket_ms, source
+
+def query_ohlcv_decimated(symbol: str, start: int, end: Optional[int], bucket_ms: int,
+                          source_timeframe: str) -> Dict[str, np.ndarray]:
+    """Bars of `source_timeframe` in [start, end) merged into `bucket_ms` candles (see `ohlcv_zoom`)."""
+    arrays = query_ohlcv(symbol, start=start, end=end, timeframe=source_timeframe, as_frame=False)
+    if bucket_ms > timeframe_to_ms(source_timeframe):
+        arrays = decimate_ohlc(arrays, bucket_ms)
+    return arrays
+
+def last_bar_timestamp(symbol: str, timeframe: str = BASE_TIMEFRAME) -> Optional[int]:
+    """Epoch-ms timestamp of the newest stored bar (from the bar cache once warm), or None."""
+    timestamps = query_ohlcv(symbol, limit=1, timeframe=timeframe, as_frame=False)['timestamp']
+    return int(timestamps[-1]) if len(timestamps) else None
+
+def list_symbols() -> List[str]:
+    """Names of every symbol with stored bars, sorted."""
+    return [row[0] for row in _read_conn().execute("SELECT name FROM symbols ORDER BY name")]
+
+def get_ohlcv_data(symbol: str, limit: int = 500, timeframe: str = BASE_TIMEFRAME) -> pd.DataFrame:
+    """Retrieves the latest `limit` sampled OHLCV bars, from the rollup table for coarser timeframes."""
+    df = query_ohlcv(symbol, limit=limit, timeframe=timeframe)
+    logger.debug("Fetched bars", extra={'symbol': symbol, 'timeframe': timeframe, 'rows': len(df)})
+    return df
+
+def store_bars(bars: List[Bar]):
+    """Queues closed bars from a BarAggregator for persistence."""
+    if not bars:
+        return
+    rows = [
+        (bar.timestamp, bar.symbol, bar.open, bar.high, bar.low, bar.close, bar.volume)
+        for bar in bars
+    ]
+    get_writer().submit(rows)
+    logger.info("Queued closed bars", extra={'bars': len(bars), 'symbol': bars[-1].symbol,
+                                             'bar_time': _ms_to_iso(bars[-1].timestamp)})
+
+def rebuild_bars(start: int, end: int, symbols: Optional[List[str]] = None) -> Dict[str, int]:
+    """Rebuilds stored 1s bars, and the rollups over them, in [start, end) epoch ms from the tick log.
+
+    The range is replayed through a BarAggregator one REBUILD_WINDOW_MS
+    window at a time, each committed in its own transaction next to the
+    live writer. Per symbol and window, only the span between its first and
+    last logged tick is replaced, so bars from before the log existed are
+    kept. Bars cached by this process are dropped; a running server keeps
+    its own cache until restarted.
+    """
+    store = get_tick_store()
+    if store is None:
+        raise RuntimeError("The tick log is disabled (QUANT_TICK_DIR is empty)")
+    store.flush()
+    start, end = start - start % 1000, -(-end // 1000) * 1000
+    totals = {'windows': 0, 'ticks': 0, 'bars_deleted': 0, 'bars_written': 0}
+    symbol_ids: Dict[str, int] = {}
+    conn = sqlite3.connect(DB_PATH, timeout=30.0)
+    apply_writer_pragmas(conn)
+    partitions = Partitions(conn, PARTITION_DIR)
+    try:
+        for window_start in range(start, end, REBUILD_WINDOW_MS):
+            window_end = min(window_start + REBUILD_WINDOW_MS, end)
+            bars: List[Bar] = []
+            aggregator = BarAggregator(BASE_TIMEFRAME, grace_ms=BAR_GRACE_MS, on_bars=bars.extend)
+            totals['ticks'] += replay(store, aggregator, window_start, window_end, symbols)['ticks']
+            aggregator.flush()
+            if not bars:
+                continue
+            spans: Dict[str, List[int]] = {}
+            for bar in bars:
+                span = spans.setdefault(bar.symbol, [bar.timestamp, bar.timestamp])
+                span[0], span[1] = min(span[0], bar.timestamp), max(span[1], bar.timestamp)
+            rows = [bar[:7] for bar in bars if is_valid_bar((bar.timestamp, bar.symbol) + tuple(bar[2:7]))]
+            # A window spans at most two days, so all its partitions stay attached.
+            row_days = {partition_day(row[1]) for row in rows}
+            tables = {day: partitions.table(day, create=day in row_days)
+                      for day in range(partition_day(window_start), partition_day(window_end - 1) + 1)}
+            with conn:
+                ranges = []
+                for symbol, (first, last) in spans.items():
+                    symbol_id = intern_symbol(conn, symbol, symbol_ids)
+                    for day in range(partition_day(first), partition_day(last) + 1):
+                        if tables[day] is not None:
+                            totals['bars_deleted'] += conn.execute(
+                                f"DELETE FROM {tables[day]} WHERE symbol_id = ? AND timestamp >= ? AND timestamp <= ?",
+                                (symbol_id, first, last)).rowcount
+                    ranges.append((symbol_id, first, last + 1000))
+                for day in row_days:
+                    conn.executemany(UPSERT_OHLCV_SQL.format(table=tables[day]),
+                                     [(symbol_ids[symbol], ts, o, h, l, c, v) for symbol, ts, o, h, l, c, v in rows
+                                      if partition_day(ts) == day])
+                rebuild_rollups(conn, ranges, base_table=partitions.table_at)
+            totals['windows'] += 1
+            totals['bars_written'] += len(rows)
+            logger.info("Rebuilt bars from the tick log", extra={'window_start': _ms_to_iso(window_start),
+                                                                 'symbols': len(spans), 'bars': len(rows)})
+    finally:
+        conn.close()
+    BAR_CACHE.invalidate()
+    return totals
+
+def get_aggregator(timeframe: str = BASE_TIMEFRAME) -> BarAggregator:
+    """Returns the streaming bar builder for `timeframe`, creating it on first use."""
+    aggregator = _AGGREGATORS.get(timeframe)
+    if aggregator is None:
+        aggregator = BarAggregator(timeframe, grace_ms=BAR_GRACE_MS, on_bars=store_bars)
+        _AGGREGATORS[timeframe] = aggregator
+    return aggregator
+
+def advance_bars(event_ms: int):
+    """Closes the live bars that ended BAR_IDLE_CLOSE_MS before exchange time `event_ms`."""
+    for aggregator in list(_AGGREGATORS.values()):
+        aggregator.advance(event_ms - BAR_IDLE_CLOSE_MS)
+
+def flush_bars():
+    """Stores every live bar still in progress, e.g. on shutdown."""
+    for aggregator in list(_AGGREGATORS.values()):
+        aggregator.flush()
+
+def get_live_bar(symbol: str, timeframe: str = BASE_TIMEFRAME, epoch_ms: bool = False) -> Optional[Dict[str, Any]]:
+    """Returns the still-open bar for `symbol` as a record (ISO or epoch-ms timestamp), or None."""
+    aggregator = _AGGREGATORS.get(timeframe)
+    bar = aggregator.partial_bar(symbol) if aggregator is not None else None
+    if bar is None:
+        return None
+    return {
+        'timestamp': bar.timestamp if epoch_ms else _ms_to_iso(bar.timestamp),
+        'symbol': bar.symbol,
+        'open': bar.open,
+        'high': bar.high,
+        'low': bar.low,
+        'close': bar.close,
+        'volume': bar.volume,
+    }
 
 def resample_and_store(raw_ticks: List[Dict[str, Any]], timeframe: str, symbol: str):
-    """Processes raw ticks, resamples, and stores the resulting OHLCV bars."""
+    """Feeds raw ticks into the streaming bar builder; finished bars are stored as they close."""
     if not raw_ticks:
         return
-        
-    df = pd.DataFrame(raw_ticks)
-    df['time'] = pd.to_datetime(df['time'], unit='ms')
-    
-    
-    df = df.set_index('time')
-    df.index.name = 'timestamp' 
-
-   
-    ohlcv = df['price'].resample(timeframe).ohlc()
-    volume = df['qty'].resample(timeframe).sum().fillna(0)
-    
-    resampled_df = ohlcv.join(volume.rename('volume')).dropna()
-    
- 
-    store_ohlcv_data(resampled_df, symbol, timeframe)
-    
-    if not resampled_df.empty:
-        latest_ts = resampled_df.index[-1].isoformat()
-        print(f"--- [INGESTION SUCCESS] Stored {timeframe} bar for {symbol} ending at {latest_ts} ---")
-    
-
-init_db()
\ No newline at end of file
+
+    aggregator = get_aggregator(timeframe)
+    late_before = aggregator.late_ticks
+    for tick in raw_ticks:
+        aggregator.add_tick(symbol, tick['time'], tick['price'], tick['qty'])
+    if aggregator.late_ticks != late_before:
+        TICKS_DROPPED.inc(aggregator.late_ticks - late_before, symbol=symbol, reason='late')
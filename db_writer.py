@@ -0,0 +1,320 @@
+import logging
+import math
+import queue
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from metrics import FLUSH_ROWS, FLUSH_SECONDS
+from partitions import Partitions, partition_day
+from schema import intern_symbol
+
+logger = logging.getLogger(__name__)
+
+# (timestamp_ms, symbol, open, high, low, close, volume)
+BarRow = Tuple[int, str, float, float, float, float, float]
+
+# A single out-of-band write (e.g. a gap record) run on the writer's connection.
+Statement = namedtuple('Statement', ['sql', 'params'])
+# Maintenance work (e.g. retention) run as fn(writer, conn) between batches.
+Call = namedtuple('Call', ['fn', 'future'])
+
+# {table} is `ohlcv_data` or a day partition's qualified table.
+UPSERT_OHLCV_SQL = """
+    INSERT INTO {table} (symbol_id, timestamp, open, high, low, close, volume)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(symbol_id, timestamp) DO UPDATE SET
+        open = excluded.open,
+        high = excluded.high,
+        low = excluded.low,
+        close = excluded.close,
+        volume = excluded.volume
+"""
+
+WRITER_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-65536",
+    "PRAGMA busy_timeout=5000",
+)
+
+
+def apply_writer_pragmas(conn: sqlite3.Connection):
+    """Applies the WAL / durability pragmas used by every writing connection."""
+    for pragma in WRITER_PRAGMAS:
+        conn.execute(pragma)
+
+
+def is_valid_bar(row: Sequence[Any]) -> bool:
+    """Rejects bars with missing or non-finite prices and inconsistent ranges."""
+    try:
+        ts, symbol, o, h, l, c, v = row
+        values = (float(o), float(h), float(l), float(c), float(v))
+    except (TypeError, ValueError):
+        return False
+    if ts is None or not symbol:
+        return False
+    if not all(math.isfinite(x) for x in values):
+        return False
+    o, h, l, c, v = values
+    return l <= min(o, c) and h >= max(o, c) and v >= 0
+
+
+class OHLCVWriter:
+    """Single long-lived SQLite connection that persists queued bars in batches.
+
+    Producers call `submit` with lists of bar rows; a background thread groups
+    them into transactions of up to `batch_size` rows, or whatever has arrived
+    after `max_latency` seconds, and upserts them with `executemany`.
+    `post_write(conn, rows)` runs inside the same transaction with the
+    interned (symbol_id, timestamp_ms, ...) rows, so derived tables are
+    committed atomically with the bars they come from; whatever it returns
+    is handed to `on_commit` once the transaction has committed.
+
+    With `partition_dir`, bars go to per-day partitions (see partitions.py)
+    instead of the main `ohlcv_data` table, one transaction per group of
+    at most MAX_ATTACHED days.
+    """
+
+    def __init__(self, db_path: str, batch_size: int = 1000,
+                 max_latency: float = 0.25, max_queue: int = 10000,
+                 post_write: Optional[Callable[[sqlite3.Connection, List[Tuple]], Any]] = None,
+                 on_commit: Optional[Callable[[Any], None]] = None,
+                 partition_dir: Optional[str] = None):
+        self.db_path = db_path
+        self.partition_dir = partition_dir
+        self.partitions: Optional[Partitions] = None
+        self.post_write = post_write
+        self.on_commit = on_commit
+        self.batch_size = batch_size
+        self.max_latency = max_latency
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._symbol_ids: Dict[str, int] = {}
+        self.rows_written = 0
+        self.rows_rejected = 0
+        self.batches_committed = 0
+        self.last_error: Optional[str] = None
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="ohlcv-writer", daemon=True)
+            self._thread.start()
+
+    def submit(self, rows: List[BarRow]):
+        """Queues bar rows for persistence. Blocks if the writer is saturated."""
+        if rows:
+            self._queue.put(rows)
+
+    def submit_statement(self, sql: str, params: Sequence[Any] = ()):
+        """Queues one SQL statement to run in its own transaction on the writer thread."""
+        self._queue.put(Statement(sql, tuple(params)))
+
+    def submit_call(self, fn: Callable[["OHLCVWriter", sqlite3.Connection], Any]) -> Future:
+        """Queues `fn(writer, conn)` to run on the writer thread, outside any transaction.
+
+        Bars queued earlier are committed first. The returned future holds
+        the result; `fn` manages its own transactions.
+        """
+        future: Future = Future()
+        self._queue.put(Call(fn, future))
+        return future
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Blocks until everything submitted so far has been committed."""
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def stop(self, timeout: Optional[float] = 5.0):
+        """Flushes pending rows and shuts the writer thread down."""
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'rows_written': self.rows_written,
+            'rows_rejected': self.rows_rejected,
+            'batches_committed': self.batches_committed,
+            'queue_depth': self._queue.qsize(),
+            'last_error': self.last_error,
+        }
+
+    def _run(self):
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        apply_writer_pragmas(conn)
+        if self.partition_dir:
+            self.partitions = Partitions(conn, self.partition_dir)
+        pending: List[BarRow] = []
+        waiters: List[threading.Event] = []
+        deadline = None
+        running = True
+
+        try:
+            while running:
+                timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    item = ()
+
+                if item is None:
+                    running = False
+                elif isinstance(item, threading.Event):
+                    waiters.append(item)
+                elif isinstance(item, Statement):
+                    self._execute(conn, item)
+                elif isinstance(item, Call):
+                    if pending:
+                        self._flush_batch(conn, pending)
+                        pending = []
+                    self._call(conn, item)
+                elif item:
+                    pending.extend(item)
+                    if deadline is None:
+                        deadline = time.monotonic() + self.max_latency
+
+                expired = deadline is not None and time.monotonic() >= deadline
+                if pending and (len(pending) >= self.batch_size or expired or waiters or not running):
+                    self._flush_batch(conn, pending)
+                    pending = []
+                    deadline = None
+
+                if not pending:
+                    deadline = None
+                    for waiter in waiters:
+                        waiter.set()
+                    waiters = []
+        finally:
+            conn.close()
+
+    def _execute(self, conn: sqlite3.Connection, statement: Statement):
+        try:
+            with conn:
+                conn.execute(statement.sql, statement.params)
+        except sqlite3.Error as e:
+            self.last_error = str(e)
+            logger.error("Writer statement failed", extra={'statement': statement.sql.split()[0], 'error': str(e)})
+
+    def _call(self, conn: sqlite3.Connection, call: Call):
+        if not call.future.set_running_or_notify_cancel():
+            return
+        try:
+            call.future.set_result(call.fn(self, conn))
+        except Exception as e:
+            if conn.in_transaction:
+                conn.rollback()
+            self.last_error = str(e)
+            logger.error("Writer call failed", extra={'call': getattr(call.fn, '__qualname__', repr(call.fn)),
+                                                      'error': str(e)})
+            call.future.set_exception(e)
+
+    def _flush_batch(self, conn: sqlite3.Connection, rows: List[BarRow]):
+        """`_write_batch`, keeping the writer thread alive if it raises; unwritten rows count as rejected."""
+        written, rejected = self.rows_written, self.rows_rejected
+        try:
+            self._write_batch(conn, rows)
+        except Exception as e:
+            if conn.in_transaction:
+                conn.rollback()
+            lost = len(rows) - (self.rows_written - written) - (self.rows_rejected - rejected)
+            self.rows_rejected += max(lost, 0)
+            self.last_error = str(e)
+            logger.error("Writer batch failed, dropping rows", extra={'rows': lost, 'error': str(e)})
+
+    def _write_batch(self, conn: sqlite3.Connection, rows: List[BarRow]):
+        valid = [row for row in rows if is_valid_bar(row)]
+        self.rows_rejected += len(rows) - len(valid)
+        if not valid:
+            return
+
+        try:
+            valid = [
+                (intern_symbol(conn, symbol, self._symbol_ids), int(ts), o, h, l, c, v)
+                for ts, symbol, o, h, l, c, v in valid
+            ]
+        except sqlite3.Error as e:
+            self.rows_rejected += len(valid)
+            self.last_error = str(e)
+            logger.error("Writer could not intern symbols, dropping rows", extra={'rows': len(valid), 'error': str(e)})
+            return
+
+        if self.partitions is None:
+            self._commit_rows(conn, {'ohlcv_data': valid})
+            return
+        # New symbol ids are committed first: a partition's pragmas cannot be set inside a transaction.
+        conn.commit()
+        by_day: Dict[int, List[Tuple]] = {}
+        for row in valid:
+            by_day.setdefault(partition_day(row[1]), []).append(row)
+        days = sorted(by_day)
+        step = self.partitions.max_attached
+        for i in range(0, len(days), step):
+            group = days[i:i + step]
+            try:
+                groups = {self.partitions.table(day, create=True): by_day[day] for day in group}
+            except (sqlite3.Error, OSError) as e:
+                rows_lost = sum(len(by_day[day]) for day in group)
+                self.rows_rejected += rows_lost
+                self.last_error = str(e)
+                logger.error("Writer could not open partitions, dropping rows", extra={'rows': rows_lost, 'error': str(e)})
+                continue
+            self._commit_rows(conn, groups)
+
+    def _commit_rows(self, conn: sqlite3.Connection, groups: Dict[str, List[Tuple]]):
+        """Upserts interned rows, grouped by destination table, in one transaction."""
+        valid = [row for rows in groups.values() for row in rows]
+        started = time.perf_counter()
+        try:
+            with conn:
+                for table, group in groups.items():
+                    conn.executemany(UPSERT_OHLCV_SQL.format(table=table), group)
+                derived = self.post_write(conn, valid) if self.post_write is not None else None
+            FLUSH_SECONDS.observe(time.perf_counter() - started)
+            FLUSH_ROWS.observe(len(valid))
+            self.rows_written += len(valid)
+            self.batches_committed += 1
+            self._committed(derived)
+            return
+        except sqlite3.Error as e:
+            self.last_error = str(e)
+            logger.warning("Writer batch failed, retrying row by row", extra={'rows': len(valid), 'error': str(e)})
+
+        # Isolate the offending rows so one bad bar does not lose the batch.
+        written = []
+        derived = None
+        with conn:
+            for table, group in groups.items():
+                for row in group:
+                    try:
+                        conn.execute(UPSERT_OHLCV_SQL.format(table=table), row)
+                        written.append(row)
+                    except sqlite3.Error as e:
+                        self.rows_rejected += 1
+                        self.last_error = str(e)
+            if written and self.post_write is not None:
+                derived = self.post_write(conn, written)
+        FLUSH_SECONDS.observe(time.perf_counter() - started)
+        FLUSH_ROWS.observe(len(written))
+        self.rows_written += len(written)
+        self.batches_committed += 1
+        self._committed(derived)
+
+    def _committed(self, derived: Any):
+        if self.on_commit is None or derived is None:
+            return
+        try:
+            self.on_commit(derived)
+        except Exception as e:
+            self.last_error = str(e)
+            logger.error("Writer on_commit hook failed", extra={'error': str(e)})
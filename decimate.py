@@ -0,0 +1,93 @@
+from typing import Dict, Sequence
+
+import numpy as np
+
+# Bucket widths a chart is decimated to, finest first. A request's span and
+# point budget pick one, and buckets sit on the epoch-aligned grid of that
+# width, so nearby requests at the same zoom level share bucket boundaries
+# (and cache entries), and every width up to a day is a whole number of the
+# stored timeframes it can be built from.
+ZOOM_LEVELS_MS = tuple(s * 1000 for s in (
+    1, 2, 5, 10, 15, 30,
+    60, 2 * 60, 5 * 60, 10 * 60, 15 * 60, 30 * 60,
+    3600, 2 * 3600, 3 * 3600, 4 * 3600, 6 * 3600, 12 * 3600,
+    86400, 2 * 86400, 7 * 86400, 14 * 86400, 28 * 86400,
+))
+
+
+def zoom_bucket_ms(span_ms: int, bar_ms: int, max_points: int) -> int:
+    """Narrowest zoom level (a multiple of `bar_ms`) that fits `span_ms` into `max_points` buckets."""
+    need = -(-max(int(span_ms), 1) // max(int(max_points), 1))
+    for level in ZOOM_LEVELS_MS:
+        if level >= need and level >= bar_ms and level % bar_ms == 0:
+            return level
+    coarsest = ZOOM_LEVELS_MS[-1]
+    return -(-need // coarsest) * coarsest
+
+
+def decimate_ohlc(arrays: Dict[str, np.ndarray], bucket_ms: int) -> Dict[str, np.ndarray]:
+    """Merges ascending bars into `bucket_ms` candles on the epoch grid.
+
+    Each candle keeps the first open, the highest high, the lowest low, the
+    last close and the summed volume of its bars, so no extreme is lost.
+    """
+    ts = arrays['timestamp']
+    if not len(ts):
+        return arrays
+    buckets = ts - ts % bucket_ms
+    starts = np.flatnonzero(np.concatenate(([True], buckets[1:] != buckets[:-1])))
+    ends = np.append(starts[1:], len(ts)) - 1
+    return {
+        'timestamp': buckets[starts],
+        'open': arrays['open'][starts],
+        'high': np.maximum.reduceat(arrays['high'], starts),
+        'low': np.minimum.reduceat(arrays['low'], starts),
+        'close': arrays['close'][ends],
+        'volume': np.add.reduceat(arrays['volume'], starts),
+    }
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets: indices of `n_out` points that best keep the line's shape.
+
+    The first and last points are kept; each bucket in between keeps the
+    point forming the largest triangle with the previously kept point and
+    the next bucket's mean. Bucket means come from cumulative sums, so only
+    the argmax per bucket runs in a Python-level loop over `n_out` buckets.
+    `y` must not contain NaNs.
+    """
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    edges = np.unique(np.linspace(1, n - 1, n_out - 1).astype(np.int64))
+    cx = np.concatenate(([0.0], np.cumsum(x)))
+    cy = np.concatenate(([0.0], np.cumsum(y)))
+    # Mean of each bucket's successor; the last bucket's successor is the final point.
+    nxt_lo, nxt_hi = edges[1:-1], edges[2:]
+    mean_x = np.append((cx[nxt_hi] - cx[nxt_lo]) / (nxt_hi - nxt_lo), x[-1])
+    mean_y = np.append((cy[nxt_hi] - cy[nxt_lo]) / (nxt_hi - nxt_lo), y[-1])
+
+    selected = np.empty(len(edges) + 1, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(len(edges) - 1):
+        lo, hi = edges[i], edges[i + 1]
+        ax, ay = x[a], y[a]
+        area = np.abs((ax - mean_x[i]) * (y[lo:hi] - ay) - (ax - x[lo:hi]) * (mean_y[i] - ay))
+        a = lo + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+def lttb_rows(timestamps: np.ndarray, series: Sequence[np.ndarray], max_points: int) -> np.ndarray:
+    """Sorted row indices keeping the shape of every series, about `max_points` in total.
+
+    The budget is split evenly between the series and their LTTB picks are
+    merged, so each plotted line keeps its own peaks and troughs.
+    """
+    if len(timestamps) <= max_points or not series:
+        return np.arange(len(timestamps))
+    per_series = max(3, max_points // len(series))
+    return np.unique(np.concatenate([lttb_indices(timestamps, values, per_series) for values in series]))
@@ -0,0 +1,133 @@
+import argparse
+import asyncio
+import json
+import random
+import time
+from http import HTTPStatus
+from typing import Dict, List, Sequence, Set
+from urllib.parse import parse_qs, urlsplit
+
+import websockets
+
+
+def mini_ticker(symbol: str, price: float, event_ms: int) -> Dict[str, object]:
+    """A Binance-shaped 24hrMiniTicker payload (prices and volumes as strings)."""
+    return {
+        'e': '24hrMiniTicker', 'E': event_ms, 's': symbol.upper(),
+        'c': f"{price:.8f}", 'o': f"{price:.8f}", 'h': f"{price:.8f}", 'l': f"{price:.8f}",
+        'v': f"{random.uniform(1, 1000):.4f}", 'q': f"{random.uniform(1e3, 1e6):.2f}",
+    }
+
+
+class FakeExchange:
+    """Local WebSocket server speaking the Binance miniTicker streams, for tests.
+
+    Serves `/ws/!miniTicker@arr` (one array per tick interval) and combined
+    streams `/stream?streams=<sym>@miniTicker/...` (one wrapped message per
+    symbol). Prices follow a random walk. `drop_connections`, `pause` and
+    `reject_for` simulate a dropped socket, a silent stall and a refused
+    reconnect.
+    """
+
+    def __init__(self, symbols: Sequence[str], interval: float = 1.0,
+                 host: str = '127.0.0.1', port: int = 0):
+        self.symbols = [s.lower() for s in symbols]
+        self.interval = interval
+        self.host = host
+        self.port = port
+        self._prices = {s: random.uniform(10, 1000) for s in self.symbols}
+        self._connections: Set = set()
+        self._server = None
+        self._paused_until = 0.0
+        self._reject_until = 0.0
+        self.frames_sent = 0
+        self.connections_accepted = 0
+
+    @property
+    def url(self) -> str:
+        return f"ws://{self.host}:{self.port}"
+
+    async def start(self):
+        self._server = await websockets.serve(self._handle, self.host, self.port,
+                                              process_request=self._process_request)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def drop_connections(self):
+        """Closes every open client connection abnormally (code 1011)."""
+        for connection in list(self._connections):
+            await connection.close(code=1011, reason="fake exchange drop")
+
+    def pause(self, seconds: float):
+        """Keeps connections open but sends nothing for `seconds`."""
+        self._paused_until = time.monotonic() + seconds
+
+    def reject_for(self, seconds: float):
+        """Answers new handshakes with HTTP 503 for `seconds`."""
+        self._reject_until = time.monotonic() + seconds
+
+    def _process_request(self, connection, request):
+        if time.monotonic() < self._reject_until:
+            return connection.respond(HTTPStatus.SERVICE_UNAVAILABLE, "fake exchange unavailable\n")
+        return None
+
+    def _step(self) -> int:
+        for symbol in self.symbols:
+            self._prices[symbol] *= 1.0 + random.gauss(0.0, 0.0005)
+        return int(time.time() * 1000)
+
+    def _frames(self, path: str, event_ms: int) -> List[str]:
+        parts = urlsplit(path)
+        if parts.path.startswith('/stream'):
+            streams = parse_qs(parts.query).get('streams', [''])[0].split('/')
+            frames = []
+            for stream in filter(None, streams):
+                symbol = stream.split('@')[0].lower()
+                if symbol in self._prices:
+                    frames.append(json.dumps({'stream': stream,
+                                              'data': mini_ticker(symbol, self._prices[symbol], event_ms)}))
+            return frames
+        return [json.dumps([mini_ticker(s, p, event_ms) for s, p in self._prices.items()])]
+
+    async def _handle(self, connection):
+        self._connections.add(connection)
+        self.connections_accepted += 1
+        path = connection.request.path
+        try:
+            while True:
+                await asyncio.sleep(self.interval)
+                if time.monotonic() < self._paused_until:
+                    continue
+                for frame in self._frames(path, self._step()):
+                    await connection.send(frame)
+                    self.frames_sent += 1
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            self._connections.discard(connection)
+
+
+async def _serve(args):
+    exchange = FakeExchange(args.symbols.split(','), interval=args.interval, host=args.host, port=args.port)
+    await exchange.start()
+    print(f"Fake exchange listening on {exchange.url} (QUANT_WS_BASE={exchange.url})")
+    while True:
+        await asyncio.sleep(args.drop_every or 3600)
+        if args.drop_every:
+            print("Dropping all connections")
+            await exchange.drop_connections()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve fake Binance miniTicker streams for local testing.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9001)
+    parser.add_argument('--symbols', default='btcusdt,ethusdt', help="Comma-separated symbols to publish.")
+    parser.add_argument('--interval', type=float, default=1.0, help="Seconds between ticks per stream.")
+    parser.add_argument('--drop-every', type=float, default=0.0, help="Drop all connections every N seconds (0 = never).")
+    asyncio.run(_serve(parser.parse_args()))
@@ -0,0 +1,258 @@
+import json
+import logging
+import queue
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Optional
+
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:  # optional speed-up; the stdlib parser is a drop-in fallback
+    orjson = None
+    _loads = json.loads
+
+from metrics import FRAMES_DROPPED, FRAMES_RECEIVED, TICKS_RECEIVED
+
+logger = logging.getLogger(__name__)
+
+# Bounded hand-offs between stages. Frames are whole `!miniTicker@arr`
+# snapshots, so when the decoder falls behind the receive stage drops the
+# oldest queued frame rather than ever blocking the event loop.
+FRAME_QUEUE_SIZE = 256
+TICK_QUEUE_SIZE = 1024
+# A stream whose exchange event time jumps by more than this between frames
+# (miniTicker pushes every second) is recorded as a gap.
+GAP_THRESHOLD_MS = 5000
+
+TickSink = Callable[[str, List[Dict[str, Any]]], None]
+# How often the aggregate stage calls `advance` while ticks are flowing or not.
+ADVANCE_INTERVAL_S = 0.25
+
+# (stream, start_ms, end_ms, reason)
+GapSink = Callable[[str, int, int, str], None]
+
+
+class IngestPipeline:
+    """Receive -> decode -> aggregate stages connected by bounded queues.
+
+    `submit_frame` is the receive stage: it runs on the asyncio loop and only
+    enqueues the raw payload. A decode thread parses frames, keeps ticks for
+    symbols accepted by `is_tracked` and groups them per symbol; an aggregate
+    thread hands each group to `sink(symbol, ticks)` (bar building and the
+    writer queue). If the sink stalls, the tick queue fills, the decoder
+    blocks on it, and the frame queue starts shedding its oldest frames.
+
+    Frames are tagged with their source stream; the decoder tracks each
+    stream's latest event time `E` and reports jumps larger than
+    `gap_threshold_ms` to `on_gap`.
+
+    Every `advance_interval` seconds the aggregate thread calls
+    `advance(event_ms)` with the exchange's estimated current time (the wall
+    clock minus the last measured lag), so bars of symbols that stopped
+    ticking still close; on `stop` it calls `flush()` once the queues are
+    drained. Both run on the same thread as `sink`.
+    """
+
+    def __init__(self, sink: TickSink, is_tracked: Callable[[str], bool],
+                 frame_queue_size: int = FRAME_QUEUE_SIZE, tick_queue_size: int = TICK_QUEUE_SIZE,
+                 on_gap: Optional[GapSink] = None, gap_threshold_ms: int = GAP_THRESHOLD_MS,
+                 advance: Optional[Callable[[int], None]] = None, flush: Optional[Callable[[], None]] = None,
+                 advance_interval: float = ADVANCE_INTERVAL_S):
+        self.sink = sink
+        self.is_tracked = is_tracked
+        self.on_gap = on_gap
+        self.advance = advance
+        self.flush = flush
+        self.advance_interval = advance_interval
+        self.gap_threshold_ms = gap_threshold_ms
+        self._last_event: Dict[str, int] = {}
+        self._reconnected: set = set()
+        self._frames: "queue.Queue" = queue.Queue(maxsize=frame_queue_size)
+        self._ticks: "queue.Queue" = queue.Queue(maxsize=tick_queue_size)
+        # Memoized filter: raw stream symbol -> stored name, or None if untracked.
+        self._names: Dict[str, Optional[str]] = {}
+        self._threads: List[threading.Thread] = []
+        self._lock = threading.Lock()
+        self.frames_received = 0
+        self.frames_dropped = 0
+        self.frames_decoded = 0
+        self.decode_errors = 0
+        self.ticks_accepted = 0
+        self.sink_errors = 0
+        self.gaps_detected = 0
+        # Exchange event time `E` to hand-off to the sink, and time spent queued.
+        self.last_lag_ms = 0.0
+        self.max_lag_ms = 0.0
+        self.last_queue_ms = 0.0
+
+    def start(self):
+        with self._lock:
+            if any(t.is_alive() for t in self._threads):
+                return
+            self._threads = [
+                threading.Thread(target=self._decode_loop, name="ingest-decode", daemon=True),
+                threading.Thread(target=self._aggregate_loop, name="ingest-aggregate", daemon=True),
+            ]
+            for thread in self._threads:
+                thread.start()
+
+    def stop(self, timeout: Optional[float] = 5.0):
+        """Drains queued frames through both stages and stops the threads."""
+        with self._lock:
+            if not self._threads:
+                return
+            self._frames.put(None)
+            for thread in self._threads:
+                thread.join(timeout)
+            self._threads = []
+
+    def submit_frame(self, raw: Any, source: str = 'default'):
+        """Receive stage: never blocks; sheds the oldest frame when the decoder is behind."""
+        self.frames_received += 1
+        FRAMES_RECEIVED.inc(source=source)
+        item = (time.monotonic(), source, raw)
+        while True:
+            try:
+                self._frames.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    dropped = self._frames.get_nowait()
+                    self.frames_dropped += 1
+                    if dropped is not None:
+                        FRAMES_DROPPED.inc(source=dropped[1])
+                except queue.Empty:
+                    pass
+
+    def mark_reconnected(self, source: str):
+        """Tags the next gap found on `source` as caused by a reconnect."""
+        self._reconnected.add(source)
+
+    def _check_gap(self, source: str, event_ms: int):
+        last = self._last_event.get(source)
+        if last is not None and event_ms <= last:
+            return
+        self._last_event[source] = event_ms
+        if last is None or event_ms - last <= self.gap_threshold_ms:
+            return
+        reason = 'reconnect' if source in self._reconnected else 'stall'
+        self._reconnected.discard(source)
+        self.gaps_detected += 1
+        if self.on_gap is not None:
+            try:
+                self.on_gap(source, last, event_ms, reason)
+            except Exception as e:
+                logger.error("Could not record ingestion gap", extra={'source': source, 'error': str(e)})
+
+    def _stored_name(self, symbol: str) -> Optional[str]:
+        try:
+            return self._names[symbol]
+        except KeyError:
+            name = symbol.upper() if self.is_tracked(symbol.lower()) else None
+            self._names[symbol] = name
+            return name
+
+    def _decode_loop(self):
+        while True:
+            item = self._frames.get()
+            if item is None:
+                self._ticks.put(None)
+                return
+            received, source, raw = item
+            try:
+                message = _loads(raw)
+            except ValueError:
+                self.decode_errors += 1
+                continue
+            if isinstance(message, dict):
+                # Combined streams wrap one ticker per message: {"stream": ..., "data": {...}}.
+                message = message.get('data', message)
+                message = [message] if isinstance(message, dict) else message
+            if not isinstance(message, list):
+                continue
+
+            frame_ticks = defaultdict(list)
+            latest_event = None
+            try:
+                for tick in message:
+                    event_ms = tick.get('E')
+                    if event_ms is not None and (latest_event is None or event_ms > latest_event):
+                        latest_event = event_ms
+                    name = self._stored_name(tick.get('s', ''))
+                    if name is not None:
+                        frame_ticks[name].append({
+                            'time': tick.get('E'),
+                            'price': float(tick.get('c')),
+                            'qty': float(tick.get('v')),
+                        })
+            except (AttributeError, TypeError, ValueError):
+                self.decode_errors += 1
+                continue
+            self.frames_decoded += 1
+            if latest_event is not None:
+                self._check_gap(source, int(latest_event))
+            if frame_ticks:
+                self._ticks.put((received, frame_ticks))
+
+    def _aggregate_loop(self):
+        next_advance = time.monotonic() + self.advance_interval
+        while True:
+            timeout = None if self.advance is None else max(0.0, next_advance - time.monotonic())
+            try:
+                item = self._ticks.get(timeout=timeout)
+            except queue.Empty:
+                item = ()
+            if item is None:
+                self._run_hook(self.flush)
+                return
+            if item:
+                self._aggregate(*item)
+            if self.advance is not None and time.monotonic() >= next_advance:
+                next_advance = time.monotonic() + self.advance_interval
+                # Nothing is open before the first tick, and the lag is unknown until then.
+                if self.ticks_accepted:
+                    self._run_hook(self.advance, int(time.time() * 1000.0 - self.last_lag_ms))
+
+    def _run_hook(self, hook: Optional[Callable[..., None]], *args):
+        if hook is None:
+            return
+        try:
+            hook(*args)
+        except Exception as e:
+            self.sink_errors += 1
+            logger.error("Bar aggregator hook failed", extra={'hook': hook.__name__, 'error': str(e)})
+
+    def _aggregate(self, received: float, frame_ticks: Dict[str, List[Dict[str, Any]]]):
+        self.last_queue_ms = (time.monotonic() - received) * 1000.0
+        now_ms = time.time() * 1000.0
+        for symbol, ticks in frame_ticks.items():
+            self.ticks_accepted += len(ticks)
+            TICKS_RECEIVED.inc(len(ticks), symbol=symbol)
+            event_ms = ticks[-1]['time']
+            if event_ms is not None:
+                self.last_lag_ms = now_ms - event_ms
+                self.max_lag_ms = max(self.max_lag_ms, self.last_lag_ms)
+            try:
+                self.sink(symbol, ticks)
+            except Exception as e:
+                self.sink_errors += 1
+                logger.error("Tick aggregation failed", extra={'symbol': symbol, 'error': str(e)})
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'frames_received': self.frames_received,
+            'frames_dropped': self.frames_dropped,
+            'frames_decoded': self.frames_decoded,
+            'decode_errors': self.decode_errors,
+            'ticks_accepted': self.ticks_accepted,
+            'sink_errors': self.sink_errors,
+            'gaps_detected': self.gaps_detected,
+            'frame_queue_depth': self._frames.qsize(),
+            'tick_queue_depth': self._ticks.qsize(),
+            'last_lag_ms': round(self.last_lag_ms, 3),
+            'max_lag_ms': round(self.max_lag_ms, 3),
+            'last_queue_ms': round(self.last_queue_ms, 3),
+            'json_parser': 'orjson' if orjson is not None else 'json',
+        }
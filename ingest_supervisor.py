@@ -0,0 +1,142 @@
+import asyncio
+import logging
+import random
+import time
+from collections import namedtuple
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import websockets
+
+logger = logging.getLogger(__name__)
+
+# One WebSocket connection and the symbols it carries (empty for the
+# all-market `!miniTicker@arr` stream).
+StreamShard = namedtuple('StreamShard', ['name', 'url', 'symbols'])
+
+BACKOFF_BASE_S = 0.5
+BACKOFF_MAX_S = 30.0
+# A connection that delivers nothing for this long is treated as dead.
+IDLE_TIMEOUT_S = 30.0
+
+
+def build_shards(base_url: str, symbols: Sequence[str], shard_count: int = 1) -> List[StreamShard]:
+    """Splits the tracked symbols across `shard_count` combined-stream connections.
+
+    Wildcard entries (e.g. "*usdt") can only be served by the all-market
+    array stream, so any wildcard yields a single `!miniTicker@arr` shard.
+    """
+    base_url = base_url.rstrip('/')
+    if not symbols or any(s.startswith('*') for s in symbols):
+        return [StreamShard('all', f"{base_url}/ws/!miniTicker@arr", ())]
+    ordered = sorted(set(symbols))
+    shard_count = max(1, min(shard_count, len(ordered)))
+    shards = []
+    for i in range(shard_count):
+        group = tuple(ordered[i::shard_count])
+        streams = '/'.join(f"{symbol}@miniTicker" for symbol in group)
+        shards.append(StreamShard(f"shard{i}", f"{base_url}/stream?streams={streams}", group))
+    return shards
+
+
+def backoff_delay(attempt: int, base: float = BACKOFF_BASE_S, cap: float = BACKOFF_MAX_S) -> float:
+    """Exponential backoff with full jitter, so shards do not reconnect in lockstep."""
+    return random.uniform(0.0, min(cap, base * (2 ** attempt)))
+
+
+class _ShardState:
+    __slots__ = ('connected', 'connects', 'disconnects', 'frames', 'down_since',
+                 'last_recover_ms', 'max_recover_ms', 'last_error')
+
+    def __init__(self):
+        self.connected = False
+        self.connects = 0
+        self.disconnects = 0
+        self.frames = 0
+        self.down_since: Optional[float] = None
+        self.last_recover_ms: Optional[float] = None
+        self.max_recover_ms: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+
+class IngestSupervisor:
+    """Keeps one WebSocket connection per shard alive and feeds frames to `on_frame`.
+
+    Each shard reconnects on close, error or `idle_timeout` of silence, with
+    jittered exponential backoff. Time-to-recover runs from the moment a
+    shard goes down until its first frame after reconnecting. `on_reconnect`
+    is called with the shard name just before that first frame is handed on.
+    """
+
+    def __init__(self, shards: Sequence[StreamShard], on_frame: Callable[[Any, str], None],
+                 on_reconnect: Optional[Callable[[str], None]] = None,
+                 idle_timeout: float = IDLE_TIMEOUT_S,
+                 backoff_base: float = BACKOFF_BASE_S, backoff_max: float = BACKOFF_MAX_S):
+        self.shards = list(shards)
+        self.on_frame = on_frame
+        self.on_reconnect = on_reconnect
+        self.idle_timeout = idle_timeout
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._state: Dict[str, _ShardState] = {shard.name: _ShardState() for shard in self.shards}
+
+    async def run(self):
+        """Runs every shard until cancelled."""
+        await asyncio.gather(*(self._run_shard(shard) for shard in self.shards))
+
+    async def _run_shard(self, shard: StreamShard):
+        state = self._state[shard.name]
+        attempt = 0
+        while True:
+            try:
+                async with websockets.connect(shard.url, open_timeout=10, max_size=None) as websocket:
+                    state.connected = True
+                    state.connects += 1
+                    attempt = 0
+                    logger.info("Connected", extra={'shard': shard.name, 'url': shard.url})
+                    while True:
+                        raw = await asyncio.wait_for(websocket.recv(), timeout=self.idle_timeout)
+                        if state.down_since is not None:
+                            recover_ms = (time.monotonic() - state.down_since) * 1000.0
+                            state.last_recover_ms = recover_ms
+                            state.max_recover_ms = max(state.max_recover_ms or 0.0, recover_ms)
+                            state.down_since = None
+                            if self.on_reconnect is not None:
+                                self.on_reconnect(shard.name)
+                        state.frames += 1
+                        self.on_frame(raw, shard.name)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # ConnectionClosed, handshake failures, OSError and idle timeouts all mean "reconnect".
+                if isinstance(e, asyncio.TimeoutError) and state.connected:
+                    state.last_error = f"no frames for {self.idle_timeout:g}s"
+                else:
+                    state.last_error = f"{type(e).__name__}: {e}"
+                if state.connected:
+                    state.disconnects += 1
+                if state.down_since is None:
+                    state.down_since = time.monotonic()
+            state.connected = False
+            delay = backoff_delay(attempt, self.backoff_base, self.backoff_max)
+            attempt += 1
+            logger.warning("Connection down, reconnecting",
+                           extra={'shard': shard.name, 'error': state.last_error, 'delay_s': round(delay, 2)})
+            await asyncio.sleep(delay)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        now = time.monotonic()
+        result = {}
+        for shard in self.shards:
+            state = self._state[shard.name]
+            result[shard.name] = {
+                'connected': state.connected,
+                'symbols': len(shard.symbols),
+                'connects': state.connects,
+                'disconnects': state.disconnects,
+                'frames': state.frames,
+                'down_for_ms': None if state.down_since is None else round((now - state.down_since) * 1000.0, 3),
+                'last_recover_ms': state.last_recover_ms,
+                'max_recover_ms': state.max_recover_ms,
+                'last_error': state.last_error,
+            }
+        return result
@@ -0,0 +1,126 @@
+import math
+from collections import namedtuple
+from typing import Tuple
+
+import numpy as np
+
+from streaming_analytics import SpreadUpdate
+
+# State noise ratio: each bar the (alpha, beta) covariance grows by
+# delta / (1 - delta) on its diagonal, i.e. how fast the hedge ratio may drift
+# (1e-7 lets beta wander about 1% over a day of 1s bars).
+KALMAN_DELTA = 1e-7
+# Observation noise variance of Y, in units of Y's first price squared
+# (1e-7 is a ~0.03% standard deviation), so the default suits any price level.
+# When both match the data, the innovation z-score is close to unit variance.
+KALMAN_OBS_VAR = 1e-7
+
+KalmanPass = namedtuple('KalmanPass', ['alpha', 'beta', 'innovation', 'innovation_var'])
+
+
+class KalmanHedgeRatio:
+    """Kalman filter for y = alpha + beta * x with (alpha, beta) following a random walk.
+
+    Prices are divided by the first bar of each leg before filtering, so
+    `delta` and `obs_var` mean the same for BTC and for a penny coin; the
+    state starts at alpha = 0, beta = y0 / x0 with unit variance. Each
+    `update` is one predict / correct step in O(1) and returns the filtered
+    beta (in price units), the spread Y - beta * X and the innovation
+    z-score: the one-step prediction error over its predicted standard
+    deviation, reported once `window` bars have been filtered. `run` is the
+    batch pass over arrays; it performs the same arithmetic, so a warmed-up
+    engine continues exactly where the batch result ends.
+    """
+
+    def __init__(self, window: int = 1, delta: float = KALMAN_DELTA, obs_var: float = KALMAN_OBS_VAR):
+        if not 0.0 < delta < 1.0:
+            raise ValueError("delta must be between 0 and 1")
+        if obs_var <= 0.0:
+            raise ValueError("obs_var must be positive")
+        self.window = max(int(window), 1)
+        self.delta = delta
+        self.obs_var = obs_var
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self._y0 = self._x0 = 1.0
+        self._a, self._b = 0.0, 1.0
+        self._p00, self._p01, self._p11 = 1.0, 0.0, 1.0
+
+    @property
+    def beta(self) -> float:
+        return self._b * self._y0 / self._x0 if self.count else math.nan
+
+    @property
+    def alpha(self) -> float:
+        return self._a * self._y0 if self.count else math.nan
+
+    def update(self, bar_y: float, bar_x: float) -> SpreadUpdate:
+        """Filters one aligned pair of closes and returns (beta, spread, zscore)."""
+        y, x = float(bar_y), float(bar_x)
+        if self.count == 0:
+            self._y0, self._x0 = (y or 1.0), (x or 1.0)
+        e, q = self._step(y / self._y0, x / self._x0)
+        self.count += 1
+        beta = self.beta
+        zscore = e / math.sqrt(q) if self.count >= self.window else math.nan
+        return SpreadUpdate(beta, y - beta * x, zscore)
+
+    def _step(self, y: float, x: float) -> Tuple[float, float]:
+        """One predict / correct step on normalised prices; returns (innovation, its variance)."""
+        q = self.delta / (1.0 - self.delta)
+        r00, r01, r11 = self._p00 + q, self._p01, self._p11 + q
+        # R h' and h R h' for h = (1, x)
+        g0, g1 = r00 + x * r01, r01 + x * r11
+        s = g0 + x * g1 + self.obs_var
+        e = y - self._a - self._b * x
+        k0, k1 = g0 / s, g1 / s
+        self._a += k0 * e
+        self._b += k1 * e
+        self._p00, self._p01, self._p11 = r00 - k0 * g0, r01 - k0 * g1, r11 - k1 * g1
+        return e, s
+
+    def run(self, y: np.ndarray, x: np.ndarray) -> KalmanPass:
+        """Batch pass over aligned closes (oldest first) from the current state; leaves the state at the last bar.
+
+        The filter is a recursion, so the bars are stepped in a scalar loop
+        over plain floats (about a microsecond each); scaling, the beta and
+        intercept conversion and the z-scores are array operations.
+        """
+        y = np.asarray(y, dtype=np.float64)
+        x = np.asarray(x, dtype=np.float64)
+        if len(y) != len(x):
+            raise ValueError("y and x must be aligned and of equal length")
+        n = len(y)
+        a_out, b_out, e_out, s_out = (np.empty(n) for _ in range(4))
+        if n == 0:
+            return KalmanPass(a_out, b_out, e_out, s_out)
+        if self.count == 0:
+            self._y0, self._x0 = (float(y[0]) or 1.0), (float(x[0]) or 1.0)
+        step = self._step
+        for i, (yi, xi) in enumerate(zip((y / self._y0).tolist(), (x / self._x0).tolist())):
+            e_out[i], s_out[i] = step(yi, xi)
+            a_out[i], b_out[i] = self._a, self._b
+        self.count += n
+        return KalmanPass(a_out * self._y0, b_out * (self._y0 / self._x0), e_out, s_out)
+
+    def warm_up(self, y: np.ndarray, x: np.ndarray) -> SpreadUpdate:
+        """Resets the state and filters stored history (oldest first)."""
+        self.reset()
+        result = self.run(y, x)
+        if not len(result.beta):
+            return SpreadUpdate(math.nan, math.nan, math.nan)
+        beta = float(result.beta[-1])
+        zscore = float(result.innovation[-1] / math.sqrt(result.innovation_var[-1])) \
+            if self.count >= self.window else math.nan
+        return SpreadUpdate(beta, float(y[-1]) - beta * float(x[-1]), zscore)
+
+
+def kalman_filter(y: np.ndarray, x: np.ndarray, window: int = 1, delta: float = KALMAN_DELTA,
+                  obs_var: float = KALMAN_OBS_VAR) -> Tuple[np.ndarray, np.ndarray]:
+    """(filtered beta, innovation z-score) for every bar; z-scores before bar `window` are NaN."""
+    result = KalmanHedgeRatio(window, delta, obs_var).run(y, x)
+    zscore = result.innovation / np.sqrt(result.innovation_var)
+    zscore[:max(int(window), 1) - 1] = np.nan
+    return result.beta, zscore
@@ -0,0 +1,90 @@
+import logging
+import os
+import sys
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+# Each distinct message (logger + format string) is emitted at most once per
+# interval; the next emitted record carries the number suppressed meanwhile.
+LOG_INTERVAL_S = float(os.environ.get('QUANT_LOG_INTERVAL_S', 10.0))
+LOG_LEVEL = os.environ.get('QUANT_LOG_LEVEL', 'INFO')
+
+# Attributes every LogRecord has; anything else was passed through `extra=`.
+_RESERVED = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'suppressed'}
+
+_HANDLER: Optional[logging.Handler] = None
+
+
+class RateLimitFilter(logging.Filter):
+    """Lets through one record per (logger, message template) every `interval` seconds."""
+
+    def __init__(self, interval: float = LOG_INTERVAL_S):
+        super().__init__()
+        self.interval = interval
+        self._lock = threading.Lock()
+        # (logger, template) -> [next allowed monotonic time, suppressed count]
+        self._state: Dict[Tuple[str, str], list] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.interval <= 0:
+            return True
+        key = (record.name, str(record.msg))
+        now = time.monotonic()
+        with self._lock:
+            state = self._state.get(key)
+            if state is not None and now < state[0]:
+                state[1] += 1
+                return False
+            record.suppressed = state[1] if state is not None else 0
+            self._state[key] = [now + self.interval, 0]
+        return True
+
+
+class KeyValueFormatter(logging.Formatter):
+    """`ts=... level=... logger=... msg="..." key=value ...` lines, including `extra=` fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        fields = [
+            f"ts={self.formatTime(record, '%Y-%m-%dT%H:%M:%S')}.{int(record.msecs):03d}",
+            f"level={record.levelname}",
+            f"logger={record.name}",
+            f"msg={_quote(record.getMessage())}",
+        ]
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED:
+                fields.append(f"{key}={_quote(value)}")
+        if getattr(record, 'suppressed', 0):
+            fields.append(f"suppressed={record.suppressed}")
+        if record.exc_info:
+            fields.append(f"exc={_quote(self.formatException(record.exc_info))}")
+        return ' '.join(fields)
+
+
+def _quote(value) -> str:
+    text = str(value)
+    if text and not any(c in text for c in ' "=\n'):
+        return text
+    return '"' + text.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+
+
+def configure_logging(level: Optional[str] = None, interval: Optional[float] = None):
+    """Installs the key=value, rate-limited handler on the root logger (once).
+
+    Later calls only adjust the level / interval when they are given.
+    """
+    global _HANDLER
+    root = logging.getLogger()
+    if _HANDLER is None:
+        _HANDLER = logging.StreamHandler(sys.stderr)
+        _HANDLER.setFormatter(KeyValueFormatter())
+        _HANDLER.addFilter(RateLimitFilter(LOG_INTERVAL_S if interval is None else interval))
+        root.addHandler(_HANDLER)
+        root.setLevel(level or LOG_LEVEL)
+        return
+    if level is not None:
+        root.setLevel(level)
+    if interval is not None:
+        for f in _HANDLER.filters:
+            if isinstance(f, RateLimitFilter):
+                f.interval = interval
@@ -1,26 +1,143 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
 import uvicorn
 import pandas as pd
+import asyncio
+import logging
 import threading
+import time
 from contextlib import asynccontextmanager
 import numpy as np 
-from analytics import compute_spread_zscore, run_adf_test, compute_ols_beta 
-from data_handler import get_ohlcv_data
-from websocket_client import start_ws_client
+from alert_engine import AlertEngine, validate_rule
+from analytics_cache import ANALYTICS_CACHE_SIZE, AnalyticsCache
+from analytics import parse_beta_mode
+from alignment import align_pair, alignment_stats, max_stale_ms
+from backtest import (BACKTEST_MAX_PENDING, BACKTEST_TIMEOUT_S, BACKTEST_WORKERS, BacktestJobs, rank_results,
+                      sweep, validate_grid)
+from bar_aggregator import timeframe_to_ms
+from decimate import lttb_rows
+from compute_pool import ComputeOverloaded, ComputePool, adf_task, spread_zscore_task
+from data_handler import (BAR_CACHE, add_bar_listener, delete_alert_rule, get_ohlcv_data, get_live_bar, get_writer,
+                          init_db, last_bar_timestamp, list_symbols, load_alert_rules, load_closes, ohlcv_frame, ohlcv_zoom,
+                          query_gaps, query_ohlcv, query_ohlcv_decimated,
+                          get_tick_store, save_alert_rule, start_retention, stop_retention, stop_tick_store,
+                          stop_writer, storage_stats)
+from logging_setup import configure_logging
+from metrics import CONTENT_TYPE, REGISTRY
+from response_formats import MEDIA_TYPES, RECORDS, encode, frame_columns, negotiate_format
+from pair_scanner import align_closes, rank_pairs, scan_universe
+from rollups import BASE_TIMEFRAME, validate_timeframe
+from scheduler import SCHEDULED_PAIRS, AnalyticsScheduler, pair_id, parse_pair, parse_pairs
+from stream_hub import StreamHub, alert_topic
+from websocket_client import get_pipeline, get_supervisor, start_ws_client, stop_pipeline
 
+configure_logging()
+logger = logging.getLogger(__name__)
 
-ALERT_LOG = []
-LIVE_ANALYTICS = {} 
+# Spread / z-score frames and ADF results shared by every client watching a pair,
+# keyed by (kind, pair, timeframe, window, beta_mode, last bar of each leg) and
+# dropped as soon as either leg gets a new bar.
+ANALYTICS_CACHE = AnalyticsCache(ANALYTICS_CACHE_SIZE)
+
+# Worker processes for the z-score and ADF math, so it never holds the GIL
+# the ingestion threads and the event loop need.
+COMPUTE_POOL = ComputePool()
+# Separate workers for backtest sweeps, which run for up to BACKTEST_TIMEOUT_S.
+BACKTEST_POOL = ComputePool(BACKTEST_WORKERS, BACKTEST_MAX_PENDING, BACKTEST_TIMEOUT_S)
+# Sweeps outlast any HTTP request: POST /api/v1/backtest starts a job here and
+# GET /api/v1/backtest/{job_id} serves its result.
+BACKTEST_JOBS = BacktestJobs(BACKTEST_MAX_PENDING, timeout=BACKTEST_TIMEOUT_S)
+# Bars per leg used by the pair analytics endpoints when no range is given.
+ANALYTICS_BARS = 500
+# Largest `max_points` budget accepted by the chart endpoints.
+MAX_CHART_POINTS = 20_000
+
+# Recomputes every registered pair on each closed bar, in shards on COMPUTE_POOL,
+# and publishes the latest values for /api/v1/analytics/snapshot.
+SCHEDULER = AnalyticsScheduler(COMPUTE_POOL, load_closes, ANALYTICS_BARS)
+
+# Pushes committed bars, pair analytics and alert transitions to /api/v1/stream clients.
+HUB = StreamHub()
+STREAM_KEEPALIVE_S = 15.0
+
+# Alert rules are evaluated on each closed bar: symbol rules from the writer's
+# committed bars, pair rules from the hub's pair feeds. Transitions go to the
+# bounded ALERT_LOG and are pushed to stream clients as `alert` events.
+ALERT_ENGINE = AlertEngine(on_alert=lambda alert: HUB.publish_threadsafe(alert_topic(alert['pair']), 'alert', alert))
+ALERT_LOG = ALERT_ENGINE.log
+
+# Scrape-time views of the counters the components already keep; the hot
+# paths push into the instruments defined in metrics.py.
+REGISTRY.collected('quant_bar_cache_lookups_total', "Bar cache reads by result.", 'counter',
+                   lambda: [({'result': k}, BAR_CACHE.stats()[k]) for k in ('hits', 'misses')])
+REGISTRY.collected('quant_analytics_cache_lookups_total',
+                   "Analytics cache lookups by result (shared: waited on an in-flight computation).", 'counter',
+                   lambda: [({'result': k}, ANALYTICS_CACHE.stats()[k]) for k in ('hits', 'misses', 'shared')])
+REGISTRY.collected('quant_analytics_cache_removals_total', "Analytics cache entries removed, by cause.", 'counter',
+                   lambda: [({'cause': 'eviction'}, ANALYTICS_CACHE.evictions),
+                            ({'cause': 'invalidation'}, ANALYTICS_CACHE.invalidations)])
+REGISTRY.collected('quant_analytics_cache_entries', "Analytics results currently cached.", 'gauge',
+                   lambda: [({}, ANALYTICS_CACHE.stats()['entries'])])
+REGISTRY.collected('quant_ingest_queue_depth', "Ingestion pipeline queue depths.", 'gauge',
+                   lambda: [({'queue': q}, get_pipeline().stats()[f'{q}_queue_depth']) for q in ('frame', 'tick')])
+REGISTRY.collected('quant_writer_queue_depth', "Batches waiting for the bar writer.", 'gauge',
+                   lambda: [({}, get_writer().stats()['queue_depth'])])
+REGISTRY.collected('quant_writer_rows_total', "Bars written or rejected by the bar writer.", 'counter',
+                   lambda: [({'result': 'written'}, get_writer().rows_written),
+                            ({'result': 'rejected'}, get_writer().rows_rejected)])
+REGISTRY.collected('quant_compute_pending', "Analytics tasks queued or running in the compute pool.", 'gauge',
+                   lambda: [({}, COMPUTE_POOL.pending)])
+REGISTRY.collected('quant_stream_subscribers', "Connected /api/v1/stream clients.", 'gauge',
+                   lambda: [({}, HUB.stats()['subscribers'])])
+REGISTRY.collected('quant_alert_rules', "Alert rules being evaluated.", 'gauge',
+                   lambda: [({}, ALERT_ENGINE.stats()['rules'])])
+REGISTRY.collected('quant_scheduled_pairs', "Pairs registered with the analytics scheduler, by freshness.", 'gauge',
+                   lambda: [({'state': 'stale'}, SCHEDULER.stats()['stale']),
+                            ({'state': 'fresh'}, SCHEDULER.stats()['pairs'] - SCHEDULER.stats()['stale'])])
+REGISTRY.collected('quant_scheduler_deadline_misses_total',
+                   "Scheduled pair computations not finished within the scheduler deadline.", 'counter',
+                   lambda: [({}, SCHEDULER.deadline_misses)])
+
+
+async def _acquire_rule_feed(rule):
+    """Keeps the pair feed of a pair-metric rule running while the rule exists."""
+    key = rule.feed_key
+    if key is not None:
+        symbol_y, symbol_x, timeframe, window, beta_mode = key
+        await HUB.acquire_feed(symbol_y, symbol_x, timeframe, window, beta_mode, load_closes,
+                               final_on_next=timeframe != BASE_TIMEFRAME)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    
+    # Creates the schema, migrating and partitioning an older database first.
+    init_db()
+    HUB.bind(asyncio.get_running_loop())
+    HUB.on_analytics = lambda feed, payload: ALERT_ENGINE.on_analytics(feed.key, payload)
+    add_bar_listener(HUB.on_bars_committed)
+    add_bar_listener(ANALYTICS_CACHE.on_bars)
+    add_bar_listener(ALERT_ENGINE.on_bars)
+    add_bar_listener(SCHEDULER.on_bars)
+    for rule_id, fields in load_alert_rules():
+        await _acquire_rule_feed(ALERT_ENGINE.add(rule_id, fields))
+    COMPUTE_POOL.warm_up()
+    for key in parse_pairs(SCHEDULED_PAIRS):
+        SCHEDULER.register(key)
+    SCHEDULER.start(asyncio.get_running_loop())
     threading.Thread(target=start_ws_client, daemon=True).start()
-    print("WebSocket Ingestion started in background.")
+    logger.info("WebSocket ingestion started in background")
+    start_retention()
     yield
+    await SCHEDULER.stop()
+    await BACKTEST_JOBS.stop()
+    COMPUTE_POOL.shutdown()
+    BACKTEST_POOL.shutdown()
+    stop_retention()
+    stop_pipeline()
+    stop_tick_store()
+    stop_writer()
 
 
 app = FastAPI(title="Quant Analytics Backend", lifespan=lifespan)
@@ -31,46 +148,260 @@ class PairParams(BaseModel):
     symbol_x: str
     timeframe: str
     window: int
+    # 'static', 'expanding', 'rolling(n)', 'ewm(halflife)' or 'kalman(delta,obs_var)';
+    # see analytics.compute_hedge_ratios.
+    beta_mode: str = 'static'
+    # Epoch-ms range of bars to use instead of the latest ANALYTICS_BARS.
+    start: Optional[int] = None
+    end: Optional[int] = None
+    # /analytics/zscore only: LTTB-decimate the rows to about this many points.
+    max_points: Optional[int] = None
+
+class ScheduledPair(BaseModel):
+    symbol_y: str
+    symbol_x: str
+    timeframe: str = BASE_TIMEFRAME
+    window: int = 20
+    beta_mode: str = 'static'
+
+class ScanParams(BaseModel):
+    # Defaults to every stored symbol.
+    symbols: Optional[List[str]] = None
+    timeframe: str = '1m'
+    bars: int = 1000
+    top: int = 50
+    # Fixed cap on ADF augmentation lags; None uses the engine default.
+    max_lags: Optional[int] = None
+
+class BacktestParams(BaseModel):
+    symbol_y: str
+    symbol_x: str
+    timeframe: str = BASE_TIMEFRAME
+    # Epoch-ms range; `bars` keeps the latest bars of it (None: the whole range).
+    start: Optional[int] = None
+    end: Optional[int] = None
+    bars: Optional[int] = 86_400
+    windows: List[int] = [20, 50, 100]
+    # |z| that opens a position and the level it is closed at; see backtest.backtest_grid.
+    entries: List[float] = [1.5, 2.0, 2.5]
+    exits: List[float] = [0.0, 0.5]
+    beta_modes: List[str] = ['static']
+    fee_bps: float = 0.0
+    top: int = 20
+    rank_by: str = 'sharpe'
+
+# Largest windows x entries x exits x beta_modes grid accepted per request.
+BACKTEST_MAX_COMBOS = 100_000
 
 class AlertRule(BaseModel):
     symbol: str
     metric: str 
     operator: str 
     value: float
+    # Second leg for pair metrics (zscore, abs_zscore, spread, beta); see alert_engine.
+    symbol_x: Optional[str] = None
+    timeframe: str = BASE_TIMEFRAME
+    window: int = 20
+    beta_mode: str = 'static'
+    # Re-arm only once the value is back past the threshold by this much.
+    hysteresis: float = 0.0
+    # Minimum bar time between two triggers of the same rule.
+    cooldown_s: float = 0.0
+
+
+def _fetch_bars(symbol: str, timeframe: str) -> pd.DataFrame:
+    """Loads bars for a request, turning an unknown timeframe into a 400."""
+    try:
+        return get_ohlcv_data(symbol, timeframe=timeframe)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def _pool_error(e: Exception, pool: ComputePool = COMPUTE_POOL) -> HTTPException:
+    """503 when `pool` is full, 504 when a request outwaited its timeout."""
+    if isinstance(e, ComputeOverloaded):
+        return HTTPException(status_code=503, detail=str(e))
+    return HTTPException(status_code=504, detail=f"Analytics did not finish within {pool.timeout:g}s")
+
+
+async def _cached_pair_result(kind: str, params: PairParams, compute, *extra):
+    """(result, cached) of `await compute()` for the pair's latest bars, shared through ANALYTICS_CACHE.
+
+    `extra` values are added to the cache key next to the pair, range and
+    parameters.
+
+    Unknown timeframes and bad parameters become a 400, a full compute pool
+    a 503 and a computation running past COMPUTE_POOL.timeout a 504.
+    """
+    timeframe = params.timeframe
+    try:
+        last_y, last_x = await asyncio.to_thread(
+            lambda: (last_bar_timestamp(params.symbol_y, timeframe), last_bar_timestamp(params.symbol_x, timeframe)))
+        key = (kind, params.symbol_y, params.symbol_x, timeframe, params.window, params.beta_mode,
+               params.start, params.end, last_y, last_x) + extra
+        return await ANALYTICS_CACHE.get_or_compute_async(
+            key, ((params.symbol_y, timeframe), (params.symbol_x, timeframe)), compute)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except (ComputeOverloaded, asyncio.TimeoutError) as e:
+        raise _pool_error(e)
 
 
+async def _spread_zscore(params: PairParams):
+    """(Spread / ZScore / Beta frame, cached) for the pair; empty if either leg has no bars.
+
+    The legs are as-of joined (alignment.align_pair); the join's counts are
+    in the frame's `attrs['alignment']`. The latest bars of a pair registered
+    with the scheduler are read from its last published computation (its
+    snapshot row is in `attrs['snapshot']`) instead of being computed here.
+    """
+    ranged = params.start is not None or params.end is not None
+    limit = None if ranged else ANALYTICS_BARS
+    if not ranged:
+        published = SCHEDULER.series((params.symbol_y.upper(), params.symbol_x.upper(), params.timeframe,
+                                      params.window, params.beta_mode))
+        if published is not None:
+            columns, row = published
+            index = pd.DatetimeIndex(columns['timestamp'].astype('datetime64[ms]'), name='timestamp')
+            frame = pd.DataFrame({name: columns[name] for name in ('Spread', 'ZScore', 'Beta')}, index=index)
+            frame.attrs['alignment'] = row['alignment']
+            frame.attrs['snapshot'] = row
+            return frame, True
+
+    async def compute():
+        (ts_y, y), (ts_x, x) = await asyncio.to_thread(
+            lambda: (load_closes(params.symbol_y, params.timeframe, limit, params.start, params.end),
+                     load_closes(params.symbol_x, params.timeframe, limit, params.start, params.end)))
+        if not len(y) or not len(x):
+            return pd.DataFrame()
+        columns = await COMPUTE_POOL.run(spread_zscore_task, {'ts_y': ts_y, 'y': y, 'ts_x': ts_x, 'x': x},
+                                         params.window, params.beta_mode, max_stale_ms(timeframe_to_ms(params.timeframe)))
+        alignment = columns.pop('alignment')
+        index = pd.DatetimeIndex(columns.pop('timestamp').astype('datetime64[ms]'), name='timestamp')
+        frame = pd.DataFrame(columns, index=index)
+        frame.attrs['alignment'] = alignment
+        return frame
+    return await _cached_pair_result('zscore', params, compute)
+
+
+def _response_format(request: Request, requested: Optional[str]) -> str:
+    """Negotiates records / columnar JSON / Arrow from `?format=` or the Accept header."""
+    try:
+        return negotiate_format(request.headers.get('accept'), requested)
+    except ValueError as e:
+        raise HTTPException(status_code=406, detail=str(e))
+
+
+def _alignment_headers(alignment: Optional[dict]) -> dict:
+    """X-Align-* headers reporting how the pair's legs were joined."""
+    if not alignment:
+        return {}
+    return {f"X-Align-{name.replace('_', '-').title()}": str(value) for name, value in alignment.items()}
+
+
+def _encoded_response(fmt: str, columns) -> Response:
+    return Response(content=encode(fmt, columns), media_type=MEDIA_TYPES[fmt])
+
+
+def _check_range(start: Optional[int], end: Optional[int], max_points: Optional[int]):
+    if start is not None and end is not None and end <= start:
+        raise HTTPException(status_code=400, detail="end must be after start")
+    if max_points is not None and not 3 <= max_points <= MAX_CHART_POINTS:
+        raise HTTPException(status_code=400, detail=f"max_points must be between 3 and {MAX_CHART_POINTS}")
+
+
+def _ohlc_range(symbol: str, timeframe: str, start: Optional[int], end: Optional[int],
+                max_points: Optional[int]):
+    """Bars in [start, end) as arrays, merged into at most about `max_points` candles when given.
+
+    Decimated candles are cached per zoom level: the key is the bucket
+    width and the range widened to that grid, and it is dropped when the
+    timeframe it is read from gets a bar.
+    """
+    _check_range(start, end, max_points)
+    try:
+        zoom = ohlcv_zoom(symbol, start, end, max_points, timeframe) if max_points is not None else None
+        if zoom is None:
+            return query_ohlcv(symbol, start=start, end=end, timeframe=timeframe, as_frame=False)
+        lo, hi, bucket_ms, source = zoom
+        columns, _ = ANALYTICS_CACHE.get_or_compute(
+            ('ohlc', symbol, timeframe, lo, hi, bucket_ms), ((symbol, source),),
+            lambda: query_ohlcv_decimated(symbol, lo, hi, bucket_ms, source))
+        return columns
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 
 @app.get("/api/v1/ohlc/{symbol}")
-def get_ohlc(symbol: str):
-    """API to get resampled OHLC data for plotting."""
-    df = get_ohlcv_data(symbol.upper()) 
+def get_ohlc(request: Request, symbol: str, timeframe: str = BASE_TIMEFRAME, include_partial: bool = False,
+             start: Optional[int] = None, end: Optional[int] = None, max_points: Optional[int] = None,
+             fmt: Optional[str] = Query(None, alias='format')):
+    """API to get resampled OHLC data for plotting, optionally with the still-open bar.
+
+    By default the latest 500 bars are returned. `start` / `end` (epoch ms)
+    select a range instead, and `max_points` bounds the payload for any
+    span: bars are merged into OHLC candles (first open, highest high,
+    lowest low, last close, summed volume) at the zoom level that fits.
+    Columnar and Arrow responses are built straight from the cached NumPy
+    arrays, with int64 epoch-ms timestamps.
+    """
+    fmt = _response_format(request, fmt)
+    symbol = symbol.upper()
+    ranged = start is not None or end is not None or max_points is not None
+    # Coarser timeframes already include the in-progress bucket via the rollups.
+    want_live = include_partial and timeframe == BASE_TIMEFRAME and end is None and max_points is None
+    if fmt != RECORDS:
+        if ranged:
+            columns = _ohlc_range(symbol, timeframe, start, end, max_points)
+        else:
+            try:
+                columns = query_ohlcv(symbol, limit=500, timeframe=timeframe, as_frame=False)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+        live_bar = get_live_bar(symbol, epoch_ms=True) if want_live else None
+        if live_bar:
+            columns = {name: np.append(values, live_bar[name]) for name, values in columns.items()}
+        return _encoded_response(fmt, columns)
+
+    if ranged:
+        df = ohlcv_frame(_ohlc_range(symbol, timeframe, start, end, max_points), symbol)
+    else:
+        df = _fetch_bars(symbol, timeframe)
+    live_bar = get_live_bar(symbol) if want_live else None
     
     if df.empty:
-        return []
+        return [live_bar] if live_bar else []
         
     
-    return df.reset_index().to_dict(orient='records')
+    records = df.reset_index().to_dict(orient='records')
+    if live_bar:
+        records.append(live_bar)
+    return records
 
 @app.post("/api/v1/analytics/zscore")
-def get_analytics(params: PairParams):
-    """API to calculate the Hedge Ratio, Spread, and Z-Score."""
-    
-    # 1. Fetch data
-    df_y_ohlc = get_ohlcv_data(params.symbol_y)
-    df_x_ohlc = get_ohlcv_data(params.symbol_x)
+async def get_analytics(params: PairParams, request: Request, response: Response,
+                        fmt: Optional[str] = Query(None, alias='format')):
+    """API to calculate the Hedge Ratio, Spread, and Z-Score (records, columnar JSON or Arrow).
 
-    if df_y_ohlc.empty or df_x_ohlc.empty:
-        return []
-
-    
-    y = df_y_ohlc['close']
-    x = df_x_ohlc['close']
-    
-    
-    analytics_df = compute_spread_zscore(y, x, params.window)
+    `start` / `end` compute over a range of bars instead of the latest ones;
+    `max_points` keeps about that many rows, chosen by LTTB on the spread
+    and the z-score so both lines keep their shape. The X-Align-Rows,
+    X-Align-Imputed-Y / -X and X-Align-Dropped headers report the legs'
+    as-of join. A pair registered with the scheduler is served from its
+    snapshot, with X-Snapshot-Stale set.
+    """
+    fmt = _response_format(request, fmt)
+    _check_range(params.start, params.end, params.max_points)
+    # Identical requests for the same pair and bar share one computation in the compute pool.
+    analytics_df, _ = await _spread_zscore(params)
 
     if analytics_df.empty:
         return []
+    headers = _alignment_headers(analytics_df.attrs.get('alignment'))
+    snapshot = analytics_df.attrs.get('snapshot')
+    if snapshot is not None:
+        headers['X-Snapshot-Stale'] = 'true' if snapshot['stale'] else 'false'
+    response.headers.update(headers)
 
     
     analytics_df = analytics_df.replace([np.inf, -np.inf], np.nan).dropna()
@@ -79,59 +410,314 @@ def get_analytics(params: PairParams):
         return []
 
     
-    pair_key = f'{params.symbol_y}_{params.symbol_x}'
-    LIVE_ANALYTICS[f'ZSCORE_{pair_key}'] = analytics_df['ZScore'].iloc[-1]
-    LIVE_ANALYTICS[f'BETA_{pair_key}'] = analytics_df['Beta'].iloc[-1]
-    
+    if params.max_points is not None and len(analytics_df) > params.max_points:
+        full_df = analytics_df
+
+        async def decimate():
+            rows = await asyncio.to_thread(
+                lttb_rows, full_df.index.to_numpy().astype('datetime64[ms]').astype(np.int64),
+                [full_df['Spread'].to_numpy(), full_df['ZScore'].to_numpy()], params.max_points)
+            return full_df.iloc[rows]
+        # A snapshot can be published after the legs' last bars, so its views are keyed by when.
+        analytics_df, _ = await _cached_pair_result('zscore_view', params, decimate, params.max_points,
+                                                    snapshot and snapshot['updated_at'])
     
+    if fmt != RECORDS:
+        encoded = _encoded_response(fmt, frame_columns(analytics_df))
+        encoded.headers.update(headers)
+        return encoded
     return analytics_df.reset_index().to_dict(orient='records')
 
 @app.post("/api/v1/analytics/adf")
-def run_adf(params: PairParams):
+async def run_adf(params: PairParams):
     """API to run the Augmented Dickey-Fuller test on the spread."""
     try:
-        
-        df_y_ohlc = get_ohlcv_data(params.symbol_y)
-        df_x_ohlc = get_ohlcv_data(params.symbol_x)
-        
-        if df_y_ohlc.empty or df_x_ohlc.empty:
-             return {"status": "Data insufficient for ADF test."} 
-        
-        y = df_y_ohlc['close']
-        x = df_x_ohlc['close']
-        
-        
-        beta = compute_ols_beta(y, x)
-        
-        combined = pd.DataFrame({'Y': y, 'X': x}).dropna()
-        spread = combined['Y'] - beta * combined['X']
+        started = time.perf_counter()
 
-        
-        result = run_adf_test(spread.dropna()) 
+        async def compute():
+            # Reuses the spread cached for /analytics/zscore when a client already asked for it.
+            analytics_df, _ = await _spread_zscore(params)
+            spread = analytics_df['Spread'].dropna() if not analytics_df.empty else analytics_df
+            if spread.empty:
+                return None
+            result = await COMPUTE_POOL.run(adf_task, {'series': spread.to_numpy(dtype=np.float64)})
+            return {**result, 'alignment': analytics_df.attrs.get('alignment')}
+
+        result, cached = await _cached_pair_result('adf', params, compute)
+        if result is None:
+            return {"status": "Data insufficient for ADF test."}
         
         return {
             "status": "ADF Test results available.",
             "test_statistic": result['Test Statistic'],
             "p_value": result['p-value'],
+            "lags_used": result.get('Lags Used'),
+            "nobs": result.get('Number of Observations'),
             "critical_values": result['Critical Values'],
-            "Result": result.get('Result', 'N/A')
+            "Result": result.get('Result', 'N/A'),
+            "alignment": result.get('alignment'),
+            "cached": cached,
+            "compute_ms": round((time.perf_counter() - started) * 1000.0, 3)
         }
+    except HTTPException:
+        # Bad parameters (400) and pool backpressure (503 / 504) keep their status codes.
+        raise
     except Exception as e:
-        print(f"Error running ADF test: {e}")
+        logger.error("ADF test failed", extra={'pair': f"{params.symbol_y}/{params.symbol_x}", 'error': str(e)})
         return {"status": f"ADF Test Failed: {e}"}
 
+@app.get("/api/v1/analytics/snapshot")
+def get_analytics_snapshot(symbol: Optional[str] = None):
+    """Latest Beta / Spread / ZScore of every scheduled pair (optionally those with `symbol` as a leg).
+
+    Served from the scheduler's published snapshot, never computed here.
+    `stale` marks pairs with closed bars not published within the
+    scheduler deadline, or whose last computation failed (`error`).
+    """
+    return SCHEDULER.snapshot(symbol.upper() if symbol else None)
+
+@app.post("/api/v1/analytics/pairs", status_code=201)
+def register_scheduled_pair(pair: ScheduledPair):
+    """Adds a pair to the analytics scheduler; it is computed right away and on every closed bar."""
+    try:
+        key = parse_pair(f"{pair.symbol_y}/{pair.symbol_x}:{pair.timeframe}:{pair.window}:{pair.beta_mode}")
+        created = SCHEDULER.register(key)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {'id': pair_id(key), 'created': created}
+
+@app.delete("/api/v1/analytics/pairs/{scheduled_id:path}", status_code=204)
+def unregister_scheduled_pair(scheduled_id: str):
+    """Removes a scheduled pair by id, e.g. BTCUSDT/ETHUSDT:1m:20:static."""
+    try:
+        key = parse_pair(scheduled_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not SCHEDULER.unregister(key):
+        raise HTTPException(status_code=404, detail="Pair not scheduled")
+
+@app.get("/api/v1/analytics/scheduler/stats")
+def get_scheduler_stats():
+    """Registered, stale, dirty and in-flight pairs, pass counts, failures and deadline misses."""
+    return SCHEDULER.stats()
+
+@app.get("/metrics")
+def get_metrics():
+    """Prometheus text exposition of the ingestion, storage, cache and analytics metrics."""
+    return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
+
+@app.get("/api/v1/analytics/cache/stats")
+def get_analytics_cache_stats():
+    """Entries, hits, misses, requests that shared an in-flight computation, evictions and invalidations."""
+    return ANALYTICS_CACHE.stats()
+
+@app.get("/api/v1/analytics/compute/stats")
+def get_compute_stats():
+    """Worker count, pending tasks, completions, rejections and timeouts of the analytics process pool."""
+    return {**COMPUTE_POOL.stats(), 'backtest': BACKTEST_POOL.stats()}
+
+@app.get("/api/v1/stream")
+async def stream(symbol_y: str, symbol_x: str, timeframe: str = BASE_TIMEFRAME, window: int = 20,
+                 beta_mode: str = 'static'):
+    """Server-Sent Events: `bar` for each committed bar of either leg, `analytics` (Beta, Spread,
+    ZScore) for each closed aligned bar, and `alert` for each transition of an alert rule on the pair
+    or on either leg (see /api/v1/alerts/rules)."""
+    try:
+        validate_timeframe(timeframe)
+        parse_beta_mode(beta_mode)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if window < 1:
+        raise HTTPException(status_code=400, detail="window must be at least 1")
+
+    subscription = await HUB.subscribe_pair(symbol_y.upper(), symbol_x.upper(), timeframe, window, beta_mode,
+                                            load_closes, final_on_next=timeframe != BASE_TIMEFRAME)
+
+    async def events():
+        try:
+            yield "retry: 2000\n\n"
+            while True:
+                try:
+                    yield await asyncio.wait_for(subscription.queue.get(), timeout=STREAM_KEEPALIVE_S)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+        finally:
+            HUB.unsubscribe(subscription)
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.get("/api/v1/stream/stats")
+def get_stream_stats():
+    """Subscriber, feed and message counts of the push hub."""
+    return HUB.stats()
+
+@app.get("/api/v1/ingest/stats")
+def get_ingest_stats():
+    """Connection state and time-to-recover per shard, pipeline queue depths, drops and lag, writer
+    counters and the raw tick log's size."""
+    tick_store = get_tick_store()
+    return {"shards": get_supervisor().stats(), "pipeline": get_pipeline().stats(), "writer": get_writer().stats(),
+            "ticks": tick_store.stats() if tick_store is not None else None}
+
+@app.get("/api/v1/storage/stats")
+def get_storage_stats():
+    """Main file and 1s partition sizes, and what the retention manager has compacted, dropped and vacuumed."""
+    return storage_stats()
+
+@app.get("/api/v1/ingest/gaps")
+def get_ingest_gaps(start: Optional[int] = None, end: Optional[int] = None):
+    """Recorded ingestion gaps overlapping [start, end) in epoch ms."""
+    return query_gaps(start, end)
+
+@app.get("/api/v1/symbols")
+def get_symbols():
+    """Lists every symbol with stored bars."""
+    return list_symbols()
+
+@app.post("/api/v1/scan")
+async def scan(params: ScanParams):
+    """Ranks every pair of the universe by Engle-Granger p-value, with correlation, beta and half-life."""
+    started = time.perf_counter()
+
+    def load():
+        series = {}
+        for symbol in [s.upper() for s in (params.symbols or list_symbols())]:
+            arrays = query_ohlcv(symbol, limit=params.bars, timeframe=params.timeframe, as_frame=False)
+            series[symbol] = (arrays['timestamp'], arrays['close'])
+        return align_closes(series)
+    try:
+        symbols, prices = await asyncio.to_thread(load)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if len(symbols) < 2 or len(prices) < 20:
+        return {"status": "Data insufficient for scan.", "symbols": len(symbols), "bars": len(prices), "pairs": []}
+
+    try:
+        result = await scan_universe(COMPUTE_POOL, symbols, prices, max_lags=params.max_lags)
+    except (ComputeOverloaded, asyncio.TimeoutError) as e:
+        raise _pool_error(e)
+    return {
+        "status": "Scan complete.",
+        "symbols": len(symbols),
+        "bars": len(prices),
+        "pairs_scanned": len(result['p_value']),
+        "compute_ms": round((time.perf_counter() - started) * 1000.0, 3),
+        "pairs": rank_pairs(result, params.top),
+    }
+
+async def _run_backtest(params: BacktestParams) -> dict:
+    started = time.perf_counter()
+    legs = await asyncio.to_thread(
+        lambda: [query_ohlcv(symbol.upper(), start=params.start, end=params.end, limit=params.bars,
+                             timeframe=params.timeframe, as_frame=False)
+                 for symbol in (params.symbol_y, params.symbol_x)])
+    aligned = align_pair(legs[0]['timestamp'], legs[0]['close'], legs[1]['timestamp'], legs[1]['close'],
+                         max_stale_ms(timeframe_to_ms(params.timeframe)))
+    y, x = aligned.y, aligned.x
+    if len(y) < max(params.windows) + 2:
+        return {"status": "Data insufficient for backtest.", "bars": len(y), "results": []}
+    result = await sweep(BACKTEST_POOL, y, x, params.windows, params.entries, params.exits, params.beta_modes,
+                         fee_bps=params.fee_bps, bar_ms=timeframe_to_ms(params.timeframe))
+    return {
+        "status": "Backtest complete.",
+        "bars": len(y),
+        "combinations": len(result['pnl']),
+        "alignment": alignment_stats(aligned),
+        "compute_ms": round((time.perf_counter() - started) * 1000.0, 3),
+        "results": rank_results(result, params.top, params.rank_by),
+    }
+
+@app.post("/api/v1/backtest", status_code=202)
+async def backtest(params: BacktestParams):
+    """Starts a sweep of the z-score pair strategy over a parameter grid on stored bars; returns its job.
+
+    The grid is checked up front (400); the top combinations are served by
+    GET /api/v1/backtest/{job_id} once the job is done.
+    """
+    combos = len(set(params.windows)) * len(set(params.entries)) * len(set(params.exits)) * len(set(params.beta_modes))
+    if not combos:
+        raise HTTPException(status_code=400, detail="windows, entries, exits and beta_modes must not be empty")
+    if combos > BACKTEST_MAX_COMBOS:
+        raise HTTPException(status_code=400, detail=f"{combos} combinations requested; the limit is {BACKTEST_MAX_COMBOS}")
+    try:
+        validate_timeframe(params.timeframe)
+        validate_grid(params.windows, params.beta_modes, params.rank_by)
+        return BACKTEST_JOBS.start(lambda: _run_backtest(params))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ComputeOverloaded as e:
+        raise _pool_error(e, BACKTEST_POOL)
+
+@app.get("/api/v1/backtest/{job_id}")
+def get_backtest(job_id: str):
+    """A backtest job: `state` is 'running', 'done' (with `result`), 'failed' (with `error`) or 'cancelled'."""
+    job = BACKTEST_JOBS.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"No backtest job {job_id}")
+    return job
+
+def _validated_rule(rule: AlertRule) -> dict:
+    try:
+        return validate_rule(rule.model_dump())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/api/v1/alerts/rules")
+def list_alert_rules():
+    """Every alert rule with its current state ('armed', 'triggered' or 'suppressed')."""
+    return [rule.to_dict() for rule in ALERT_ENGINE.rules()]
+
+@app.post("/api/v1/alerts/rules", status_code=201)
+async def create_alert_rule(rule: AlertRule):
+    fields = _validated_rule(rule)
+    rule_id = await asyncio.to_thread(save_alert_rule, fields)
+    created = ALERT_ENGINE.add(rule_id, fields)
+    await _acquire_rule_feed(created)
+    return created.to_dict()
+
+@app.get("/api/v1/alerts/rules/{rule_id}")
+def get_alert_rule(rule_id: int):
+    rule = ALERT_ENGINE.get(rule_id)
+    if rule is None:
+        raise HTTPException(status_code=404, detail=f"No alert rule {rule_id}")
+    return rule.to_dict()
+
+@app.put("/api/v1/alerts/rules/{rule_id}")
+async def update_alert_rule(rule_id: int, rule: AlertRule):
+    """Replaces a rule's definition; its trigger state starts over."""
+    fields = _validated_rule(rule)
+    if await asyncio.to_thread(save_alert_rule, fields, rule_id) is None:
+        raise HTTPException(status_code=404, detail=f"No alert rule {rule_id}")
+    previous = ALERT_ENGINE.get(rule_id)
+    updated = ALERT_ENGINE.add(rule_id, fields)
+    await _acquire_rule_feed(updated)
+    if previous is not None and previous.feed_key is not None:
+        HUB.release_feed(previous.feed_key)
+    return updated.to_dict()
+
+@app.delete("/api/v1/alerts/rules/{rule_id}", status_code=204)
+async def remove_alert_rule(rule_id: int):
+    if not await asyncio.to_thread(delete_alert_rule, rule_id):
+        raise HTTPException(status_code=404, detail=f"No alert rule {rule_id}")
+    removed = ALERT_ENGINE.remove(rule_id)
+    if removed is not None and removed.feed_key is not None:
+        HUB.release_feed(removed.feed_key)
+
+@app.get("/api/v1/alerts/log")
+def get_alert_log(limit: int = 100, since: Optional[int] = None):
+    """Latest alert transitions (oldest first), optionally only those after bar time `since` (epoch ms)."""
+    return ALERT_ENGINE.recent(limit, since)
+
+@app.get("/api/v1/alerts/stats")
+def get_alert_stats():
+    return ALERT_ENGINE.stats()
+
 @app.get("/api/v1/alerts/live")
 def get_live_alerts():
-    """Returns the current log of triggered alerts."""
-    current_alerts = []
-    
-    for key, z_score in LIVE_ANALYTICS.items():
-        if key.startswith('ZSCORE') and abs(z_score) > 2.0:
-             
-             pair = key.split('_')[1:] 
-             current_alerts.append(f"ALERT: Z-Score for {'_'.join(pair)} is at {z_score:.2f}")
-    
-    return current_alerts
+    """Returns the messages of the alert rules currently triggered."""
+    return ALERT_ENGINE.active_messages()
 
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -0,0 +1,168 @@
+import argparse
+import logging
+import os
+import sqlite3
+import time
+from typing import Optional
+
+from logging_setup import configure_logging
+from partitions import DAY_MS, Partitions, partition_day
+from rollups import CREATE_ROLLUP_TABLE_SQL, rebuild_rollups
+from schema import (CREATE_OHLCV_TABLE_SQL, CREATE_SYMBOLS_TABLE_SQL, SCHEMA_VERSION,
+                    get_schema_version, is_legacy_schema, set_schema_version)
+
+# ISO-8601 text -> epoch milliseconds, evaluated inside SQLite so rows never
+# round-trip through Python.
+LEGACY_TS_TO_MS_SQL = "CAST(ROUND((julianday(o.timestamp) - 2440587.5) * 86400000.0) AS INTEGER)"
+
+_PROGRESS_KEY = 'v2_last_rowid'
+# Version produced by `migrate`; `partition_bars` takes it to SCHEMA_VERSION.
+UNPARTITIONED_VERSION = 2
+
+logger = logging.getLogger(__name__)
+
+
+def migrate(db_path: str, chunk_rows: int = 200_000, vacuum: bool = False) -> int:
+    """Converts a version 1 database to the version 2 schema in place.
+
+    Rows are copied in rowid-ordered chunks, each in its own transaction, so
+    memory use stays flat on multi-GB files and an interrupted run resumes
+    where it stopped. Returns the number of rows copied.
+    """
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    try:
+        if not is_legacy_schema(conn):
+            if get_schema_version(conn) < UNPARTITIONED_VERSION:
+                set_schema_version(conn, UNPARTITIONED_VERSION)
+            logger.info("Already past schema version 1", extra={'path': db_path})
+            return 0
+
+        started = time.time()
+        conn.execute(CREATE_SYMBOLS_TABLE_SQL)
+        conn.execute(CREATE_OHLCV_TABLE_SQL.format(table='ohlcv_data_v2'))
+        conn.execute("CREATE TABLE IF NOT EXISTS schema_migration (key TEXT PRIMARY KEY, value INTEGER)")
+        conn.execute("INSERT OR IGNORE INTO symbols (name) SELECT DISTINCT symbol FROM ohlcv_data")
+
+        row = conn.execute("SELECT value FROM schema_migration WHERE key = ?", (_PROGRESS_KEY,)).fetchone()
+        last_rowid = row[0] if row else 0
+        max_rowid = conn.execute("SELECT COALESCE(MAX(rowid), 0) FROM ohlcv_data").fetchone()[0]
+        copied = 0
+
+        while last_rowid < max_rowid:
+            upper = last_rowid + chunk_rows
+            conn.execute("BEGIN")
+            cursor = conn.execute(f"""
+                INSERT OR REPLACE INTO ohlcv_data_v2
+                    (symbol_id, timestamp, open, high, low, close, volume)
+                SELECT s.id, {LEGACY_TS_TO_MS_SQL}, o.open, o.high, o.low, o.close, o.volume
+                FROM ohlcv_data o JOIN symbols s ON s.name = o.symbol
+                WHERE o.rowid > ? AND o.rowid <= ? AND julianday(o.timestamp) IS NOT NULL
+            """, (last_rowid, upper))
+            conn.execute(
+                "INSERT OR REPLACE INTO schema_migration (key, value) VALUES (?, ?)",
+                (_PROGRESS_KEY, upper),
+            )
+            conn.execute("COMMIT")
+            copied += cursor.rowcount
+            last_rowid = upper
+            logger.info("Migrated chunk", extra={'rowid': min(upper, max_rowid), 'max_rowid': max_rowid})
+
+        conn.execute("BEGIN")
+        conn.execute("DROP TABLE ohlcv_data")
+        conn.execute("ALTER TABLE ohlcv_data_v2 RENAME TO ohlcv_data")
+        conn.execute("DROP TABLE IF EXISTS ohlcv_rollup")
+        conn.execute(CREATE_ROLLUP_TABLE_SQL)
+        rebuild_rollups(conn)
+        conn.execute("DROP TABLE schema_migration")
+        set_schema_version(conn, UNPARTITIONED_VERSION)
+        conn.execute("COMMIT")
+
+        if vacuum:
+            conn.execute("VACUUM")
+        logger.info("Migration finished", extra={'rows': copied, 'schema_version': UNPARTITIONED_VERSION,
+                                                 'seconds': round(time.time() - started, 1)})
+        return copied
+    finally:
+        conn.close()
+
+
+def _next_bar_day(conn: sqlite3.Connection, from_ts: int) -> Optional[int]:
+    """Partition day of the earliest main-table bar at or after `from_ts` (one index seek per symbol)."""
+    row = conn.execute(
+        "SELECT MIN((SELECT MIN(timestamp) FROM main.ohlcv_data WHERE symbol_id = s.id AND timestamp >= ?)) "
+        "FROM symbols s", (from_ts,)).fetchone()
+    return None if row[0] is None else partition_day(row[0])
+
+
+def partition_bars(db_path: str, partition_dir: str, vacuum: bool = True) -> int:
+    """Moves the version 2 main `ohlcv_data` table into per-day partition files (version 3).
+
+    Each day is copied, one index range per symbol, in its own transaction.
+    Copies are idempotent and the main table is only dropped at the end,
+    so an interrupted run simply starts over. Afterwards the main file is
+    switched to incremental auto-vacuum, which takes one VACUUM of what is
+    left (symbols, rollups, gaps and rules). Returns the rows copied.
+    """
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    try:
+        has_table = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'ohlcv_data'").fetchone()
+        if not has_table:
+            if get_schema_version(conn) < SCHEMA_VERSION:
+                set_schema_version(conn, SCHEMA_VERSION)
+            return 0
+
+        started = time.time()
+        parts = Partitions(conn, partition_dir)
+        symbol_ids = [row[0] for row in conn.execute("SELECT id FROM symbols ORDER BY id")]
+        copied = 0
+        day = _next_bar_day(conn, -2 ** 62)
+        while day is not None:
+            table = parts.table(day, create=True)
+            conn.execute("BEGIN")
+            for symbol_id in symbol_ids:
+                copied += conn.execute(
+                    f"INSERT OR REPLACE INTO {table} (symbol_id, timestamp, open, high, low, close, volume) "
+                    "SELECT symbol_id, timestamp, open, high, low, close, volume FROM main.ohlcv_data "
+                    "WHERE symbol_id = ? AND timestamp >= ? AND timestamp < ?",
+                    (symbol_id, day * DAY_MS, (day + 1) * DAY_MS)).rowcount
+            conn.execute("COMMIT")
+            logger.info("Partitioned day", extra={'partition': table.split('.')[0], 'rows': copied})
+            day = _next_bar_day(conn, (day + 1) * DAY_MS)
+        parts.detach_all()
+
+        conn.execute("BEGIN")
+        conn.execute("DROP TABLE ohlcv_data")
+        set_schema_version(conn, SCHEMA_VERSION)
+        conn.execute("COMMIT")
+        if vacuum:
+            # auto_vacuum only changes on an empty file or through a VACUUM.
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("VACUUM")
+        logger.info("Partitioning finished", extra={'rows': copied, 'schema_version': SCHEMA_VERSION,
+                                                    'seconds': round(time.time() - started, 1)})
+        return copied
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migrate db.sqlite to the partitioned integer-epoch OHLCV schema.")
+    parser.add_argument('--db', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'db.sqlite'),
+                        help="Database file to migrate (defaults to the app database).")
+    parser.add_argument('--partition-dir', default=None,
+                        help="Directory for the per-day 1s partitions (default: partitions/ next to the database).")
+    parser.add_argument('--chunk-rows', type=int, default=200_000, help="Rows copied per transaction.")
+    parser.add_argument('--vacuum', action='store_true', help="VACUUM afterwards to reclaim the old table's pages.")
+    args = parser.parse_args()
+    # Chunk progress comes every few seconds; keep all of it.
+    configure_logging(interval=0)
+    partition_dir = args.partition_dir or os.path.join(os.path.dirname(os.path.abspath(args.db)), 'partitions')
+    migrate(args.db, chunk_rows=args.chunk_rows, vacuum=args.vacuum)
+    partition_bars(args.db, partition_dir)
+
+    # The remaining tables (rollups, gaps, alert rules), as the server would create them.
+    from data_handler import init_db
+    init_db(args.db, partition_dir)
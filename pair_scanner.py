@@ -0,0 +1,121 @@
+import math
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from adf_engine import engle_granger_batch
+from compute_pool import ComputePool
+
+# Pairs per task. Bounds worker memory (the ADF design matrix is roughly
+# pairs x bars x lags doubles) while keeping enough tasks to balance the pool.
+SCAN_CHUNK_PAIRS = 64
+# Symbols with fewer valid bars than this fraction of the window are skipped
+# rather than truncating the common sample for everyone else.
+MIN_COVERAGE = 0.9
+
+SCAN_FIELDS = ('correlation', 'beta', 'half_life', 'adf_stat', 'p_value')
+
+
+def align_closes(series: Dict[str, Tuple[np.ndarray, np.ndarray]],
+                 min_coverage: float = MIN_COVERAGE) -> Tuple[List[str], np.ndarray]:
+    """Builds a (bars, symbols) close matrix on the union of timestamps.
+
+    Gaps are forward-filled; symbols whose history covers less than
+    `min_coverage` of the window are dropped, and the leading rows are
+    trimmed so every remaining column is fully populated.
+    """
+    series = {s: v for s, v in series.items() if len(v[0])}
+    if not series:
+        return [], np.empty((0, 0))
+    timestamps = np.unique(np.concatenate([ts for ts, _ in series.values()]))
+    symbols = sorted(series)
+    matrix = np.full((len(timestamps), len(symbols)), np.nan)
+    for col, symbol in enumerate(symbols):
+        ts, close = series[symbol]
+        matrix[np.searchsorted(timestamps, ts), col] = close
+
+    # Forward fill along time.
+    valid = ~np.isnan(matrix)
+    idx = np.where(valid, np.arange(len(timestamps))[:, None], 0)
+    np.maximum.accumulate(idx, axis=0, out=idx)
+    matrix = matrix[idx, np.arange(len(symbols))]
+
+    first = np.where(valid.any(axis=0), valid.argmax(axis=0), len(timestamps))
+    keep = (len(timestamps) - first) >= min_coverage * len(timestamps)
+    symbols = [s for s, k in zip(symbols, keep) if k]
+    if not symbols:
+        return [], np.empty((0, 0))
+    start = int(first[keep].max())
+    return symbols, np.ascontiguousarray(matrix[start:, keep])
+
+
+def scan_pairs(prices: np.ndarray, pairs_y: np.ndarray, pairs_x: np.ndarray,
+               max_lags: Optional[int] = None) -> np.ndarray:
+    """Correlation, hedge ratio, half-life, Engle-Granger stat and p-value for column pairs.
+
+    `prices` is (bars, symbols); Y is regressed on X with an intercept.
+    Returns an array of shape (pairs, len(SCAN_FIELDS)).
+    """
+    y = prices[:, pairs_y].T
+    x = prices[:, pairs_x].T
+    dy = y - y.mean(axis=1, keepdims=True)
+    dx = x - x.mean(axis=1, keepdims=True)
+    s_xx = np.einsum('bn,bn->b', dx, dx)
+    s_yy = np.einsum('bn,bn->b', dy, dy)
+    s_xy = np.einsum('bn,bn->b', dx, dy)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        corr = s_xy / np.sqrt(s_xx * s_yy)
+
+        eg = engle_granger_batch(y, x, max_lags=max_lags)
+        resid = dy - eg['beta'][:, None] * dx
+
+        # Half-life from the AR(1) fit d(spread_t) = lambda * spread_{t-1} + c.
+        lagged = resid[:, :-1] - resid[:, :-1].mean(axis=1, keepdims=True)
+        step = np.diff(resid, axis=1)
+        lam = np.einsum('bn,bn->b', lagged, step) / np.einsum('bn,bn->b', lagged, lagged)
+        half_life = np.where(lam < 0, -math.log(2.0) / lam, np.nan)
+
+    return np.column_stack([corr, eg['beta'], half_life, eg['statistic'], eg['pvalue']])
+
+
+def scan_chunk_task(arrays: Dict[str, np.ndarray], pairs_y: np.ndarray, pairs_x: np.ndarray,
+                    max_lags: Optional[int]) -> np.ndarray:
+    """Compute pool task: scans one chunk of pairs of the shared `prices` matrix."""
+    return scan_pairs(arrays['prices'], pairs_y, pairs_x, max_lags)
+
+
+async def scan_universe(pool: ComputePool, symbols: Sequence[str], prices: np.ndarray,
+                        max_lags: Optional[int] = None) -> Dict[str, np.ndarray]:
+    """Scans all N*(N-1)/2 pairs of the columns of `prices` and returns per-pair arrays.
+
+    The chunks are one batch on `pool`: the matrix is copied once into
+    shared memory and each task receives only its pair indices, under the
+    pool's pending-task bound and timeout.
+    """
+    pairs_y, pairs_x = np.triu_indices(len(symbols), k=1)
+    chunks = [(pairs_y[i:i + SCAN_CHUNK_PAIRS], pairs_x[i:i + SCAN_CHUNK_PAIRS], max_lags)
+              for i in range(0, len(pairs_y), SCAN_CHUNK_PAIRS)]
+    prices = np.ascontiguousarray(prices, dtype=np.float64)
+    parts = await pool.run_batch(scan_chunk_task, {'prices': prices}, chunks)
+    metrics = np.vstack(parts) if parts else np.empty((0, len(SCAN_FIELDS)))
+
+    result = {'symbol_y': np.asarray(symbols, dtype=object)[pairs_y],
+              'symbol_x': np.asarray(symbols, dtype=object)[pairs_x]}
+    for i, field in enumerate(SCAN_FIELDS):
+        result[field] = metrics[:, i]
+    return result
+
+
+def rank_pairs(result: Dict[str, np.ndarray], top: Optional[int] = None) -> List[Dict]:
+    """Rows ordered by cointegration p-value, then by absolute correlation (NaNs last)."""
+    p_value = np.nan_to_num(result['p_value'], nan=np.inf)
+    corr = np.nan_to_num(np.abs(result['correlation']), nan=0.0)
+    order = np.lexsort((-corr, p_value))[:top]
+    rows = []
+    for i in order:
+        row = {'symbol_y': result['symbol_y'][i], 'symbol_x': result['symbol_x'][i]}
+        for field in SCAN_FIELDS:
+            value = float(result[field][i])
+            row[field] = value if math.isfinite(value) else None
+        rows.append(row)
+    return rows
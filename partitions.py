@@ -0,0 +1,156 @@
+import os
+import sqlite3
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import List, Optional
+
+from schema import CREATE_OHLCV_TABLE_SQL
+
+DAY_MS = 86_400_000
+PARTITION_PREFIX = 'ohlcv_1s_'
+PARTITION_SUFFIX = '.sqlite'
+# SQLite allows 10 attached databases per connection; leave room for ad-hoc ATTACHes.
+MAX_ATTACHED = 8
+
+
+def partition_day(ts_ms: int) -> int:
+    """UTC day number (days since the epoch) of the partition holding `ts_ms`."""
+    return int(ts_ms) // DAY_MS
+
+
+def day_label(day: int) -> str:
+    return datetime.fromtimestamp(day * 86400, tz=timezone.utc).strftime('%Y%m%d')
+
+
+def partition_table(ts_ms: int) -> str:
+    """Qualified name of the 1s table holding `ts_ms`, valid once its partition is attached."""
+    return f"p{day_label(partition_day(ts_ms))}.ohlcv_data"
+
+
+class Partitions:
+    """The 1s bars, split into one SQLite file per UTC day and attached to `conn` on demand.
+
+    Day `YYYYMMDD` lives in `<directory>/ohlcv_1s_YYYYMMDD.sqlite`, attached
+    as schema `pYYYYMMDD` with a single `ohlcv_data` table of the main
+    schema's layout. Rollup buckets never cross midnight UTC, so every
+    statement touches one partition per bucket. Retiring a day is detaching
+    and unlinking (or moving) its file instead of deleting rows. At most
+    `max_attached` days stay attached; the least recently used one is
+    detached first, which must happen outside a transaction.
+    """
+
+    def __init__(self, conn: sqlite3.Connection, directory: str, readonly: bool = False,
+                 max_attached: int = MAX_ATTACHED):
+        self.conn = conn
+        self.directory = directory
+        self.readonly = readonly
+        self.max_attached = max_attached
+        # day -> inode of the attached file, most recently used last
+        self._attached: "OrderedDict[int, int]" = OrderedDict()
+        if not readonly:
+            os.makedirs(directory, exist_ok=True)
+
+    def path(self, day: int) -> str:
+        return os.path.join(self.directory, f"{PARTITION_PREFIX}{day_label(day)}{PARTITION_SUFFIX}")
+
+    def days(self, start: Optional[int] = None, end: Optional[int] = None) -> List[int]:
+        """Days with a partition file overlapping [start, end) in epoch ms, oldest first."""
+        if not os.path.isdir(self.directory):
+            return []
+        first = partition_day(start) if start is not None else None
+        last = partition_day(end - 1) if end is not None else None
+        days = []
+        for name in os.listdir(self.directory):
+            if not (name.startswith(PARTITION_PREFIX) and name.endswith(PARTITION_SUFFIX)):
+                continue
+            label = name[len(PARTITION_PREFIX):-len(PARTITION_SUFFIX)]
+            try:
+                day = int(datetime.strptime(label, '%Y%m%d').replace(tzinfo=timezone.utc).timestamp()) // 86400
+            except ValueError:
+                continue
+            if (first is None or day >= first) and (last is None or day <= last):
+                days.append(day)
+        return sorted(days)
+
+    def table(self, day: int, create: bool = False) -> Optional[str]:
+        """Attaches day `day` if needed and returns its qualified table name.
+
+        Attaching a day for writing sets per-file pragmas, so it must happen
+        outside a transaction; an attached day can be looked up anywhere.
+        Without `create`, returns None when the day has no partition file.
+        A read-only set re-attaches a day whose file was replaced since
+        (dropped and written again by the writer).
+        """
+        path = self.path(day)
+        try:
+            inode = os.stat(path).st_ino
+        except FileNotFoundError:
+            if not create:
+                if day in self._attached:
+                    self.detach(day)
+                return None
+            inode = None
+        schema = f"p{day_label(day)}"
+        if day in self._attached:
+            if inode is None or self._attached[day] == inode:
+                self._attached.move_to_end(day)
+                return f"{schema}.ohlcv_data"
+            self.detach(day)
+        while len(self._attached) >= self.max_attached:
+            self.detach(next(iter(self._attached)))
+        if self.readonly:
+            self.conn.execute("ATTACH DATABASE ? AS " + schema, (f"file:{path}?mode=ro",))
+        else:
+            self.conn.execute("ATTACH DATABASE ? AS " + schema, (path,))
+            if inode is None:
+                # Set before the first table exists, so freed pages can be returned incrementally.
+                self.conn.execute(f"PRAGMA {schema}.auto_vacuum = INCREMENTAL")
+                self.conn.execute(CREATE_OHLCV_TABLE_SQL.format(table=f"{schema}.ohlcv_data"))
+            self.conn.execute(f"PRAGMA {schema}.journal_mode = WAL")
+            self.conn.execute(f"PRAGMA {schema}.synchronous = NORMAL")
+            inode = os.stat(path).st_ino
+        self._attached[day] = inode
+        return f"{schema}.ohlcv_data"
+
+    def table_at(self, ts_ms: int) -> Optional[str]:
+        """`table` for the day holding `ts_ms`; usable as a rollups base_table."""
+        return self.table(partition_day(ts_ms))
+
+    def detach(self, day: int):
+        if self._attached.pop(day, None) is not None:
+            self.conn.execute(f"DETACH DATABASE p{day_label(day)}")
+
+    def detach_all(self):
+        for day in list(self._attached):
+            self.detach(day)
+
+    def drop(self, day: int, archive_dir: Optional[str] = None) -> int:
+        """Removes day `day` (moving its file into `archive_dir` when given); returns the bytes released."""
+        path = self.path(day)
+        if not os.path.exists(path):
+            return 0
+        if archive_dir and not self.readonly:
+            # Fold the day's WAL into the file so the archived copy stands alone.
+            schema = self.table(day).split('.')[0]
+            self.conn.execute(f"PRAGMA {schema}.wal_checkpoint(TRUNCATE)")
+        self.detach(day)
+        size = os.path.getsize(path)
+        if archive_dir:
+            os.makedirs(archive_dir, exist_ok=True)
+            os.replace(path, os.path.join(archive_dir, os.path.basename(path)))
+        else:
+            os.remove(path)
+        for suffix in ('-wal', '-shm'):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+        return size
+
+    def stats(self) -> dict:
+        days = self.days()
+        return {
+            'directory': self.directory,
+            'partitions': len(days),
+            'bytes': sum(os.path.getsize(self.path(d)) for d in days),
+            'oldest': day_label(days[0]) if days else None,
+            'newest': day_label(days[-1]) if days else None,
+        }
@@ -0,0 +1,34 @@
+import argparse
+import json
+
+import pandas as pd
+
+from logging_setup import configure_logging
+
+
+def parse_time(value: str) -> int:
+    """Epoch milliseconds, or an ISO date / datetime taken as UTC."""
+    if value.isdigit():
+        return int(value)
+    ts = pd.Timestamp(value)
+    if ts.tzinfo is None:
+        ts = ts.tz_localize('UTC')
+    return int(ts.value // 1_000_000)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Rebuild stored 1s bars and their rollups for a time range from the raw tick log. "
+                    "The database and log are taken from QUANT_DB_PATH / QUANT_TICK_DIR.")
+    parser.add_argument('--start', required=True, type=parse_time, help="Range start (epoch ms or ISO, UTC).")
+    parser.add_argument('--end', required=True, type=parse_time, help="Range end, exclusive (epoch ms or ISO, UTC).")
+    parser.add_argument('--symbols', default=None, help="Comma-separated symbols (default: every logged symbol).")
+    args = parser.parse_args()
+    if args.end <= args.start:
+        parser.error("--end must be after --start")
+    configure_logging(interval=0)
+
+    from data_handler import init_db, rebuild_bars
+    init_db()
+    symbols = [s.strip().upper() for s in args.symbols.split(',') if s.strip()] if args.symbols else None
+    print(json.dumps(rebuild_bars(args.start, args.end, symbols)))
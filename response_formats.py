@@ -0,0 +1,89 @@
+import json
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+try:
+    import orjson
+except ImportError:  # optional: serializes NumPy buffers directly
+    orjson = None
+
+try:
+    import pyarrow as pa
+    from pyarrow import ipc
+except ImportError:  # optional: Arrow IPC responses are unavailable without it
+    pa = ipc = None
+
+RECORDS = 'records'
+COLUMNAR = 'columnar'
+ARROW = 'arrow'
+FORMATS = (RECORDS, COLUMNAR, ARROW)
+
+ARROW_MEDIA_TYPE = 'application/vnd.apache.arrow.stream'
+COLUMNAR_MEDIA_TYPE = 'application/vnd.quant.columnar+json'
+MEDIA_TYPES = {COLUMNAR: COLUMNAR_MEDIA_TYPE, ARROW: ARROW_MEDIA_TYPE}
+_FORMATS_BY_MEDIA_TYPE = {media: fmt for fmt, media in MEDIA_TYPES.items()}
+
+
+def negotiate_format(accept: Optional[str], requested: Optional[str] = None) -> str:
+    """Chooses the response format from an explicit `format` parameter or the Accept header.
+
+    Accept entries are taken in order (q-values are not weighed); Arrow is
+    skipped when pyarrow is not installed. Anything else gets row records,
+    the original response shape.
+    """
+    if requested:
+        if requested not in FORMATS:
+            raise ValueError(f"Unknown format '{requested}'; expected one of {', '.join(FORMATS)}")
+        if requested == ARROW and pa is None:
+            raise ValueError("Arrow responses need pyarrow installed on the server")
+        return requested
+    for part in (accept or '').split(','):
+        fmt = _FORMATS_BY_MEDIA_TYPE.get(part.split(';')[0].strip().lower())
+        if fmt == ARROW and pa is None:
+            continue
+        if fmt is not None:
+            return fmt
+    return RECORDS
+
+
+def frame_columns(df: pd.DataFrame) -> Dict[str, np.ndarray]:
+    """Numeric columns of a timestamp-indexed frame, with the index as int64 epoch ms."""
+    columns = {'timestamp': df.index.to_numpy().astype('datetime64[ms]').astype(np.int64)}
+    for name in df.columns:
+        if df[name].dtype.kind in 'fiub':
+            columns[name] = df[name].to_numpy()
+    return columns
+
+
+def encode_columnar(columns: Dict[str, np.ndarray]) -> bytes:
+    """`{"timestamp": [...], "close": [...]}` JSON; non-finite floats become null."""
+    if orjson is not None:
+        return orjson.dumps({k: np.ascontiguousarray(v) for k, v in columns.items()},
+                            option=orjson.OPT_SERIALIZE_NUMPY)
+    encoded = {}
+    for name, values in columns.items():
+        if values.dtype.kind == 'f' and not np.isfinite(values).all():
+            values = np.where(np.isfinite(values), values, None)
+        encoded[name] = values.tolist()
+    return json.dumps(encoded, separators=(',', ':')).encode()
+
+
+def encode_arrow(columns: Dict[str, np.ndarray]) -> bytes:
+    """Arrow IPC stream of the columns; `timestamp` becomes timestamp[ms]. NumPy buffers are wrapped, not copied."""
+    arrays = {}
+    for name, values in columns.items():
+        if name == 'timestamp':
+            arrays[name] = pa.array(values.astype(np.int64, copy=False), type=pa.timestamp('ms'))
+        else:
+            arrays[name] = pa.array(values)
+    table = pa.table(arrays)
+    sink = pa.BufferOutputStream()
+    with ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def encode(fmt: str, columns: Dict[str, np.ndarray]) -> bytes:
+    return encode_arrow(columns) if fmt == ARROW else encode_columnar(columns)
@@ -0,0 +1,194 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from bar_aggregator import timeframe_to_ms
+from db_writer import OHLCVWriter
+from partitions import DAY_MS, day_label, partition_day
+from rollups import BASE_TIMEFRAME, ROLLUP_TIMEFRAMES, SUPPORTED_TIMEFRAMES, rebuild_rollups
+
+logger = logging.getLogger(__name__)
+
+# How long each timeframe is kept, e.g. "1s=7d,1m=365d,1h=forever"; timeframes
+# not listed are kept forever.
+RETENTION_SPEC = os.environ.get('QUANT_RETENTION', '1s=7d,1m=365d')
+RETENTION_INTERVAL_S = float(os.environ.get('QUANT_RETENTION_INTERVAL_S', 3600.0))
+# Expired 1s day partitions are moved here instead of deleted when set.
+ARCHIVE_DIR = os.environ.get('QUANT_ARCHIVE_DIR', '')
+# Free pages handed back to the file system per run; bounds the writer stall.
+VACUUM_PAGES = 16384
+
+_FOREVER = ('', 'forever', 'inf', 'none')
+
+
+def parse_retention(spec: str) -> Dict[str, Optional[int]]:
+    """'1s=7d,1m=365d,1h=forever' -> {'1s': 604800000, '1m': 31536000000, '1h': None}."""
+    policy: Dict[str, Optional[int]] = {}
+    for item in spec.split(','):
+        if not item.strip():
+            continue
+        timeframe, sep, keep = item.partition('=')
+        timeframe, keep = timeframe.strip(), keep.strip().lower()
+        if not sep or timeframe not in SUPPORTED_TIMEFRAMES:
+            raise ValueError(f"Bad retention entry {item.strip()!r}; expected <timeframe>=<duration|forever> "
+                             f"with a timeframe in {', '.join(SUPPORTED_TIMEFRAMES)}")
+        policy[timeframe] = None if keep in _FOREVER else timeframe_to_ms(keep)
+    return policy
+
+
+class RetentionManager:
+    """Applies a per-timeframe retention policy to the database on a schedule.
+
+    Nothing is deleted before it has been folded into the next coarser
+    level: an expired day of 1s bars has its rollups rebuilt from the
+    partition and is then dropped (or archived) as a whole file, and an
+    expired rollup range has the levels above it rebuilt before its rows
+    are deleted. Cutoffs are aligned to the coarser level's buckets, so no
+    coarse bucket loses part of its source. Finally up to `vacuum_pages`
+    free pages are released with `PRAGMA incremental_vacuum`.
+
+    Every step is a separate `submit_call` on the bar writer, so retention
+    never contends with it for the database and live batches are committed
+    between steps.
+    """
+
+    def __init__(self, writer: OHLCVWriter, policy: Dict[str, Optional[int]],
+                 interval: float = RETENTION_INTERVAL_S, archive_dir: Optional[str] = ARCHIVE_DIR or None,
+                 vacuum_pages: int = VACUUM_PAGES):
+        self.writer = writer
+        self.policy = policy
+        self.interval = interval
+        self.archive_dir = archive_dir
+        self.vacuum_pages = vacuum_pages
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.runs = 0
+        self.partitions_dropped = 0
+        self.bytes_released = 0
+        self.rows_deleted: Dict[str, int] = {}
+        self.pages_vacuumed = 0
+        self.last_run: Optional[Dict[str, Any]] = None
+        self.last_error: Optional[str] = None
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="retention", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = 5.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception as e:
+                self.last_error = str(e)
+                logger.error("Retention run failed", extra={'error': str(e)})
+
+    def _step(self, fn: Callable[[OHLCVWriter, sqlite3.Connection], Any]) -> Any:
+        return self.writer.submit_call(fn).result()
+
+    def run_once(self, now_ms: Optional[int] = None) -> Dict[str, Any]:
+        """One compaction / expiry / vacuum pass as of `now_ms` (default: now); returns what it did."""
+        now_ms = int(time.time() * 1000) if now_ms is None else int(now_ms)
+        started = time.perf_counter()
+        summary: Dict[str, Any] = {'partitions_dropped': [], 'bytes_released': 0, 'rows_deleted': {},
+                                   'pages_vacuumed': 0}
+        symbol_ids = self._step(lambda w, conn: [r[0] for r in conn.execute("SELECT id FROM symbols ORDER BY id")])
+
+        keep = self.policy.get(BASE_TIMEFRAME)
+        if keep is not None:
+            parts = self.writer.partitions
+            # A day goes once all of it is older than the retention period.
+            for day in parts.days(end=partition_day(now_ms - keep) * DAY_MS) if parts is not None else []:
+                summary['bytes_released'] += self._step(lambda w, conn, day=day: self._drop_day(conn, day, symbol_ids))
+                summary['partitions_dropped'].append(day_label(day))
+
+        levels = list(ROLLUP_TIMEFRAMES)
+        for i, timeframe in enumerate(levels):
+            keep = self.policy.get(timeframe)
+            if keep is None:
+                continue
+            coarser = levels[i + 1] if i + 1 < len(levels) else None
+            align = timeframe_to_ms(coarser or timeframe)
+            cutoff = (now_ms - keep) // align * align
+            deleted = 0
+            for symbol_id in symbol_ids:
+                deleted += self._step(lambda w, conn, s=symbol_id: self._expire_rollup(conn, timeframe, coarser, s, cutoff))
+            if deleted:
+                summary['rows_deleted'][timeframe] = deleted
+
+        summary['pages_vacuumed'] = self._step(lambda w, conn: self._vacuum(conn))
+        summary['seconds'] = round(time.perf_counter() - started, 3)
+        summary['as_of'] = now_ms
+
+        self.runs += 1
+        self.partitions_dropped += len(summary['partitions_dropped'])
+        self.bytes_released += summary['bytes_released']
+        for timeframe, rows in summary['rows_deleted'].items():
+            self.rows_deleted[timeframe] = self.rows_deleted.get(timeframe, 0) + rows
+        self.pages_vacuumed += summary['pages_vacuumed']
+        self.last_run = summary
+        if summary['partitions_dropped'] or summary['rows_deleted'] or summary['pages_vacuumed']:
+            logger.info("Retention run", extra={'partitions_dropped': len(summary['partitions_dropped']),
+                                                'rows_deleted': sum(summary['rows_deleted'].values()),
+                                                'pages_vacuumed': summary['pages_vacuumed'],
+                                                'seconds': summary['seconds']})
+        return summary
+
+    def _drop_day(self, conn: sqlite3.Connection, day: int, symbol_ids: List[int]) -> int:
+        """Rebuilds every rollup bucket of `day` from its 1s partition, then drops the partition."""
+        parts = self.writer.partitions
+        table = parts.table(day)
+        if table is None:
+            return 0
+        start, end = day * DAY_MS, (day + 1) * DAY_MS
+        present = [s for s in symbol_ids if conn.execute(
+            f"SELECT 1 FROM {table} WHERE symbol_id = ? AND timestamp >= ? AND timestamp < ? LIMIT 1",
+            (s, start, end)).fetchone()]
+        with conn:
+            rebuild_rollups(conn, [(s, start, end) for s in present], base_table=parts.table_at)
+        return parts.drop(day, self.archive_dir)
+
+    def _expire_rollup(self, conn: sqlite3.Connection, timeframe: str, coarser: Optional[str],
+                       symbol_id: int, cutoff: int) -> int:
+        """Folds one symbol's `timeframe` rows before `cutoff` into the coarser levels and deletes them."""
+        oldest = conn.execute("SELECT MIN(timestamp) FROM ohlcv_rollup WHERE timeframe = ? AND symbol_id = ?",
+                              (timeframe, symbol_id)).fetchone()[0]
+        if oldest is None or oldest >= cutoff:
+            return 0
+        with conn:
+            if coarser is not None:
+                rebuild_rollups(conn, [(symbol_id, oldest, cutoff)], source_timeframe=timeframe)
+            return conn.execute("DELETE FROM ohlcv_rollup WHERE timeframe = ? AND symbol_id = ? AND timestamp < ?",
+                                (timeframe, symbol_id, cutoff)).rowcount
+
+    def _vacuum(self, conn: sqlite3.Connection) -> int:
+        """Releases up to `vacuum_pages` free pages of the main file; a no-op unless auto_vacuum is INCREMENTAL."""
+        before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if before:
+            conn.execute(f"PRAGMA incremental_vacuum({int(self.vacuum_pages)})").fetchall()
+        return before - conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'policy': {tf: self.policy.get(tf) for tf in SUPPORTED_TIMEFRAMES},
+            'interval_s': self.interval,
+            'archive_dir': self.archive_dir,
+            'runs': self.runs,
+            'partitions_dropped': self.partitions_dropped,
+            'bytes_released': self.bytes_released,
+            'rows_deleted': dict(self.rows_deleted),
+            'pages_vacuumed': self.pages_vacuumed,
+            'last_run': self.last_run,
+            'last_error': self.last_error,
+        }
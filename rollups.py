@@ -0,0 +1,178 @@
+import sqlite3
+from functools import lru_cache
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from bar_aggregator import timeframe_to_ms
+
+BASE_TIMEFRAME = '1s'
+
+# Each rollup is rebuilt from the next finer level, so refreshing one bucket
+# only ever reads a handful of rows (60 x 1s, 5 x 1m, 12 x 5m, 24 x 1h).
+ROLLUP_SOURCES = (
+    ('1m', BASE_TIMEFRAME),
+    ('5m', '1m'),
+    ('1h', '5m'),
+    ('1d', '1h'),
+)
+ROLLUP_TIMEFRAMES = tuple(tf for tf, _ in ROLLUP_SOURCES)
+SUPPORTED_TIMEFRAMES = (BASE_TIMEFRAME,) + ROLLUP_TIMEFRAMES
+DAY_MS = 86_400_000
+
+CREATE_ROLLUP_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS ohlcv_rollup (
+        timeframe TEXT NOT NULL,
+        symbol_id INTEGER NOT NULL,
+        timestamp INTEGER NOT NULL,
+        open REAL,
+        high REAL,
+        low REAL,
+        close REAL,
+        volume REAL,
+        PRIMARY KEY (timeframe, symbol_id, timestamp)
+    ) WITHOUT ROWID
+"""
+
+
+# Maps a base bar timestamp to the table holding it, e.g. its day partition.
+BaseTable = Callable[[int], Optional[str]]
+
+
+def _source(source_tf: str, base_table: str = 'ohlcv_data') -> Tuple[str, List[str]]:
+    """Returns the table holding `source_tf` bars and the filter selecting them."""
+    if source_tf == BASE_TIMEFRAME:
+        return base_table, []
+    return 'ohlcv_rollup', ['timeframe = :source_tf']
+
+
+@lru_cache(maxsize=256)
+def _refresh_bucket_sql(source_tf: str, base_table: str = 'ohlcv_data') -> str:
+    table, filters = _source(source_tf, base_table)
+    cond = ' AND '.join(filters + ['symbol_id = :symbol_id', 'timestamp >= :start', 'timestamp < :end'])
+    return f"""
+        INSERT OR REPLACE INTO ohlcv_rollup
+            (timeframe, symbol_id, timestamp, open, high, low, close, volume)
+        SELECT :timeframe, :symbol_id, :start,
+            (SELECT open FROM {table} WHERE {cond} ORDER BY timestamp ASC LIMIT 1),
+            MAX(high), MIN(low),
+            (SELECT close FROM {table} WHERE {cond} ORDER BY timestamp DESC LIMIT 1),
+            SUM(volume)
+        FROM {table} WHERE {cond}
+        HAVING COUNT(*) > 0
+    """
+
+
+@lru_cache(maxsize=256)
+def _rebuild_sql(source_tf: str, ranged: bool = False, base_table: str = 'ohlcv_data') -> str:
+    table, filters = _source(source_tf, base_table)
+    if ranged:
+        filters = filters + ['symbol_id = :symbol_id', 'timestamp >= :start', 'timestamp < :end']
+    where = f"WHERE {' AND '.join(filters)}" if filters else ''
+    bucket = "(timestamp / :bucket_ms) * :bucket_ms"
+    return f"""
+        INSERT OR REPLACE INTO ohlcv_rollup
+            (timeframe, symbol_id, timestamp, open, high, low, close, volume)
+        SELECT :timeframe, symbol_id, bucket, first_open, MAX(high), MIN(low), last_close, SUM(volume)
+        FROM (
+            SELECT symbol_id, {bucket} AS bucket, high, low, volume,
+                FIRST_VALUE(open) OVER w AS first_open,
+                LAST_VALUE(close) OVER w AS last_close
+            FROM {table} {where}
+            WINDOW w AS (
+                PARTITION BY symbol_id, {bucket} ORDER BY timestamp
+                ROWS BETWEEN UNBOUNDED PRECEDING AND UNBOUNDED FOLLOWING
+            )
+        )
+        GROUP BY symbol_id, bucket
+    """
+
+
+def affected_buckets(rows: Iterable[Sequence], timeframe: str) -> Set[Tuple[int, int, int]]:
+    """Returns the distinct (symbol_id, start, end) buckets of `timeframe` touched by
+    base bar rows of the form (symbol_id, timestamp_ms, ...)."""
+    bucket_ms = timeframe_to_ms(timeframe)
+    buckets = set()
+    for row in rows:
+        start = row[1] - row[1] % bucket_ms
+        buckets.add((row[0], start, start + bucket_ms))
+    return buckets
+
+
+def refresh_rollups(conn: sqlite3.Connection, rows: List[Sequence],
+                    base_table: Optional[BaseTable] = None) -> List[Tuple[str, int, int]]:
+    """Recomputes every rollup bucket touched by freshly written base bars.
+
+    Buckets are rebuilt from their source level rather than merged in place,
+    so the refresh is idempotent when a bar is rewritten. `base_table`
+    locates the base bars of a bucket when they are partitioned. Returns
+    the refreshed (timeframe, symbol_id, bucket start) keys.
+    """
+    refreshed = []
+    if not rows:
+        return refreshed
+    for timeframe, source_tf in ROLLUP_SOURCES:
+        by_table: Dict[str, List[dict]] = {}
+        for symbol_id, start, end in affected_buckets(rows, timeframe):
+            table = base_table(start) if base_table is not None and source_tf == BASE_TIMEFRAME else 'ohlcv_data'
+            by_table.setdefault(table, []).append(
+                {'timeframe': timeframe, 'source_tf': source_tf, 'symbol_id': symbol_id, 'start': start, 'end': end})
+        for table, params in by_table.items():
+            conn.executemany(_refresh_bucket_sql(source_tf, table), params)
+            refreshed.extend((timeframe, p['symbol_id'], p['start']) for p in params)
+    return refreshed
+
+
+def fetch_rollup_bars(conn: sqlite3.Connection, keys: Iterable[Tuple[str, int, int]]) -> List[Tuple]:
+    """Reads back (timeframe, symbol_id, timestamp, open, high, low, close, volume) for rollup keys."""
+    bars = []
+    for key in keys:
+        row = conn.execute(
+            "SELECT timeframe, symbol_id, timestamp, open, high, low, close, volume FROM ohlcv_rollup "
+            "WHERE timeframe = ? AND symbol_id = ? AND timestamp = ?", key
+        ).fetchone()
+        if row is not None:
+            bars.append(row)
+    return bars
+
+
+def rebuild_rollups(conn: sqlite3.Connection, ranges: Optional[Iterable[Tuple[int, int, int]]] = None,
+                    base_table: Optional[BaseTable] = None, source_timeframe: str = BASE_TIMEFRAME):
+    """Rebuilds all rollup levels from the base table (used to backfill existing history).
+
+    With `ranges` of (symbol_id, start_ms, end_ms), only the buckets of each
+    level overlapping a range are replaced, e.g. after base bars there were
+    deleted or rewritten out of band. `base_table` locates partitioned base
+    bars (None for a day without any); ranges are then split at midnight
+    UTC. With `source_timeframe`
+    set to a rollup level, only the levels built on top of it are rebuilt,
+    e.g. to fold it into the coarser ones before its rows are deleted.
+    """
+    levels = list(ROLLUP_SOURCES)
+    if source_timeframe != BASE_TIMEFRAME:
+        levels = levels[ROLLUP_TIMEFRAMES.index(source_timeframe) + 1:]
+    if ranges is None:
+        for timeframe, source_tf in levels:
+            params = {'timeframe': timeframe, 'source_tf': source_tf, 'bucket_ms': timeframe_to_ms(timeframe)}
+            conn.execute(_rebuild_sql(source_tf), params)
+        return
+    ranges = list(ranges)
+    for timeframe, source_tf in levels:
+        bucket_ms = timeframe_to_ms(timeframe)
+        for symbol_id, start, end in ranges:
+            start, end = start - start % bucket_ms, -(-end // bucket_ms) * bucket_ms
+            pieces = [(start, end, 'ohlcv_data')]
+            if base_table is not None and source_tf == BASE_TIMEFRAME:
+                pieces = [(lo, min(lo - lo % DAY_MS + DAY_MS, end), base_table(lo))
+                          for lo in [start] + list(range(start - start % DAY_MS + DAY_MS, end, DAY_MS))]
+            for lo, hi, table in pieces:
+                params = {'timeframe': timeframe, 'source_tf': source_tf, 'bucket_ms': bucket_ms,
+                          'symbol_id': symbol_id, 'start': lo, 'end': hi}
+                conn.execute("DELETE FROM ohlcv_rollup WHERE timeframe = :timeframe AND symbol_id = :symbol_id "
+                             "AND timestamp >= :start AND timestamp < :end", params)
+                if table is not None:
+                    conn.execute(_rebuild_sql(source_tf, True, table), params)
+
+
+def validate_timeframe(timeframe: str) -> str:
+    if timeframe not in SUPPORTED_TIMEFRAMES:
+        raise ValueError(f"Unsupported timeframe {timeframe!r}; expected one of {', '.join(SUPPORTED_TIMEFRAMES)}")
+    return timeframe
@@ -0,0 +1,385 @@
+import asyncio
+import logging
+import math
+import os
+import time
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from alignment import max_stale_ms
+from analytics import parse_beta_mode
+from bar_aggregator import timeframe_to_ms
+from compute_pool import ComputeOverloaded, ComputePool, pair_snapshot_task
+from rollups import BASE_TIMEFRAME, validate_timeframe
+
+logger = logging.getLogger(__name__)
+
+# Pairs computed in the background from startup, e.g.
+# "BTCUSDT/ETHUSDT:1s:20:static;SOLUSDT/ETHUSDT:1m:60:kalman(1e-7,1e-7)".
+SCHEDULED_PAIRS = os.environ.get('QUANT_SCHEDULED_PAIRS', '')
+# How long a pass waits for its shards; a pair whose new bars have not been
+# published within this long is reported stale.
+SCHEDULER_DEADLINE_S = float(os.environ.get('QUANT_SCHEDULER_DEADLINE_S', 2.0))
+# Most pairs computed in one compute-pool task.
+SCHEDULER_SHARD_PAIRS = int(os.environ.get('QUANT_SCHEDULER_SHARD_PAIRS', 16))
+
+# (symbol_y, symbol_x, timeframe, window, beta_mode), the same key as a StreamHub pair feed.
+PairKey = Tuple[str, str, str, int, str]
+# (timestamps_ms, closes) of up to `limit` bars of (symbol, timeframe) before `end`.
+RangeLoader = Callable[..., Tuple[np.ndarray, np.ndarray]]
+
+
+def pair_id(key: PairKey) -> str:
+    symbol_y, symbol_x, timeframe, window, beta_mode = key
+    return f"{symbol_y}/{symbol_x}:{timeframe}:{window}:{beta_mode}"
+
+
+def parse_pair(spec: str) -> PairKey:
+    """'BTCUSDT/ETHUSDT:1m:20:static' -> a validated PairKey (window and beta_mode optional)."""
+    parts = spec.strip().split(':', 3)
+    legs = parts[0].split('/')
+    if len(legs) != 2 or not all(legs):
+        raise ValueError(f"Bad pair {spec.strip()!r}; expected SYMBOL_Y/SYMBOL_X[:timeframe[:window[:beta_mode]]]")
+    timeframe = parts[1] if len(parts) > 1 else BASE_TIMEFRAME
+    window = int(parts[2]) if len(parts) > 2 else 20
+    beta_mode = parts[3] if len(parts) > 3 else 'static'
+    return validate_pair((legs[0].upper(), legs[1].upper(), timeframe, window, beta_mode))
+
+
+def validate_pair(key: PairKey) -> PairKey:
+    symbol_y, symbol_x, timeframe, window, beta_mode = key
+    validate_timeframe(timeframe)
+    parse_beta_mode(beta_mode)
+    if window < 1:
+        raise ValueError("window must be at least 1")
+    if symbol_y == symbol_x:
+        raise ValueError("symbol_y and symbol_x must differ")
+    return key
+
+
+def parse_pairs(spec: str) -> List[PairKey]:
+    return [parse_pair(item) for item in spec.split(';') if item.strip()]
+
+
+def _finite(value: Any) -> Any:
+    return None if isinstance(value, float) and not math.isfinite(value) else value
+
+
+class _PairState:
+    __slots__ = ('key', 'id', 'target_end', 'submitted_end', 'published_end', 'pending_since', 'in_flight',
+                 'error', 'computed', 'deadline_misses')
+
+    def __init__(self, key: PairKey):
+        self.key = key
+        self.id = pair_id(key)
+        # Exclusive bar-time bound of the closed bars to compute from (None: whatever is stored).
+        self.target_end: Optional[int] = None
+        self.submitted_end: Optional[int] = None
+        self.published_end: Optional[int] = None
+        self.pending_since: Optional[float] = None
+        self.in_flight = False
+        self.error: Optional[str] = None
+        self.computed = 0
+        self.deadline_misses = 0
+
+
+class AnalyticsScheduler:
+    """Keeps the latest Beta / Spread / ZScore of every registered pair up to date in the background.
+
+    Committed bars (from the writer thread) advance each leg's closed-bar
+    horizon: a 1s bar is closed when committed, a rollup bucket once a later
+    bucket appears. When both legs of a pair have moved past its last
+    published bar the pair is marked dirty, and the loop computes all dirty
+    pairs in one pass, in shards of up to `shard_pairs` on the compute
+    pool. Each shard is published into the snapshot as soon as it finishes;
+    the pass stops waiting after `deadline` seconds, so a slow shard only
+    delays its own pairs, which stay out of later passes until their task
+    returns. Readers get the published snapshot, or with `series` the
+    published Spread / ZScore / Beta columns, and never trigger a
+    computation; a pair with new closed bars that has not been published
+    within `deadline` is reported stale.
+    """
+
+    def __init__(self, pool: ComputePool, loader: RangeLoader, bars: int,
+                 deadline: float = SCHEDULER_DEADLINE_S, shard_pairs: int = SCHEDULER_SHARD_PAIRS):
+        self.pool = pool
+        self.loader = loader
+        self.bars = bars
+        self.deadline = deadline
+        self.shard_pairs = max(shard_pairs, 1)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._pairs: Dict[PairKey, _PairState] = {}
+        self._by_leg: Dict[Tuple[str, str], Set[PairKey]] = defaultdict(set)
+        self._leg_end: Dict[Tuple[str, str], int] = {}
+        self._dirty: Set[PairKey] = set()
+        # Replaced, never mutated, so a reader always sees a consistent set of rows.
+        self._snapshot: Dict[str, Dict[str, Any]] = {}
+        self._series: Dict[str, Dict[str, np.ndarray]] = {}
+        self.passes = 0
+        self.pairs_computed = 0
+        self.failures = 0
+        self.deadline_misses = 0
+        self.overloaded = 0
+        self.last_pass_ms: Optional[float] = None
+
+    def start(self, loop: asyncio.AbstractEventLoop):
+        self._loop = loop
+        self._wake = asyncio.Event()
+        self._task = loop.create_task(self._run())
+        if self._dirty:
+            self._wake.set()
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def register(self, key: PairKey) -> bool:
+        """Adds a pair (computed right away from stored bars); False if it was already registered."""
+        key = validate_pair(key)
+        if key in self._pairs:
+            return False
+        self._pairs[key] = _PairState(key)
+        symbol_y, symbol_x, timeframe = key[:3]
+        self._by_leg[(symbol_y, timeframe)].add(key)
+        self._by_leg[(symbol_x, timeframe)].add(key)
+        self._mark_dirty(self._pairs[key], time.time())
+        return True
+
+    def unregister(self, key: PairKey) -> bool:
+        state = self._pairs.pop(key, None)
+        if state is None:
+            return False
+        self._dirty.discard(key)
+        for symbol in key[:2]:
+            leg = (symbol, key[2])
+            self._by_leg[leg].discard(key)
+            if not self._by_leg[leg]:
+                del self._by_leg[leg]
+                self._leg_end.pop(leg, None)
+        snapshot, series = dict(self._snapshot), dict(self._series)
+        snapshot.pop(state.id, None)
+        series.pop(state.id, None)
+        self._snapshot, self._series = snapshot, series
+        return True
+
+    def pairs(self) -> List[PairKey]:
+        return list(self._pairs)
+
+    def on_bars(self, bars: List[Tuple[str, str, int, Sequence[float]]]):
+        """Writer-thread entry point: (symbol, timeframe, timestamp, ohlcv) for each committed bar."""
+        loop = self._loop
+        if loop is None or not self._by_leg:
+            return
+        loop.call_soon_threadsafe(self._advance, bars)
+
+    def _advance(self, bars: List[Tuple[str, str, int, Sequence[float]]]):
+        touched = set()
+        for symbol, timeframe, ts, _ in bars:
+            leg = (symbol, timeframe)
+            if leg not in self._by_leg:
+                continue
+            # Bars before `end` are closed: a committed 1s bar is final, a rollup
+            # bucket is once a later one exists.
+            end = ts + 1000 if timeframe == BASE_TIMEFRAME else ts
+            if end > self._leg_end.get(leg, -1):
+                self._leg_end[leg] = end
+                touched.update(self._by_leg[leg])
+        now = time.time()
+        for key in touched:
+            state = self._pairs[key]
+            ends = [self._leg_end.get((symbol, key[2])) for symbol in key[:2]]
+            if None in ends:
+                continue
+            end = min(ends)
+            if state.published_end is None or end > state.published_end:
+                state.target_end = end
+                self._mark_dirty(state, now)
+
+    def _mark_dirty(self, state: _PairState, now: float):
+        if state.pending_since is None:
+            state.pending_since = now
+        self._dirty.add(state.key)
+        if self._wake is not None:
+            self._wake.set()
+
+    async def _run(self):
+        while True:
+            await self._wake.wait()
+            self._wake.clear()
+            batch = [self._pairs[k] for k in self._dirty if k in self._pairs and not self._pairs[k].in_flight]
+            if not batch:
+                continue
+            try:
+                await self._pass(batch)
+            except Exception as e:
+                self.failures += 1
+                logger.error("Analytics scheduler pass failed", extra={'pairs': len(batch), 'error': str(e)})
+
+    async def _pass(self, batch: List[_PairState]):
+        started = time.perf_counter()
+        for state in batch:
+            self._dirty.discard(state.key)
+            state.in_flight = True
+            state.submitted_end = state.target_end
+        targets = [state.target_end for state in batch]
+        try:
+            closes = await asyncio.to_thread(self._load, batch, targets)
+        except BaseException:
+            for state in batch:
+                state.in_flight = False
+                self._dirty.add(state.key)
+            raise
+
+        # At least one shard per worker, each at most `shard_pairs` pairs.
+        per_shard = min(self.shard_pairs, -(-len(batch) // max(self.pool.workers, 1)))
+        waiting = []
+        for first in range(0, len(batch), per_shard):
+            shard = list(range(first, min(first + per_shard, len(batch))))
+            arrays = {}
+            for j, i in enumerate(shard):
+                for name, values in zip(('ts_y', 'y', 'ts_x', 'x'), closes[i]):
+                    arrays[f'{name}{j}'] = values
+            specs = [(batch[i].key[3], batch[i].key[4], max_stale_ms(timeframe_to_ms(batch[i].key[2])))
+                     for i in shard]
+            states = [batch[i] for i in shard]
+            try:
+                future = asyncio.wrap_future(self.pool.submit(pair_snapshot_task, arrays, specs))
+            except ComputeOverloaded as e:
+                self.overloaded += 1
+                self._fail(states, str(e))
+                self._retry(states)
+                continue
+            future.add_done_callback(lambda f, states=states: self._publish(states, f))
+            waiting.append((future, states))
+
+        if waiting:
+            _, late = await asyncio.wait([f for f, _ in waiting], timeout=self.deadline)
+            for future, states in waiting:
+                if future in late:
+                    # Left running: published whenever it returns, skipped by passes until then.
+                    self.deadline_misses += len(states)
+                    for state in states:
+                        state.deadline_misses += 1
+                    logger.warning("Analytics shard missed its deadline",
+                                   extra={'pairs': [s.id for s in states], 'deadline_s': self.deadline})
+        self.passes += 1
+        self.last_pass_ms = (time.perf_counter() - started) * 1000.0
+
+    def _load(self, batch: List[_PairState], targets: List[Optional[int]]) -> List[Tuple[np.ndarray, ...]]:
+        """(ts_y, y, ts_x, x) of each pair's latest closed bars; runs off the event loop."""
+        now_ms = int(time.time() * 1000)
+        closes = []
+        for state, end in zip(batch, targets):
+            symbol_y, symbol_x, timeframe = state.key[:3]
+            if end is None and timeframe != BASE_TIMEFRAME:
+                # No bar seen since registering: leave out the bucket that is still forming.
+                bar_ms = timeframe_to_ms(timeframe)
+                end = now_ms // bar_ms * bar_ms
+            ts_y, y = self.loader(symbol_y, timeframe, self.bars, None, end)
+            ts_x, x = self.loader(symbol_x, timeframe, self.bars, None, end)
+            closes.append((ts_y, y, ts_x, x))
+        return closes
+
+    def _publish(self, states: List[_PairState], future: "asyncio.Future"):
+        for state in states:
+            state.in_flight = False
+        if future.cancelled() or future.exception() is not None:
+            error = 'cancelled' if future.cancelled() else str(future.exception())
+            self.failures += 1
+            self._fail(states, error)
+            return
+        now = time.time()
+        snapshot, series = dict(self._snapshot), dict(self._series)
+        for state, result in zip(states, future.result()):
+            if state.key not in self._pairs:
+                continue
+            if 'error' in result:
+                state.error = result['error']
+                continue
+            state.error = None
+            state.computed += 1
+            self.pairs_computed += 1
+            if state.submitted_end is not None:
+                state.published_end = state.submitted_end
+            else:
+                bar_ms = 1000 if state.key[2] == BASE_TIMEFRAME else timeframe_to_ms(state.key[2])
+                state.published_end = result['timestamp'] + bar_ms
+            if state.key not in self._dirty:
+                state.pending_since = None
+            symbol_y, symbol_x, timeframe, window, beta_mode = state.key
+            row = {'id': state.id, 'pair': f"{symbol_y}_{symbol_x}", 'symbol_y': symbol_y, 'symbol_x': symbol_x,
+                   'timeframe': timeframe, 'window': window, 'beta_mode': beta_mode,
+                   'timestamp': result['timestamp'], 'Beta': _finite(result['Beta']),
+                   'Spread': _finite(result['Spread']), 'ZScore': _finite(result['ZScore']),
+                   'alignment': result['alignment'], 'updated_at': int(now * 1000)}
+            snapshot[state.id] = row
+            series[state.id] = result['series']
+        self._snapshot, self._series = snapshot, series
+        if any(state.key in self._dirty for state in states):
+            self._wake.set()
+
+    def _retry(self, states: List[_PairState]):
+        """Puts pairs back in the dirty set and wakes the loop after `deadline`, when the pool may have room."""
+        self._dirty.update(state.key for state in states if state.key in self._pairs)
+        self._loop.call_later(self.deadline, self._wake.set)
+
+    def _fail(self, states: List[_PairState], error: str):
+        for state in states:
+            state.in_flight = False
+            state.error = error
+        logger.error("Analytics shard failed", extra={'pairs': [s.id for s in states], 'error': error})
+
+    def snapshot(self, symbol: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Published rows of every registered pair (optionally only pairs with `symbol` as a leg), with staleness."""
+        now = time.time()
+        published = self._snapshot
+        return [self._row(state, published, now) for key, state in list(self._pairs.items())
+                if symbol is None or symbol in key[:2]]
+
+    def series(self, key: PairKey) -> Optional[Tuple[Dict[str, np.ndarray], Dict[str, Any]]]:
+        """(Spread / ZScore / Beta columns, snapshot row) last published for `key`; None if not available."""
+        state = self._pairs.get(key)
+        published, series = self._snapshot, self._series
+        if state is None or state.id not in series:
+            return None
+        return series[state.id], self._row(state, published, time.time())
+
+    def _row(self, state: _PairState, published: Dict[str, Dict[str, Any]], now: float) -> Dict[str, Any]:
+        key = state.key
+        row = dict(published.get(state.id) or {'id': state.id, 'pair': f"{key[0]}_{key[1]}",
+                                               'symbol_y': key[0], 'symbol_x': key[1], 'timeframe': key[2],
+                                               'window': key[3], 'beta_mode': key[4], 'timestamp': None,
+                                               'Beta': None, 'Spread': None, 'ZScore': None,
+                                               'alignment': None, 'updated_at': None})
+        pending_s = None if state.pending_since is None else now - state.pending_since
+        row['pending_s'] = None if pending_s is None else round(pending_s, 3)
+        row['stale'] = state.id not in published or (pending_s is not None and pending_s > self.deadline) \
+            or state.error is not None
+        row['error'] = state.error
+        return row
+
+    def stats(self) -> Dict[str, Any]:
+        rows = self.snapshot()
+        return {
+            'pairs': len(rows),
+            'stale': sum(1 for r in rows if r['stale']),
+            'dirty': len(self._dirty),
+            'in_flight': sum(1 for s in self._pairs.values() if s.in_flight),
+            'deadline_s': self.deadline,
+            'shard_pairs': self.shard_pairs,
+            'passes': self.passes,
+            'pairs_computed': self.pairs_computed,
+            'failures': self.failures,
+            'deadline_misses': self.deadline_misses,
+            'overloaded': self.overloaded,
+            'last_pass_ms': None if self.last_pass_ms is None else round(self.last_pass_ms, 3),
+        }
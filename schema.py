@@ -0,0 +1,99 @@
+import sqlite3
+from typing import Dict, Optional
+
+# Version 1: TEXT ISO-8601 timestamps keyed by (timestamp, symbol).
+# Version 2: int64 epoch-ms timestamps and interned symbol ids, clustered on
+#            (symbol_id, timestamp) so range scans read rows in index order.
+# Version 3: 1s bars moved out of the main file into per-day partition files
+#            (partitions.py); the main file uses incremental auto-vacuum.
+SCHEMA_VERSION = 3
+
+CREATE_SYMBOLS_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS symbols (
+        id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL UNIQUE
+    )
+"""
+
+# WITHOUT ROWID stores every column in the primary-key b-tree, so the
+# (symbol_id, timestamp) key doubles as a covering index for range queries.
+CREATE_OHLCV_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS {table} (
+        symbol_id INTEGER NOT NULL,
+        timestamp INTEGER NOT NULL,
+        open REAL,
+        high REAL,
+        low REAL,
+        close REAL,
+        volume REAL,
+        PRIMARY KEY (symbol_id, timestamp)
+    ) WITHOUT ROWID
+"""
+
+# Intervals (exchange event time, epoch ms) in which a stream delivered no
+# data, recorded by the ingestion pipeline so analytics can exclude them.
+CREATE_GAPS_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS ingest_gaps (
+        stream TEXT NOT NULL,
+        start_ms INTEGER NOT NULL,
+        end_ms INTEGER NOT NULL,
+        reason TEXT NOT NULL,
+        PRIMARY KEY (stream, start_ms)
+    )
+"""
+
+# User-defined alert rules; `symbol_x` is set for pair metrics. Evaluation
+# looks rules up by series, so they are indexed by (symbol, symbol_x, metric).
+CREATE_ALERT_RULES_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS alert_rules (
+        id INTEGER PRIMARY KEY,
+        symbol TEXT NOT NULL,
+        symbol_x TEXT,
+        metric TEXT NOT NULL,
+        operator TEXT NOT NULL,
+        value REAL NOT NULL,
+        timeframe TEXT NOT NULL,
+        window_size INTEGER NOT NULL,
+        beta_mode TEXT NOT NULL,
+        hysteresis REAL NOT NULL DEFAULT 0,
+        cooldown_s REAL NOT NULL DEFAULT 0
+    )
+"""
+CREATE_ALERT_RULES_INDEX_SQL = """
+    CREATE INDEX IF NOT EXISTS alert_rules_series ON alert_rules (symbol, symbol_x, metric)
+"""
+
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def set_schema_version(conn: sqlite3.Connection, version: int):
+    conn.execute(f"PRAGMA user_version = {int(version)}")
+
+
+def is_legacy_schema(conn: sqlite3.Connection) -> bool:
+    """True if `ohlcv_data` still uses the version 1 (TEXT timestamp, symbol name) layout."""
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(ohlcv_data)")}
+    return 'symbol' in columns and 'symbol_id' not in columns
+
+
+def intern_symbol(conn: sqlite3.Connection, name: str, cache: Dict[str, int]) -> int:
+    """Returns the id for `name`, inserting it into `symbols` on first sight."""
+    symbol_id = cache.get(name)
+    if symbol_id is None:
+        conn.execute("INSERT OR IGNORE INTO symbols (name) VALUES (?)", (name,))
+        symbol_id = conn.execute("SELECT id FROM symbols WHERE name = ?", (name,)).fetchone()[0]
+        cache[name] = symbol_id
+    return symbol_id
+
+
+def lookup_symbol(conn: sqlite3.Connection, name: str, cache: Dict[str, int]) -> Optional[int]:
+    """Returns the id for `name` without creating it, or None if it was never stored."""
+    symbol_id = cache.get(name)
+    if symbol_id is None:
+        row = conn.execute("SELECT id FROM symbols WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            return None
+        symbol_id = cache[name] = row[0]
+    return symbol_id
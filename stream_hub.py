@@ -0,0 +1,317 @@
+import asyncio
+import json
+import math
+from collections import defaultdict, deque
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from alignment import StreamingAligner, align_pair, max_stale_ms
+from analytics import parse_beta_mode, spread_zscore_arrays
+from bar_aggregator import timeframe_to_ms
+from kalman import KalmanHedgeRatio
+from metrics import COMPUTE_SECONDS
+from streaming_analytics import StreamingSpreadZScore
+
+# Events buffered per subscriber; a client that falls further behind loses
+# its oldest events (counted in `dropped`) instead of slowing the others.
+SUBSCRIBER_QUEUE_SIZE = 1024
+# Bars each pair feed keeps for the hedge ratio, matching the API's history.
+FEED_HISTORY_BARS = 500
+
+# (timestamps_ms, closes) for the latest `limit` bars of (symbol, timeframe).
+CloseLoader = Callable[[str, str, int], Tuple[np.ndarray, np.ndarray]]
+
+
+def bar_topic(symbol: str, timeframe: str) -> str:
+    return f"bars:{symbol}:{timeframe}"
+
+
+def alert_topic(series: str) -> str:
+    """Topic of the alert rules on `series`: a symbol, or a pair as 'Y_X'."""
+    return f"alerts:{series}"
+
+
+def format_sse(event: str, payload: Dict[str, Any]) -> str:
+    """One Server-Sent Events message; non-finite floats become null."""
+    clean = {k: (None if isinstance(v, float) and not math.isfinite(v) else v) for k, v in payload.items()}
+    return f"event: {event}\ndata: {json.dumps(clean, separators=(',', ':'))}\n\n"
+
+
+class Subscription:
+    """One client's bounded queue of pre-encoded messages."""
+
+    def __init__(self, topics: Sequence[str], max_queue: int = SUBSCRIBER_QUEUE_SIZE):
+        self.topics = tuple(topics)
+        self.queue: "asyncio.Queue[str]" = asyncio.Queue(max_queue)
+        self.feed_key: Optional[tuple] = None
+        self.dropped = 0
+
+    def deliver(self, message: str):
+        while True:
+            try:
+                self.queue.put_nowait(message)
+                return
+            except asyncio.QueueFull:
+                self.queue.get_nowait()
+                self.dropped += 1
+
+
+class PairFeed:
+    """Incremental spread / z-score for one (pair, timeframe, window, beta_mode).
+
+    Closes arrive per leg and are as-of joined by an alignment.StreamingAligner:
+    a bar time is processed once both legs have reported up to it (for
+    rollup timeframes, whose buckets keep changing, once both have moved on
+    to a later bucket), forward-filling a quiet leg for up to
+    ALIGN_MAX_STALE_BARS bars. Static beta uses the O(1) streaming
+    engine over the last `history` bars and Kalman beta the O(1) filter,
+    warmed up on that history; other modes recompute
+    the spread / z-score over that bounded history. Either way the work
+    is done once per bar, however many clients are listening.
+    """
+
+    def __init__(self, symbol_y: str, symbol_x: str, timeframe: str, window: int, beta_mode: str,
+                 final_on_next: bool, history: int = FEED_HISTORY_BARS):
+        self.symbol_y, self.symbol_x = symbol_y, symbol_x
+        self.timeframe = timeframe
+        self.window = window
+        self.beta_mode = beta_mode
+        self.final_on_next = final_on_next
+        self.pair = f"{symbol_y}_{symbol_x}"
+        self.key = (symbol_y, symbol_x, timeframe, window, beta_mode)
+        self.topic = f"analytics:{symbol_y}:{symbol_x}:{timeframe}:{window}:{beta_mode}"
+        self.ready = False
+        kind, param = parse_beta_mode(beta_mode)
+        self._engine = StreamingSpreadZScore(window, history=max(history, window)) if kind == 'static' \
+            else KalmanHedgeRatio(window, *param) if kind == 'kalman' else None
+        self._rows: deque = deque(maxlen=max(history, window))
+        self._aligner = StreamingAligner(max_stale_ms(timeframe_to_ms(timeframe)), final_on_next,
+                                         max_pending=self._rows.maxlen)
+        # Bars committed while warming up, replayed once the aligner is seeded.
+        self._early: List[Tuple[int, int, float]] = []
+
+    @property
+    def last_ts(self) -> Optional[int]:
+        return self._aligner.last_ts
+
+    def alignment_stats(self) -> Dict[str, int]:
+        return self._aligner.stats()
+
+    def warm_up(self, loader: CloseLoader):
+        """Seeds the state from stored history; runs off the event loop."""
+        history = self._rows.maxlen
+        ts_y, y = loader(self.symbol_y, self.timeframe, history)
+        ts_x, x = loader(self.symbol_x, self.timeframe, history)
+        upto = None
+        if len(ts_y) and len(ts_x):
+            # Rows are final up to the older of the two legs' newest bars; with
+            # final_on_next the newest bucket may still be forming. Later bars go
+            # to the live path to finish.
+            upto = int(min(ts_y[-1], ts_x[-1])) - (1 if self.final_on_next else 0)
+        final_y, final_x = (ts_y <= upto, ts_x <= upto) if upto is not None else (slice(0), slice(0))
+        aligned = align_pair(ts_y[final_y], y[final_y], ts_x[final_x], x[final_x], self._aligner.max_stale)
+        if self._engine is not None:
+            self._engine.warm_up(aligned.y, aligned.x)
+        else:
+            self._rows.extend(zip(aligned.timestamp.tolist(), aligned.y.tolist(), aligned.x.tolist()))
+        self._aligner.seed(ts_y, y, ts_x, x, aligned, upto)
+
+    def on_bar(self, symbol: str, ts: int, close: float) -> List[Tuple[str, Dict[str, Any]]]:
+        leg = 0 if symbol == self.symbol_y else 1
+        if not self.ready:
+            self._early.append((leg, ts, close))
+            return []
+        events = []
+        for row in self._aligner.add(leg, ts, close):
+            events.extend(self._process(*row))
+        return events
+
+    def drain(self) -> List[Tuple[str, Dict[str, Any]]]:
+        early, self._early = self._early, []
+        events = []
+        for leg, ts, close in early:
+            for row in self._aligner.add(leg, ts, close):
+                events.extend(self._process(*row))
+        return events
+
+    def _process(self, ts: int, y: float, x: float) -> List[Tuple[str, Dict[str, Any]]]:
+        with COMPUTE_SECONDS.time(function='pair_feed'):
+            if self._engine is not None:
+                beta, spread, zscore = self._engine.update(y, x)
+            else:
+                self._rows.append((ts, y, x))
+                rows = np.array(self._rows)
+                spread, zscore, beta = spread_zscore_arrays(rows[:, 1], rows[:, 2], self.window, self.beta_mode)
+                beta, spread, zscore = float(beta[-1]), float(spread[-1]), float(zscore[-1])
+
+        return [('analytics', {'pair': self.pair, 'timestamp': ts,
+                               'Beta': beta, 'Spread': spread, 'ZScore': zscore})]
+
+
+class StreamHub:
+    """Fans committed bars, pair analytics and alert transitions out to SSE subscribers.
+
+    `on_bars_committed` is called from the writer thread after each commit
+    and hops onto the event loop; everything else runs on the loop. Each
+    message is encoded once and the same string is queued to every
+    subscriber of its topic.
+    """
+
+    def __init__(self, max_queue: int = SUBSCRIBER_QUEUE_SIZE):
+        self.max_queue = max_queue
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._topics: Dict[str, Set[Subscription]] = defaultdict(set)
+        self._feeds: Dict[tuple, PairFeed] = {}
+        self._feed_refs: Dict[tuple, int] = defaultdict(int)
+        # Feeds being warmed up; concurrent acquirers wait on the future.
+        self._warming: Dict[tuple, asyncio.Future] = {}
+        self._feeds_by_leg: Dict[Tuple[str, str], Set[PairFeed]] = defaultdict(set)
+        self.on_analytics: Optional[Callable[[PairFeed, Dict[str, Any]], None]] = None
+        self.messages_published = 0
+
+    def bind(self, loop: asyncio.AbstractEventLoop):
+        self._loop = loop
+
+    def subscribe(self, topics: Sequence[str]) -> Subscription:
+        subscription = Subscription(topics, self.max_queue)
+        for topic in subscription.topics:
+            self._topics[topic].add(subscription)
+        return subscription
+
+    async def acquire_feed(self, symbol_y: str, symbol_x: str, timeframe: str, window: int,
+                           beta_mode: str, loader: CloseLoader, final_on_next: bool) -> PairFeed:
+        """Returns the shared pair feed, creating and warming it on first use; pair with `release_feed`.
+
+        Callers arriving during the warm-up wait for it and share its
+        outcome; a reference is only taken once the feed is ready.
+        """
+        key = (symbol_y, symbol_x, timeframe, window, beta_mode)
+        while True:
+            warming = self._warming.get(key)
+            if warming is not None:
+                try:
+                    await asyncio.shield(warming)
+                except asyncio.CancelledError:
+                    if not warming.cancelled():
+                        raise
+                    # The caller warming the feed went away; the next one takes over.
+                continue
+            feed = self._feeds.get(key)
+            if feed is None:
+                feed = await self._warm_feed(key, loader, final_on_next)
+            break
+        self._feed_refs[key] += 1
+        return feed
+
+    async def _warm_feed(self, key: tuple, loader: CloseLoader, final_on_next: bool) -> PairFeed:
+        symbol_y, symbol_x, timeframe = key[:3]
+        feed = PairFeed(*key, final_on_next)
+        self._feeds[key] = feed
+        # Registered before warming so bars committed meanwhile are buffered, not lost.
+        self._feeds_by_leg[(symbol_y, timeframe)].add(feed)
+        self._feeds_by_leg[(symbol_x, timeframe)].add(feed)
+        warming = self._warming[key] = asyncio.get_running_loop().create_future()
+        try:
+            await asyncio.to_thread(feed.warm_up, loader)
+        except BaseException as e:
+            self._drop_feed(key)
+            if isinstance(e, Exception):
+                warming.set_exception(e)
+                # Waiters re-raise it; this marks it retrieved when there are none.
+                warming.exception()
+            else:
+                warming.cancel()
+            raise
+        finally:
+            self._warming.pop(key, None)
+        feed.ready = True
+        self._publish_events(feed, feed.drain())
+        warming.set_result(feed)
+        return feed
+
+    def release_feed(self, key: tuple):
+        if key not in self._feed_refs:
+            return
+        self._feed_refs[key] -= 1
+        if self._feed_refs[key] <= 0:
+            self._drop_feed(key)
+
+    async def subscribe_pair(self, symbol_y: str, symbol_x: str, timeframe: str, window: int,
+                             beta_mode: str, loader: CloseLoader, final_on_next: bool) -> Subscription:
+        """Subscribes to both legs' bars, the shared pair feed and the alert rules on the pair or either leg."""
+        feed = await self.acquire_feed(symbol_y, symbol_x, timeframe, window, beta_mode, loader, final_on_next)
+        subscription = self.subscribe([bar_topic(symbol_y, timeframe), bar_topic(symbol_x, timeframe),
+                                       feed.topic, alert_topic(feed.pair), alert_topic(symbol_y),
+                                       alert_topic(symbol_x)])
+        subscription.feed_key = feed.key
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        for topic in subscription.topics:
+            subscribers = self._topics.get(topic)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._topics[topic]
+        if subscription.feed_key is not None:
+            self.release_feed(subscription.feed_key)
+
+    def _drop_feed(self, key: tuple):
+        feed = self._feeds.pop(key, None)
+        self._feed_refs.pop(key, None)
+        if feed is not None:
+            for leg in ((feed.symbol_y, feed.timeframe), (feed.symbol_x, feed.timeframe)):
+                self._feeds_by_leg[leg].discard(feed)
+                if not self._feeds_by_leg[leg]:
+                    del self._feeds_by_leg[leg]
+
+    def publish(self, topic: str, event: str, payload: Dict[str, Any]):
+        subscribers = self._topics.get(topic)
+        if not subscribers:
+            return
+        message = format_sse(event, payload)
+        self.messages_published += 1
+        for subscription in subscribers:
+            subscription.deliver(message)
+
+    def publish_threadsafe(self, topic: str, event: str, payload: Dict[str, Any]):
+        """`publish` from any thread; dropped if the hub is not bound to a loop yet."""
+        if self._loop is not None and topic in self._topics:
+            self._loop.call_soon_threadsafe(self.publish, topic, event, payload)
+
+    def on_bars_committed(self, bars: List[Tuple[str, str, int, Sequence[float]]]):
+        """Writer-thread entry point: (symbol, timeframe, timestamp, ohlcv) for each committed bar."""
+        loop = self._loop
+        if loop is None or (not self._topics and not self._feeds):
+            return
+        loop.call_soon_threadsafe(self._dispatch_bars, bars)
+
+    def _dispatch_bars(self, bars: List[Tuple[str, str, int, Sequence[float]]]):
+        for symbol, timeframe, ts, values in bars:
+            topic = bar_topic(symbol, timeframe)
+            if topic in self._topics:
+                o, h, l, c, v = values
+                self.publish(topic, 'bar', {'symbol': symbol, 'timeframe': timeframe, 'timestamp': ts,
+                                            'open': o, 'high': h, 'low': l, 'close': c, 'volume': v})
+            for feed in list(self._feeds_by_leg.get((symbol, timeframe), ())):
+                self._publish_events(feed, feed.on_bar(symbol, ts, float(values[3])))
+
+    def _publish_events(self, feed: PairFeed, events: List[Tuple[str, Dict[str, Any]]]):
+        for event, payload in events:
+            if self.on_analytics is not None:
+                self.on_analytics(feed, payload)
+            self.publish(feed.topic, event, payload)
+
+    def stats(self) -> Dict[str, Any]:
+        subscriptions = {s for subs in self._topics.values() for s in subs}
+        return {
+            'subscribers': len(subscriptions),
+            'topics': len(self._topics),
+            'pair_feeds': len(self._feeds),
+            # As-of join of the feeds' legs: rows produced, legs carried forward, clock rows dropped.
+            'alignment': {name: sum(f.alignment_stats()[name] for f in self._feeds.values())
+                          for name in ('rows', 'imputed_y', 'imputed_x', 'dropped')},
+            'messages_published': self.messages_published,
+            'messages_dropped': sum(s.dropped for s in subscriptions),
+        }
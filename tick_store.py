@@ -0,0 +1,235 @@
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# One fixed 28-byte little-endian record per tick, no padding, so a segment is
+# a plain array on disk: np.memmap(path, dtype=TICK_DTYPE) reads it back.
+TICK_DTYPE = np.dtype([('timestamp', '<i8'), ('symbol_id', '<u4'), ('price', '<f8'), ('qty', '<f8')])
+SEGMENT_SUFFIX = '.ticks'
+SYMBOLS_FILE = 'symbols.txt'
+DAY_MS = 86_400_000
+
+# Appended ticks are buffered and written once this many are pending or this
+# long after the previous write; a crash loses at most that much of the log.
+FLUSH_ROWS = 8192
+FLUSH_INTERVAL_S = 1.0
+# Records mapped per read chunk.
+READ_CHUNK_ROWS = 1 << 20
+
+
+def segment_day(ts_ms: int) -> str:
+    return datetime.fromtimestamp(ts_ms // DAY_MS * 86400, tz=timezone.utc).strftime('%Y-%m-%d')
+
+
+class TickStore:
+    """Append-only raw tick log, one fixed-record segment file per UTC day.
+
+    Symbols are numbered by their line in `symbols.txt`, which only ever
+    grows. `append` runs on the ingestion thread and only buffers; full
+    buffers are written with a single `write` per segment. Reads memory-map
+    the segments, so scanning a month of ticks never loads it into memory.
+    A record torn by a crash is cut off when its segment is next opened.
+    """
+
+    def __init__(self, directory: str, flush_rows: int = FLUSH_ROWS, flush_interval: float = FLUSH_INTERVAL_S):
+        self.directory = directory
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._pending: List[tuple] = []
+        self._last_flush = time.monotonic()
+        self._files: Dict[str, Any] = {}
+        self._names: List[str] = []
+        self._ids: Dict[str, int] = {}
+        self._symbols_path = os.path.join(directory, SYMBOLS_FILE)
+        self._load_symbols()
+        self._symbols_file = open(self._symbols_path, 'a', encoding='utf-8')
+        self.ticks_appended = 0
+        self.ticks_written = 0
+        self.write_errors = 0
+
+    def _load_symbols(self):
+        """Picks up symbols added since the last load (by this or another process's store)."""
+        if not os.path.exists(self._symbols_path):
+            return
+        with open(self._symbols_path, encoding='utf-8') as f:
+            # A line without its newline is still being written by another process.
+            names = [line[:-1] for line in f if line.endswith('\n') and line.strip()]
+        for name in names[len(self._names):]:
+            self._ids[name] = len(self._names)
+            self._names.append(name)
+
+    def _symbol_id(self, symbol: str) -> int:
+        symbol_id = self._ids.get(symbol)
+        if symbol_id is None:
+            # Written before any tick that refers to it reaches a segment.
+            self._symbols_file.write(symbol + '\n')
+            self._symbols_file.flush()
+            symbol_id = self._ids[symbol] = len(self._names)
+            self._names.append(symbol)
+        return symbol_id
+
+    def append(self, symbol: str, ticks: Sequence[Dict[str, Any]]):
+        """Buffers ticks ({'time', 'price', 'qty'}) of one symbol; writes them out when due."""
+        if not ticks:
+            return
+        with self._lock:
+            symbol_id = self._symbol_id(symbol)
+            self._pending.extend((t['time'], symbol_id, t['price'], t['qty']) for t in ticks)
+            self.ticks_appended += len(ticks)
+            if len(self._pending) >= self.flush_rows or time.monotonic() - self._last_flush >= self.flush_interval:
+                self._write_pending()
+
+    def flush(self):
+        """Writes buffered ticks to their segments (readers in other processes see them afterwards)."""
+        with self._lock:
+            self._write_pending()
+
+    def _write_pending(self):
+        self._last_flush = time.monotonic()
+        if not self._pending:
+            return
+        records = np.array(self._pending, dtype=TICK_DTYPE)
+        self._pending = []
+        days = records['timestamp'] // DAY_MS
+        unique = np.unique(days)
+        try:
+            for day in unique:
+                name = segment_day(int(day) * DAY_MS)
+                chunk = records if len(unique) == 1 else records[days == day]
+                f = self._segment_file(name)
+                f.write(chunk.tobytes())
+                f.flush()
+                self.ticks_written += len(chunk)
+        except OSError as e:
+            self.write_errors += 1
+            logger.error("Tick log write failed", extra={'ticks': len(records), 'error': str(e)})
+
+    def _segment_file(self, name: str):
+        f = self._files.get(name)
+        if f is None:
+            path = os.path.join(self.directory, name + SEGMENT_SUFFIX)
+            if os.path.exists(path):
+                size = os.path.getsize(path)
+                if size % TICK_DTYPE.itemsize:
+                    os.truncate(path, size - size % TICK_DTYPE.itemsize)
+            # Ticks arrive in event-time order, so only the newest couple of days stay open.
+            while len(self._files) >= 2:
+                self._files.pop(min(self._files)).close()
+            f = self._files[name] = open(path, 'ab')
+        return f
+
+    def close(self):
+        with self._lock:
+            self._write_pending()
+            for f in self._files.values():
+                f.close()
+            self._files.clear()
+            self._symbols_file.close()
+
+    def symbol_names(self) -> List[str]:
+        with self._lock:
+            self._load_symbols()
+            return list(self._names)
+
+    def segments(self, start: Optional[int] = None, end: Optional[int] = None) -> List[str]:
+        """Segment paths overlapping [start, end) in epoch ms, oldest first."""
+        first = segment_day(start) if start is not None else ''
+        last = segment_day(end - 1) if end is not None else '~'
+        names = sorted(f[:-len(SEGMENT_SUFFIX)] for f in os.listdir(self.directory) if f.endswith(SEGMENT_SUFFIX))
+        return [os.path.join(self.directory, n + SEGMENT_SUFFIX) for n in names if first <= n <= last]
+
+    def read(self, start: Optional[int] = None, end: Optional[int] = None,
+             symbols: Optional[Sequence[str]] = None, chunk_rows: int = READ_CHUNK_ROWS) -> Iterator[np.ndarray]:
+        """Yields TICK_DTYPE arrays of the logged ticks in [start, end), optionally for some symbols only.
+
+        Each chunk is sorted by timestamp (ties keep log order); across chunks
+        the order is the log's, which is event time up to network jitter.
+        """
+        wanted = None
+        with self._lock:
+            self._load_symbols()
+            if symbols is not None:
+                wanted = np.array([self._ids[s] for s in symbols if s in self._ids], dtype=np.uint32)
+        for path in self.segments(start, end):
+            rows = os.path.getsize(path) // TICK_DTYPE.itemsize
+            if not rows:
+                continue
+            log = np.memmap(path, dtype=TICK_DTYPE, mode='r', shape=(rows,))
+            for offset in range(0, rows, chunk_rows):
+                chunk = log[offset:offset + chunk_rows]
+                ts = chunk['timestamp']
+                mask = np.ones(len(chunk), dtype=bool)
+                if start is not None:
+                    mask &= ts >= start
+                if end is not None:
+                    mask &= ts < end
+                if wanted is not None:
+                    mask &= np.isin(chunk['symbol_id'], wanted)
+                selected = chunk[mask]
+                if len(selected):
+                    yield selected[np.argsort(selected['timestamp'], kind='stable')]
+            del log
+
+    def stats(self) -> Dict[str, Any]:
+        segments = self.segments()
+        return {
+            'directory': self.directory,
+            'segments': len(segments),
+            'bytes': sum(os.path.getsize(p) for p in segments),
+            'symbols': len(self._names),
+            'ticks_appended': self.ticks_appended,
+            'ticks_written': self.ticks_written,
+            'pending': len(self._pending),
+            'write_errors': self.write_errors,
+        }
+
+
+def replay(store: TickStore, aggregator, start: Optional[int] = None, end: Optional[int] = None,
+           symbols: Optional[Sequence[str]] = None, speed: Optional[float] = None) -> Dict[str, Any]:
+    """Streams logged ticks in [start, end) through `aggregator.add_tick`, in event-time order.
+
+    `speed` paces the replay at that multiple of real time (e.g. 60 replays
+    an hour in a minute); None runs as fast as possible. Open bars are left
+    in the aggregator; call its `flush()` to emit them. Returns tick and bar
+    counts and the achieved speed-up.
+    """
+    names = store.symbol_names()
+    add_tick = aggregator.add_tick
+    bars_before = aggregator.bars_emitted
+    ticks = 0
+    first_ts = last_ts = None
+    started = time.perf_counter()
+    for chunk in store.read(start, end, symbols):
+        if first_ts is None:
+            first_ts = int(chunk['timestamp'][0])
+        if speed:
+            scale = 1.0 / 1000.0 / speed
+            for ts, symbol_id, price, qty in chunk.tolist():
+                # Ticks less than a millisecond early go through; the next sleep catches up.
+                delay = started + (ts - first_ts) * scale - time.perf_counter()
+                if delay > 0.001:
+                    time.sleep(delay)
+                add_tick(names[symbol_id], ts, price, qty)
+        else:
+            for ts, symbol_id, price, qty in chunk.tolist():
+                add_tick(names[symbol_id], ts, price, qty)
+        ticks += len(chunk)
+        last_ts = max(int(chunk['timestamp'][-1]), last_ts or 0)
+    elapsed = time.perf_counter() - started
+    span_s = (last_ts - first_ts) / 1000.0 if ticks else 0.0
+    return {
+        'ticks': ticks,
+        'bars': aggregator.bars_emitted - bars_before,
+        'seconds': round(elapsed, 3),
+        'ticks_per_s': round(ticks / elapsed, 1) if elapsed > 0 else None,
+        'speedup': round(span_s / elapsed, 1) if elapsed > 0 and span_s else None,
+    }
@@ -1,58 +1,80 @@
 import asyncio
-import websockets
-import json
-from data_handler import resample_and_store
-from collections import defaultdict 
+import os
+from data_handler import advance_bars, flush_bars, record_gap, record_ticks, resample_and_store
+from ingest_pipeline import IngestPipeline
+from ingest_supervisor import IngestSupervisor, build_shards
 
-BINANCE_WS_URL = "wss://stream.binance.com:9443/ws/!miniTicker@arr"
-SYMBOLS = ["btcusdt", "ethusdt"] 
+# Point QUANT_WS_BASE at fake_exchange.py to run against a local server.
+BINANCE_WS_BASE = os.environ.get('QUANT_WS_BASE', "wss://stream.binance.com:9443")
+# Parallel connections the exact-symbol universe is split across.
+INGEST_SHARDS = int(os.environ.get('QUANT_INGEST_SHARDS', '1'))
+# Comma-separated list from QUANT_SYMBOLS, e.g. "btcusdt,ethusdt,solusdt".
+# An entry such as "*usdt" matches every symbol in the stream with that suffix.
+SYMBOLS = [s.strip().lower() for s in os.environ.get('QUANT_SYMBOLS', 'btcusdt,ethusdt').split(',') if s.strip()]
+_EXACT = {s for s in SYMBOLS if not s.startswith('*')}
+_SUFFIXES = tuple(s[1:] for s in SYMBOLS if s.startswith('*'))
+
+
+def is_tracked(symbol: str) -> bool:
+    return symbol in _EXACT or (bool(_SUFFIXES) and symbol.endswith(_SUFFIXES))
 
 
-TICK_BUFFER = defaultdict(list) 
 RESAMPLE_TIMEFRAME = '1s'
 
+_PIPELINE = None
+
+
+def _ingest_ticks(symbol: str, ticks):
+    # Logged raw first, so bars can later be rebuilt from exactly what was aggregated.
+    record_ticks(symbol, ticks)
+    resample_and_store(ticks, RESAMPLE_TIMEFRAME, symbol)
+
+
+def get_pipeline() -> IngestPipeline:
+    """Returns the process-wide decode/aggregate pipeline, starting it on first use."""
+    global _PIPELINE
+    if _PIPELINE is None:
+        _PIPELINE = IngestPipeline(
+            _ingest_ticks,
+            is_tracked,
+            on_gap=record_gap,
+            advance=advance_bars,
+            flush=flush_bars,
+        )
+    _PIPELINE.start()
+    return _PIPELINE
+
+
+def stop_pipeline():
+    """Drains received frames into the aggregator, stores the bars still in progress and stops the threads."""
+    if _PIPELINE is not None:
+        _PIPELINE.stop()
+
+
+_SUPERVISOR = None
+
+
+def get_supervisor() -> IngestSupervisor:
+    """Returns the process-wide connection supervisor for the configured shards."""
+    global _SUPERVISOR
+    if _SUPERVISOR is None:
+        pipeline = get_pipeline()
+        _SUPERVISOR = IngestSupervisor(
+            build_shards(BINANCE_WS_BASE, SYMBOLS, INGEST_SHARDS),
+            pipeline.submit_frame,
+            on_reconnect=pipeline.mark_reconnected,
+        )
+    return _SUPERVISOR
+
+
 async def receive_and_process_data():
-    """Connects to Binance WS and processes the data asynchronously."""
-    async with websockets.connect(BINANCE_WS_URL) as websocket:
-        print(f"Connected to Binance WebSocket: {BINANCE_WS_URL}")
-
-        while True:
-            try:
-                data = await websocket.recv()
-                message = json.loads(data)
-                
-                if isinstance(message, list):
-                    for tick in message:
-                        symbol = tick.get('s', '').lower() 
-                        
-                        if symbol in SYMBOLS: 
-                            
-                            raw_tick = {
-                                'time': tick.get('E'),
-                                'price': float(tick.get('c')),
-                                'qty': float(tick.get('v')),
-                            }
-                            
-                            TICK_BUFFER[symbol].append(raw_tick)
-                            
-                
-                symbols_to_clear = []
-                for symbol_key, buffer in TICK_BUFFER.items():
-                    if len(buffer) >= 50:
-                        
-                        resample_and_store(buffer, RESAMPLE_TIMEFRAME, symbol_key.upper()) 
-                        symbols_to_clear.append(symbol_key)
-                        
-                
-                for symbol_key in symbols_to_clear:
-                    TICK_BUFFER[symbol_key].clear()
-
-            except websockets.ConnectionClosed:
-                print("Connection closed, retrying...")
-                await asyncio.sleep(5)
-            except Exception as e:
-                print(f"Error processing data: {e}")
-                await asyncio.sleep(1)
+    """Runs the supervised exchange connections; each one only enqueues raw frames.
+
+    Decoding, bar building and persistence happen on the pipeline's threads,
+    so `recv()` is never stalled behind a flush. Dropped connections are
+    re-established by the supervisor and the missed interval is recorded.
+    """
+    await get_supervisor().run()
 
 
 def start_ws_client():